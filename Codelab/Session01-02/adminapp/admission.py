@@ -0,0 +1,200 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, request
+
+from metrics import Counter, Gauge, Histogram
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# Waits are bounded by ADMISSION_QUEUE_TIMEOUT, so they are short
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class WriterGate:
+    """
+    At most ``max_writers`` holders at a time, with at most ``queue_size``
+    callers waiting for a slot and none waiting longer than ``timeout``.
+    """
+
+    def __init__(self, max_writers, queue_size, timeout, clock=time.monotonic):
+        self.max_writers = max_writers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._clock = clock
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot; returns None, or 'queue_full' or 'timeout' when none was given."""
+        with self._condition:
+            if self.active < self.max_writers and not self.waiting:
+                self.active += 1
+                return None
+            if self.waiting >= self.queue_size:
+                return 'queue_full'
+            self.waiting += 1
+            deadline = self._clock() + self.timeout
+            try:
+                while self.active >= self.max_writers:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        if self.active < self.max_writers:
+                            # The wakeup for a slot freed just now went to this caller; pass it on
+                            self._condition.notify()
+                        return 'timeout'
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            return None
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+class TokenBuckets:
+    """
+    A token bucket per client: ``rate`` tokens a second, up to ``burst``.
+
+    Only the ``max_clients`` most recently seen clients are tracked; a
+    forgotten client starts again with a full bucket, as it would after
+    being idle.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Take a token; returns 0, or the seconds until one is available."""
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class AdmissionState:
+    """Writer gate, client buckets and metrics of one app."""
+
+    def __init__(self, gate, buckets=None, registry=None):
+        self.gate = gate
+        self.buckets = buckets
+        self.rejections = self.wait = None
+        if registry is not None:
+            self.rejections = registry.register(Counter(
+                'adminapp_admission_rejected_total', 'Write requests turned away, by reason.', ('reason',)))
+            self.wait = registry.register(Histogram(
+                'adminapp_admission_wait_seconds', 'Time write requests waited for a writer slot.',
+                buckets=WAIT_BUCKETS))
+            writers = registry.register(Gauge(
+                'adminapp_admission_writers', 'Write requests currently holding a writer slot.'))
+            queue_depth = registry.register(Gauge(
+                'adminapp_admission_queue_depth', 'Write requests waiting for a writer slot.'))
+
+            def collect():
+                writers.set(gate.active)
+                queue_depth.set(gate.waiting)
+            registry.collectors.append(collect)
+
+    def reject(self, reason):
+        if self.rejections is not None:
+            self.rejections.inc(reason)
+
+
+def _refuse(status, message, retry_after):
+    response = jsonify({'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionControl:
+    """
+    Load shedding for write requests (POST, PUT, PATCH and DELETE).
+
+    SQLite takes one writer at a time, so writes beyond a few only queue
+    on its lock, holding a thread each and slowing readers down with them.
+    At most ADMISSION_MAX_WRITERS write requests run at once; up to
+    ADMISSION_QUEUE_SIZE more wait for a slot, for no longer than
+    ADMISSION_QUEUE_TIMEOUT seconds. Anything beyond that is answered at
+    once with 503 and Retry-After: ADMISSION_RETRY_AFTER. With
+    ADMISSION_CLIENT_RATE set, each client (by remote address; put ProxyFix
+    in front behind a proxy) may also send only that many writes a second,
+    in bursts of ADMISSION_CLIENT_BURST, and gets 429 beyond it.
+
+    Limits are per process: with several workers, multiply accordingly.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_ENABLED', True)
+        app.config.setdefault('ADMISSION_MAX_WRITERS', 2)
+        app.config.setdefault('ADMISSION_QUEUE_SIZE', 16)
+        app.config.setdefault('ADMISSION_QUEUE_TIMEOUT', 2.0)
+        app.config.setdefault('ADMISSION_RETRY_AFTER', 1)
+        app.config.setdefault('ADMISSION_CLIENT_RATE', None)
+        app.config.setdefault('ADMISSION_CLIENT_BURST', 10)
+        app.config.setdefault('ADMISSION_MAX_CLIENTS', 10000)
+        if not app.config['ADMISSION_ENABLED']:
+            return
+
+        config = app.config
+        buckets = None
+        if config['ADMISSION_CLIENT_RATE']:
+            buckets = TokenBuckets(
+                config['ADMISSION_CLIENT_RATE'], config['ADMISSION_CLIENT_BURST'], config['ADMISSION_MAX_CLIENTS'])
+        app.extensions['admission'] = AdmissionState(
+            WriterGate(config['ADMISSION_MAX_WRITERS'], config['ADMISSION_QUEUE_SIZE'], config['ADMISSION_QUEUE_TIMEOUT']),
+            buckets,
+            app.extensions.get('metrics')
+        )
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def _before_request():
+        if request.method not in WRITE_METHODS:
+            return None
+        state = current_app.extensions['admission']
+        if state.buckets is not None:
+            wait = state.buckets.take(request.remote_addr)
+            if wait:
+                state.reject('rate_limited')
+                return _refuse(429, 'Too many write requests, slow down', wait)
+
+        started = time.perf_counter()
+        reason = state.gate.acquire()
+        if reason is not None:
+            state.reject(reason)
+            return _refuse(503, 'Server busy, retry later', current_app.config['ADMISSION_RETRY_AFTER'])
+        g._admission_slot = True
+        if state.wait is not None:
+            state.wait.observe(time.perf_counter() - started)
+        return None
+
+    @staticmethod
+    def _teardown_request(error=None):
+        # Runs however the request ended, so a slot is never leaked
+        if g.pop('_admission_slot', False):
+            current_app.extensions['admission'].gate.release()
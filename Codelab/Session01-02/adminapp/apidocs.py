@@ -0,0 +1,78 @@
+import importlib.util
+import os
+import threading
+
+from flask import Blueprint, current_app, jsonify, redirect, url_for
+
+SPEC_ENDPOINT = 'apispec_1'
+
+
+def _flasgger_folder(name):
+    # Locates the package without importing it
+    spec = importlib.util.find_spec('flasgger')
+    return os.path.join(spec.submodule_search_locations[0], 'ui3', name)
+
+
+class LazySwagger:
+    """
+    flasgger's Swagger UI and spec, under the URLs ``Swagger(app)`` serves
+    them at, without paying for flasgger at startup.
+
+    Only a blueprint with the same name and routes is registered up front.
+    flasgger is imported on the first docs request, and the spec, parsed
+    from the YAML in every view docstring, is built once and cached: routes
+    cannot change after the app served its first request. SWAGGER_ENABLED
+    set to False leaves the docs out entirely.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SWAGGER_ENABLED', True)
+        if not app.config['SWAGGER_ENABLED']:
+            return
+        blueprint = Blueprint(
+            'flasgger', __name__,
+            template_folder=_flasgger_folder('templates'),
+            static_folder=_flasgger_folder('static'),
+            static_url_path='/flasgger_static'
+        )
+        blueprint.add_url_rule('/apidocs/', 'apidocs', self._apidocs)
+        blueprint.add_url_rule('/apidocs/index.html', 'apidocs_index', lambda: redirect(url_for('flasgger.apidocs')))
+        blueprint.add_url_rule('/oauth2-redirect.html', 'oauth_redirect', self._oauth_redirect)
+        blueprint.add_url_rule(f'/{SPEC_ENDPOINT}.json', SPEC_ENDPOINT, self._apispec)
+        app.register_blueprint(blueprint)
+        app.extensions['swagger'] = {'swagger': None, 'spec': None, 'lock': threading.Lock()}
+
+    @staticmethod
+    def _state():
+        state = current_app.extensions['swagger']
+        if state['spec'] is None:
+            with state['lock']:
+                if state['spec'] is None:
+                    from flasgger import Swagger
+                    swagger = Swagger()
+                    # What Swagger.init_app does, minus registering views the blueprint above already has
+                    swagger.app = current_app._get_current_object()
+                    swagger.load_config(swagger.app)
+                    state['swagger'] = swagger
+                    state['spec'] = swagger.get_apispecs(SPEC_ENDPOINT)
+        return state
+
+    @staticmethod
+    def get_spec():
+        return LazySwagger._state()['spec']
+
+    def _apispec(self):
+        return jsonify(self.get_spec())
+
+    def _apidocs(self):
+        from flasgger.base import APIDocsView
+        view = APIDocsView.as_view('apidocs', view_args={'config': self._state()['swagger'].config})
+        return view()
+
+    def _oauth_redirect(self):
+        from flasgger.base import OAuthRedirect
+        return OAuthRedirect.as_view('oauth_redirect')()
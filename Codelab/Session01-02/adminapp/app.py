@@ -1,24 +1,52 @@
 from flask import Flask
-from flask_migrate import Migrate
-from config import Config
-from extensions import db
-from users.controllers import users_bp
-from products.controllers import products_bp
-from flasgger import Swagger
+from extensions import db, admission, cache, compression, derivatives, metrics, replica_routing, swagger, init_sqlite_pragmas
+from group_commit import GroupCommit
+from json_provider import init_json_provider
 from dotenv import load_dotenv
 import os
 
 load_dotenv()  # Load environment variables from .env file
 
-app = Flask(__name__)
-app.config.from_object(Config)
 
-db.init_app(app)
-migrate = Migrate(app, db)
-swagger = Swagger(app)
+def create_app(config_object=None):
+    app = Flask(__name__)
+    # APP_CONFIG selects a profile, e.g. APP_CONFIG=config.ProductionConfig
+    app.config.from_object(config_object or os.getenv('APP_CONFIG', 'config.Config'))
+    init_json_provider(app)
+
+    db.init_app(app)
+    init_sqlite_pragmas(app)
+    cache.init_app(app)
+    metrics.init_app(app, db, caches={'entity': cache})
+    replica_routing.init_app(app)
+    admission.init_app(app)
+    GroupCommit(app)
+    compression.init_app(app)
+    derivatives.init_app(app)
+    if app.config.get('MIGRATIONS_ENABLED', True):
+        # Alembic is only needed by the `flask db` commands
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    swagger.init_app(app)
+
+    # Imported here, so importing this module for create_app alone stays cheap
+    from cli import init_cli
+    from users.controllers import users_bp
+    from products.controllers import products_bp
+    init_cli(app)
+    app.register_blueprint(users_bp, url_prefix='/users')
+    app.register_blueprint(products_bp, url_prefix='/products')
+    return app
+
+
+def __getattr__(name):
+    # The default app is built on first access (flask --app app, gunicorn app:app), not on import
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-app.register_blueprint(users_bp, url_prefix='/users')
-app.register_blueprint(products_bp, url_prefix='/products')
 
 if __name__ == '__main__':
-    app.run(debug=os.getenv('FLASK_ENV') == 'development')  # Enable debug mode based on environment variable
\ No newline at end of file
+    create_app().run(debug=os.getenv('FLASK_ENV') == 'development')  # Enable debug mode based on environment variable
@@ -0,0 +1,36 @@
+from quart import Quart
+from async_extensions import db, cache
+from json_provider import init_json_provider
+from users.async_controllers import users_bp
+from products.async_controllers import products_bp
+from dotenv import load_dotenv
+import os
+
+load_dotenv()  # Load environment variables from .env file
+
+
+def create_asgi_app(config_object=None):
+    """
+    The users and products API as an ASGI app, e.g. ``hypercorn asgi:app``.
+
+    Handlers are async and use an aiosqlite engine on the same database,
+    models and configuration as the WSGI app in app.py, which stays the
+    place for migrations, Swagger, metrics and the bulk endpoints.
+    """
+    app = Quart(__name__)
+    # APP_CONFIG selects a profile, e.g. APP_CONFIG=config.ProductionConfig
+    app.config.from_object(config_object or os.getenv('APP_CONFIG', 'config.Config'))
+    init_json_provider(app)
+
+    db.init_app(app)
+    cache.init_app(app)
+
+    app.register_blueprint(users_bp, url_prefix='/users')
+    app.register_blueprint(products_bp, url_prefix='/products')
+    return app
+
+
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    app.run(debug=os.getenv('FLASK_ENV') == 'development')
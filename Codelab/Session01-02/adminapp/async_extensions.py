@@ -0,0 +1,116 @@
+# async_extensions.py: the ASGI app's counterparts of extensions.py
+import asyncio
+import functools
+
+from quart import current_app, g
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from cache import AsyncEntityCache
+from extensions import _apply_pragmas, backoff_delay, is_lock_error
+
+
+def async_database_url(url):
+    """The SQLALCHEMY_DATABASE_URI of the WSGI app, with the aiosqlite driver."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+class AsyncDatabase:
+    """
+    Async engine and sessions for the ASGI app.
+
+    ``session`` is one AsyncSession per app context, closed on teardown, so
+    async repositories reach it the way the sync ones use ``db.session``.
+    The models and their metadata are the Flask-SQLAlchemy ones.
+    """
+
+    def init_app(self, app):
+        url = async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        options = {}
+        if url.database in (None, '', ':memory:'):
+            # Every connection to :memory: would open its own empty database
+            options['poolclass'] = StaticPool
+        engine = create_async_engine(url, **options)
+        pragmas = app.config.get('SQLITE_PRAGMAS')
+        if pragmas:
+            event.listen(engine.sync_engine, 'connect', functools.partial(_apply_pragmas, pragmas))
+        app.extensions['async_db'] = {
+            'engine': engine,
+            'sessionmaker': async_sessionmaker(engine, expire_on_commit=False)
+        }
+
+        @app.teardown_appcontext
+        async def close_session(exception=None):
+            session = g.pop('_async_db_session', None)
+            if session is not None:
+                await session.close()
+
+        @app.after_serving
+        async def dispose_engine():
+            await engine.dispose()
+
+    @property
+    def engine(self):
+        return current_app.extensions['async_db']['engine']
+
+    @property
+    def sessionmaker(self):
+        return current_app.extensions['async_db']['sessionmaker']
+
+    @property
+    def session(self):
+        if '_async_db_session' not in g:
+            g._async_db_session = self.sessionmaker()
+        return g._async_db_session
+
+    def stream_batches(self, query, batch_size):
+        """
+        Run ``query`` lazily and yield its rows in lists of ``batch_size``.
+
+        Uses a session of its own, as a streamed body is still being read
+        after the request's session was closed.
+        """
+        sessionmaker = self.sessionmaker
+
+        async def batches():
+            async with sessionmaker() as session:
+                result = await session.stream(query.execution_options(yield_per=batch_size))
+                async for batch in result.partitions():
+                    yield batch
+
+        return batches()
+
+
+db = AsyncDatabase()
+cache = AsyncEntityCache()
+
+
+def retry_on_lock(func):
+    """
+    Retry a self-contained async write when SQLite reports lock contention.
+
+    Same contract and settings as extensions.retry_on_lock; the backoff
+    sleeps without blocking the event loop.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        config = current_app.config
+        retries = config.get('DB_WRITE_RETRIES', 5)
+        base_delay = config.get('DB_WRITE_RETRY_BASE_DELAY', 0.01)
+        max_delay = config.get('DB_WRITE_RETRY_MAX_DELAY', 0.5)
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except OperationalError as e:
+                await db.session.rollback()
+                if not is_lock_error(e) or attempt >= retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+                attempt += 1
+    return wrapper
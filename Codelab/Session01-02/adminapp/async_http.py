@@ -0,0 +1,50 @@
+# Quart counterparts of the Flask-bound helpers in http_cache and pagination
+from quart import current_app, request
+
+import http_cache
+import pagination
+
+
+def is_conditional():
+    return http_cache.is_conditional(request)
+
+
+def is_not_modified(etag, last_modified=None):
+    return http_cache.is_not_modified(etag, last_modified, request)
+
+
+def add_cache_headers(response, etag, last_modified=None):
+    cache_control = current_app.config.get('HTTP_CACHE_CONTROL', 'no-cache')
+    return http_cache.add_cache_headers(response, etag, last_modified, cache_control)
+
+
+def not_modified_response(etag, last_modified=None):
+    return add_cache_headers(current_app.response_class('', status=304), etag, last_modified)
+
+
+def parse_page_args(args):
+    return pagination.parse_page_args(args, current_app.config)
+
+
+def parse_offset(args):
+    return pagination.parse_offset(args, current_app.config)
+
+
+def stream_json_array(batches, serialize):
+    """
+    Stream the rows of the async iterator ``batches`` (lists of rows) as one JSON array.
+
+    Each batch is encoded with a single call, as in pagination.stream_json_array.
+    """
+    dumps = current_app.json.dumps
+
+    async def generate():
+        yield '['
+        separator = ''
+        async for batch in batches:
+            if batch:
+                yield separator + dumps([serialize(row) for row in batch])[1:-1]
+                separator = ','
+        yield ']'
+
+    return current_app.response_class(generate(), mimetype='application/json')
@@ -0,0 +1,19 @@
+"""
+Throughput and latency benchmarks for the adminapp endpoints.
+
+Usage, from the adminapp directory:
+
+    python -m benchmarks run --rows 100000 --concurrency 1,8,32 --output results.json
+    python -m benchmarks compare baseline.json results.json --threshold 0.15
+    python -m benchmarks serialization --rows 100000
+    python -m benchmarks startup --budget-ms 1000
+
+``run`` seeds a temporary SQLite file, drives every route of users_bp and
+products_bp in process through the Flask test client and writes p50/p95/p99
+latency and requests/sec per scenario and concurrency level. ``compare``
+exits with status 1 when a result regressed against the baseline.
+``serialization`` compares list serialization strategies per row.
+``startup`` times ``import app`` plus create_app in fresh interpreters,
+lists the packages that take longest to import and exits with status 1
+when the production profile misses its startup budget.
+"""
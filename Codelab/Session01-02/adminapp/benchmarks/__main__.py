@@ -0,0 +1,202 @@
+import argparse
+import json
+import sys
+import time
+import warnings
+
+from benchmarks import report, runner, scaling, serialization, startup
+from benchmarks.scenarios import select_scenarios
+from benchmarks.seed import Workspace, seed
+
+
+def parse_levels(value):
+    return [int(level) for level in value.split(',') if level]
+
+
+def run_command(args):
+    users = args.users if args.users is not None else args.rows
+    products = args.products if args.products is not None else args.rows
+    scenarios = select_scenarios(args.scenario)
+    if not scenarios:
+        sys.exit(f'No scenario matches {args.scenario}')
+
+    workspace = Workspace()
+    try:
+        app = workspace.create_app(CACHE_ENABLED=not args.no_cache)
+        started = time.perf_counter()
+        seed(app, users, products)
+        print(f'Seeded {users} users and {products} products in {time.perf_counter() - started:.1f}s '
+              f'({workspace.database})', file=sys.stderr)
+        results = runner.run(
+            app, scenarios, users, products, args.concurrency, args.requests,
+            warmup=args.warmup, seed=args.seed, log=lambda result: print(report.format_row(result))
+        )
+    finally:
+        if not args.keep:
+            workspace.cleanup()
+
+    environment = runner.environment(users, products, args.concurrency, args.requests, args.warmup, args.seed)
+    if args.output:
+        report.write_results(args.output, environment, results)
+    if args.baseline:
+        return compare_documents(report.load_results(args.baseline), {'results': results}, args.threshold)
+    return 0
+
+
+def compare_documents(baseline, current, threshold):
+    comparisons = report.compare(baseline, current, threshold)
+    for comparison in comparisons:
+        print(report.format_comparison(comparison))
+    regressions = [comparison for comparison in comparisons if comparison['regressed']]
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {threshold:.0%}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def scaling_command(args):
+    users = args.users if args.users is not None else args.rows
+    products = args.products if args.products is not None else args.rows
+    scenarios = select_scenarios(args.scenario or scaling.DEFAULT_SCENARIOS)
+    if not scenarios:
+        sys.exit(f'No scenario matches {args.scenario}')
+    servers = args.server or list(scaling.SERVERS)
+    if 'asgi' in servers:
+        try:
+            import aiosqlite, hypercorn, quart  # noqa: F401
+        except ImportError as e:
+            sys.exit(f'The ASGI server needs quart, aiosqlite and hypercorn ({e})')
+
+    workspace = Workspace()
+    try:
+        app = workspace.create_app(CACHE_ENABLED=not args.no_cache)
+        seed(app, users, products)
+        results = scaling.run(
+            workspace, app, scenarios, users, products, args.concurrency, args.requests_per_client,
+            servers=servers, warmup=args.warmup, seed=args.seed, cache=not args.no_cache,
+            log=lambda result: print(report.format_row(result))
+        )
+    finally:
+        if not args.keep:
+            workspace.cleanup()
+
+    print()
+    print(scaling.format_table(results))
+    environment = runner.environment(users, products, args.concurrency, args.requests_per_client, args.warmup, args.seed)
+    environment['servers'] = servers
+    if args.output:
+        report.write_results(args.output, environment, results)
+    if args.baseline:
+        return compare_documents(report.load_results(args.baseline), {'results': results}, args.threshold)
+    return 0
+
+
+def serialization_command(args):
+    results = serialization.run(args.rows, args.repeats)
+    print(serialization.format_report(results))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+    return 0
+
+
+def startup_command(args):
+    results = startup.run(args.profile or startup.DEFAULT_PROFILES, args.repeats)
+    print(startup.format_report(results))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+    exceeded = startup.over_budget(results, args.budget_ms, args.budget_profile)
+    for result in exceeded:
+        print(f"{result['profile']} started in {result['startup_ms']} ms, over the {args.budget_ms} ms budget",
+              file=sys.stderr)
+    return 1 if exceeded else 0
+
+
+def compare_command(args):
+    return compare_documents(report.load_results(args.baseline), report.load_results(args.current), args.threshold)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='adminapp endpoint benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed a temporary database and measure every endpoint')
+    run_parser.add_argument('--rows', type=int, default=1000, help='rows seeded per table (default 1000)')
+    run_parser.add_argument('--users', type=int, help='users to seed, overrides --rows')
+    run_parser.add_argument('--products', type=int, help='products to seed, overrides --rows')
+    run_parser.add_argument('--concurrency', type=parse_levels, default=[1, 4, 16],
+                            help='comma separated concurrency levels (default 1,4,16)')
+    run_parser.add_argument('--requests', type=int, default=200, help='measured requests per level (default 200)')
+    run_parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per level (default 10)')
+    run_parser.add_argument('--scenario', action='append',
+                            help='only run scenarios starting with this prefix, e.g. users. (repeatable)')
+    run_parser.add_argument('--seed', type=int, default=0, help='random seed for request parameters')
+    run_parser.add_argument('--no-cache', action='store_true', help='disable the entity cache')
+    run_parser.add_argument('--output', help='write results as JSON to this file')
+    run_parser.add_argument('--baseline', help='compare against this results file after the run')
+    run_parser.add_argument('--threshold', type=float, default=report.DEFAULT_THRESHOLD,
+                            help='allowed relative slowdown before flagging a regression (default 0.15)')
+    run_parser.add_argument('--keep', action='store_true', help='keep the temporary database directory')
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = commands.add_parser('compare', help='flag regressions of a results file against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=report.DEFAULT_THRESHOLD)
+    compare_parser.set_defaults(handler=compare_command)
+
+    scaling_parser = commands.add_parser(
+        'scaling', help='serve the WSGI and the ASGI app and compare them as concurrent clients grow')
+    scaling_parser.add_argument('--rows', type=int, default=1000, help='rows seeded per table (default 1000)')
+    scaling_parser.add_argument('--users', type=int, help='users to seed, overrides --rows')
+    scaling_parser.add_argument('--products', type=int, help='products to seed, overrides --rows')
+    scaling_parser.add_argument('--concurrency', type=parse_levels, default=list(scaling.DEFAULT_LEVELS),
+                                help='comma separated client counts (default 1,10,100,1000)')
+    scaling_parser.add_argument('--requests-per-client', type=int, default=10,
+                                help='measured requests per client and level (default 10)')
+    scaling_parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per level (default 10)')
+    scaling_parser.add_argument('--scenario', action='append',
+                                help='only run scenarios starting with this prefix (repeatable, default '
+                                     + ', '.join(scaling.DEFAULT_SCENARIOS) + ')')
+    scaling_parser.add_argument('--server', action='append', choices=scaling.SERVERS,
+                                help='only benchmark this server (repeatable, default both)')
+    scaling_parser.add_argument('--seed', type=int, default=0, help='random seed for request parameters')
+    scaling_parser.add_argument('--no-cache', action='store_true', help='disable the entity cache')
+    scaling_parser.add_argument('--output', help='write results as JSON to this file')
+    scaling_parser.add_argument('--baseline', help='compare against this results file after the run')
+    scaling_parser.add_argument('--threshold', type=float, default=report.DEFAULT_THRESHOLD,
+                                help='allowed relative slowdown before flagging a regression (default 0.15)')
+    scaling_parser.add_argument('--keep', action='store_true', help='keep the temporary database directory')
+    scaling_parser.set_defaults(handler=scaling_command)
+
+    serialization_parser = commands.add_parser(
+        'serialization', help='time list serialization and count allocations per row')
+    serialization_parser.add_argument('--rows', type=int, default=10000)
+    serialization_parser.add_argument('--repeats', type=int, default=5)
+    serialization_parser.add_argument('--output', help='write results as JSON to this file')
+    serialization_parser.set_defaults(handler=serialization_command)
+
+    startup_parser = commands.add_parser(
+        'startup', help='time import and create_app in fresh interpreters and check a startup budget')
+    startup_parser.add_argument('--profile', action='append',
+                                help='config object to start with (repeatable, default '
+                                     + ', '.join(startup.DEFAULT_PROFILES) + ')')
+    startup_parser.add_argument('--repeats', type=int, default=5, help='fresh interpreters per profile (default 5)')
+    startup_parser.add_argument('--budget-ms', type=float, default=startup.DEFAULT_BUDGET_MS,
+                                help=f'startup budget in ms (default {startup.DEFAULT_BUDGET_MS})')
+    startup_parser.add_argument('--budget-profile', default=startup.DEFAULT_PROFILES[-1],
+                                help='profile the budget applies to (default %(default)s)')
+    startup_parser.add_argument('--output', help='write results as JSON to this file')
+    startup_parser.set_defaults(handler=startup_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    # flasgger and SQLAlchemy deprecation warnings would drown the report
+    warnings.simplefilter('ignore')
+    sys.exit(main())
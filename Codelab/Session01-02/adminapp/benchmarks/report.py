@@ -0,0 +1,65 @@
+import json
+
+DEFAULT_THRESHOLD = 0.15
+
+
+def write_results(path, environment, results):
+    with open(path, 'w') as output:
+        json.dump({'environment': environment, 'results': results}, output, indent=2)
+        output.write('\n')
+
+
+def load_results(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def format_row(result):
+    return (
+        f"{result['scenario']:<28} c={result['concurrency']:<3} "
+        f"{result['rps']:>10.1f} req/s  "
+        f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms"
+        + (f"  errors {result['errors']}" if result['errors'] else '')
+    )
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result documents scenario by scenario.
+
+    A result regresses when its throughput dropped, or its p95 latency grew,
+    by more than ``threshold`` (a fraction), or when it has errors the
+    baseline did not have. Returns a list of comparison dicts.
+    """
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline['results']}
+    comparisons = []
+    for result in current['results']:
+        before = previous.get((result['scenario'], result['concurrency']))
+        if before is None:
+            continue
+        rps_change = (result['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+        p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        reasons = []
+        if rps_change < -threshold:
+            reasons.append(f'throughput {rps_change:+.0%}')
+        if p95_change > threshold:
+            reasons.append(f'p95 {p95_change:+.0%}')
+        if result['errors'] > before['errors']:
+            reasons.append(f"errors {before['errors']} -> {result['errors']}")
+        comparisons.append({
+            'scenario': result['scenario'],
+            'concurrency': result['concurrency'],
+            'rps_change': rps_change,
+            'p95_change': p95_change,
+            'regressed': bool(reasons),
+            'reasons': reasons,
+        })
+    return comparisons
+
+
+def format_comparison(comparison):
+    status = 'REGRESSION ' + ', '.join(comparison['reasons']) if comparison['regressed'] else 'ok'
+    return (
+        f"{comparison['scenario']:<28} c={comparison['concurrency']:<3} "
+        f"rps {comparison['rps_change']:+7.1%}  p95 {comparison['p95_change']:+7.1%}  {status}"
+    )
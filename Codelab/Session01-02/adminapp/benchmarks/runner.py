@@ -0,0 +1,109 @@
+import math
+import platform
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks.scenarios import State
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(scenario, concurrency, latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if int(status) not in scenario.expected)
+    return {
+        'scenario': scenario.name,
+        'method': scenario.method,
+        'rule': scenario.rule,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'seconds': round(elapsed, 4),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def measure(app, scenario, state, concurrency, requests, seed=0):
+    """
+    Send ``requests`` requests of ``scenario`` from ``concurrency`` threads.
+
+    Every thread has its own test client and a random generator seeded from
+    ``seed`` and its index, so a run with the same arguments sends the same
+    requests.
+    """
+    per_thread = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [Counter() for _ in range(concurrency)]
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def work(index):
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + index)
+        start_barrier.wait()
+        for _ in range(per_thread[index]):
+            started = time.perf_counter()
+            response = scenario.request(client, rng, state)
+            # Streamed bodies are only produced while they are read
+            response.get_data()
+            latencies[index].append(time.perf_counter() - started)
+            statuses[index][str(response.status_code)] += 1
+            response.close()
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(
+        scenario, concurrency,
+        [value for values in latencies for value in values],
+        sum(statuses, Counter()), elapsed
+    )
+
+
+def run(app, scenarios, users, products, concurrency_levels, requests, warmup=10, seed=0, log=None):
+    state = State(users, products)
+    results = []
+    for scenario in scenarios:
+        for concurrency in concurrency_levels:
+            if scenario.prepare is not None:
+                scenario.prepare(app, state, warmup + requests)
+            if warmup:
+                measure(app, scenario, state, 1, warmup, seed)
+            result = measure(app, scenario, state, concurrency, requests, seed)
+            results.append(result)
+            if log is not None:
+                log(result)
+    return results
+
+
+def environment(users, products, concurrency_levels, requests, warmup, seed):
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'users': users,
+        'products': products,
+        'concurrency': list(concurrency_levels),
+        'requests': requests,
+        'warmup': warmup,
+        'seed': seed,
+    }
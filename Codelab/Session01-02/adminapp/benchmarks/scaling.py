@@ -0,0 +1,275 @@
+"""
+Concurrency scaling of the WSGI and the ASGI app over real sockets.
+
+Each app is served in a process of its own: app.py on Werkzeug's threaded
+server, which is what app.run() uses, and asgi.py on Hypercorn. The clients
+are asyncio connections in the benchmark process, one keep-alive connection
+per client, so a thousand clients need neither a thousand threads nor an
+external load generator.
+"""
+import asyncio
+import logging
+import multiprocessing
+import random
+import socket
+import time
+import warnings
+from collections import Counter
+from json import dumps as json_dumps
+
+from benchmarks.runner import summarize
+from benchmarks.scenarios import State
+from benchmarks.seed import Workspace
+
+SERVERS = ('wsgi', 'asgi')
+DEFAULT_LEVELS = (1, 10, 100, 1000)
+DEFAULT_SCENARIOS = ('users.get', 'products.get', 'products.list_page', 'products.update')
+HOST = '127.0.0.1'
+# Above the largest client count, so connections queue in the app and not in the kernel
+BACKLOG = 2048
+STARTUP_TIMEOUT = 30
+# Status recorded for requests that got no response at all
+NO_RESPONSE = '0'
+
+
+class Reply:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+
+class HTTPConnection:
+    """A minimal HTTP/1.1 client connection that is kept alive between requests."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b'', content_type=None):
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, body, content_type)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            # The server may close an idle kept-alive connection; retry once on a new one
+            if not reused:
+                raise
+            return await self._request(method, path, body, content_type)
+
+    async def _request(self, method, path, body, content_type):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        if content_type:
+            head.append(f'Content-Type: {content_type}')
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        version, status = (await self.reader.readuntil(b'\r\n')).split(b' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        status = int(status)
+        keep_alive = headers.get('connection', 'keep-alive' if version == b'HTTP/1.1' else 'close') != 'close'
+        if status in (204, 304):
+            data = b''
+        elif headers.get('transfer-encoding') == 'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data, keep_alive = await self.reader.read(), False
+        if not keep_alive:
+            await self.close()
+        return Reply(status, data)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            chunk = await self.reader.readexactly(size + 2)
+            if size == 0:
+                return b''.join(chunks)
+            chunks.append(chunk[:-2])
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class Client:
+    """The part of Flask's test client API the scenarios use, sent over an HTTPConnection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get(self, path, **kwargs):
+        return self.open('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open('DELETE', path, **kwargs)
+
+    async def open(self, method, path, json=None, data=None, content_type=None):
+        if json is not None:
+            data, content_type = json_dumps(json).encode('utf-8'), 'application/json'
+        return await self.connection.request(method, path, data or b'', content_type)
+
+
+async def measure(port, scenario, state, concurrency, requests_per_client, seed=0):
+    """
+    Send ``requests_per_client`` requests of ``scenario`` from each of ``concurrency`` connections.
+
+    As in runner.measure, every client has a random generator seeded from
+    ``seed`` and its index. The clock starts once every client is ready.
+    """
+    latencies = []
+    statuses = Counter()
+    start = asyncio.Event()
+
+    async def work(index):
+        connection = HTTPConnection(HOST, port)
+        client = Client(connection)
+        rng = random.Random(seed * 1000 + index)
+        await start.wait()
+        try:
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                try:
+                    status = str((await scenario.request(client, rng, state)).status_code)
+                except (OSError, asyncio.IncompleteReadError):
+                    status = NO_RESPONSE
+                    await connection.close()
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+        finally:
+            await connection.close()
+
+    tasks = [asyncio.create_task(work(index)) for index in range(concurrency)]
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return summarize(scenario, concurrency, latencies, statuses, time.perf_counter() - started)
+
+
+def serve(kind, root, port, cache=True):
+    """Serve the ``kind`` app on the database of the workspace at ``root``; runs in a child process."""
+    warnings.simplefilter('ignore')
+    config = Workspace(root).config(CACHE_ENABLED=cache)
+    if kind == 'wsgi':
+        from werkzeug.serving import ThreadedWSGIServer
+        from app import create_app
+
+        class Server(ThreadedWSGIServer):
+            request_queue_size = BACKLOG
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        Server(HOST, port, create_app(config)).serve_forever()
+    else:
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        from asgi import create_asgi_app
+
+        server_config = Config()
+        server_config.bind = [f'{HOST}:{port}']
+        server_config.backlog = BACKLOG
+        server_config.accesslog = None
+        server_config.loglevel = 'WARNING'
+        asyncio.run(hypercorn_serve(create_asgi_app(config), server_config))
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+class ServerProcess:
+    """Context manager running ``serve`` in a spawned process until the block exits."""
+
+    def __init__(self, kind, root, cache=True):
+        self.kind = kind
+        self.port = free_port()
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=serve, args=(kind, root, self.port, cache), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                socket.create_connection((HOST, self.port), timeout=1).close()
+                return self
+            except OSError:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self.__exit__(None, None, None)
+                    raise RuntimeError(f'The {self.kind} server did not start')
+                time.sleep(0.1)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join(5)
+
+
+def run(workspace, app, scenarios, users, products, levels=DEFAULT_LEVELS, requests_per_client=10,
+        servers=SERVERS, warmup=10, seed=0, cache=True, log=None):
+    """
+    Measure ``scenarios`` at every client count in ``levels`` against each server in turn.
+
+    ``app`` is the WSGI app on the workspace database, used by scenarios
+    that prepare rows. Results are runner results with a ``server`` key;
+    their scenario name is prefixed with it, e.g. ``asgi:products.get``.
+    """
+    state = State(users, products)
+    results = []
+    for kind in servers:
+        with ServerProcess(kind, workspace.root, cache) as server:
+            for scenario in scenarios:
+                for concurrency in levels:
+                    if scenario.prepare is not None:
+                        scenario.prepare(app, state, warmup + concurrency * requests_per_client)
+                    if warmup:
+                        asyncio.run(measure(server.port, scenario, state, 1, warmup, seed))
+                    result = asyncio.run(measure(server.port, scenario, state, concurrency, requests_per_client, seed))
+                    result.update(scenario=f'{kind}:{scenario.name}', server=kind)
+                    results.append(result)
+                    if log is not None:
+                        log(result)
+    return results
+
+
+def format_table(results):
+    """Throughput and p95 latency of each scenario per client count, one column pair per server."""
+    servers = [kind for kind in SERVERS if any(result['server'] == kind for result in results)]
+    cells = {}
+    for result in results:
+        name = result['scenario'].split(':', 1)[1]
+        cells.setdefault((name, result['concurrency']), {})[result['server']] = result
+    header = f"{'scenario':<28} {'clients':>7}" + ''.join(
+        f"  {kind + ' req/s':>12}  {kind + ' p95 ms':>12}" for kind in servers)
+    lines = [header]
+    for (name, concurrency), by_server in cells.items():
+        line = f'{name:<28} {concurrency:>7}'
+        for kind in servers:
+            result = by_server.get(kind)
+            line += f"  {result['rps']:>12.1f}  {result['p95_ms']:>12.2f}" if result else f"  {'-':>12}  {'-':>12}"
+        lines.append(line)
+    return '\n'.join(lines)
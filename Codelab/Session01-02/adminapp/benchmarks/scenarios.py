@@ -0,0 +1,188 @@
+import io
+import itertools
+import os
+
+from sqlalchemy import select
+
+from benchmarks.seed import insert_rows, product_row, user_row
+from extensions import db
+from products.models import Product
+from products.services import ProductService
+from users.models import User
+
+BULK_SIZE = 100
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests', 'test_image.png')
+
+
+class State:
+    """Data shared by the scenarios of one run: seeded row counts, id pools and counters."""
+
+    def __init__(self, users, products):
+        self.users = users
+        self.products = products
+        self.pools = {}
+        # next() on itertools.count is atomic, so threads never share a value
+        self.sequence = itertools.count(1)
+        with open(IMAGE_PATH, 'rb') as image:
+            self.image = image.read()
+
+    def unique(self):
+        return next(self.sequence)
+
+
+class Scenario:
+    """
+    One request shape against one route.
+
+    ``prepare(app, state, requests)`` runs before each measurement for
+    scenarios that consume rows, e.g. deletes, so reads keep hitting the
+    seeded data.
+    """
+
+    def __init__(self, name, method, rule, request, expected=(200,), prepare=None):
+        self.name = name
+        self.method = method
+        self.rule = rule
+        self.request = request
+        self.expected = expected
+        self.prepare = prepare
+
+
+def _extra_rows(model, make_row, pool_name, per_request=1):
+    def prepare(app, state, requests):
+        count = requests * per_request
+        with app.app_context():
+            first = db.session.scalar(select(db.func.coalesce(db.func.max(model.id), 0))) + 1
+            insert_rows(model, (make_row(n) for n in range(first, first + count)))
+        state.pools[pool_name] = list(range(first, first + count))
+    return prepare
+
+
+def _take(state, pool_name, count=1):
+    pool = state.pools[pool_name]
+    return [pool.pop() for _ in range(count)]
+
+
+def _user_body(n, prefix):
+    return {'name': f'User {n}', 'email': f'{prefix}{n}@example.com'}
+
+
+def _user_ids(rng, state, count):
+    return rng.sample(range(1, state.users + 1), min(count, state.users))
+
+
+def _product_ids(rng, state, count):
+    return rng.sample(range(1, state.products + 1), min(count, state.products))
+
+
+def _random_user(rng, state):
+    return rng.randint(1, state.users)
+
+
+def _random_product(rng, state):
+    return rng.randint(1, state.products)
+
+
+def _prepare_upload(app, state, requests):
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+
+def _prepare_image(app, state, requests):
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    with app.app_context():
+        state.pools['products.image'] = ProductService.upload_product_image(1, io.BytesIO(state.image), 'png').picture
+
+
+USER_SCENARIOS = [
+    Scenario('users.list_page', 'GET', '/users/',
+             lambda client, rng, state: client.get('/users/?limit=50')),
+    Scenario('users.list_all', 'GET', '/users/',
+             lambda client, rng, state: client.get('/users/')),
+    Scenario('users.get', 'GET', '/users/<int:user_id>',
+             lambda client, rng, state: client.get(f'/users/{_random_user(rng, state)}')),
+    Scenario('users.create', 'POST', '/users/',
+             lambda client, rng, state: client.post('/users/', json=_user_body(state.unique(), 'new')),
+             expected=(201,)),
+    Scenario('users.update', 'PUT', '/users/<int:user_id>',
+             lambda client, rng, state: client.put(
+                 f'/users/{_random_user(rng, state)}',
+                 json={'name': 'Updated User', 'email': f'updated{state.unique()}@example.com'})),
+    Scenario('users.delete', 'DELETE', '/users/<int:user_id>',
+             lambda client, rng, state: client.delete(f'/users/{_take(state, "users.delete")[0]}'),
+             prepare=_extra_rows(User, lambda n: user_row(n, 'delete'), 'users.delete')),
+    Scenario('users.bulk_create', 'POST', '/users/bulk',
+             lambda client, rng, state: client.post(
+                 '/users/bulk',
+                 json=[_user_body(state.unique(), 'bulk') for _ in range(BULK_SIZE)]),
+             expected=(201,)),
+    Scenario('users.bulk_update', 'PUT', '/users/bulk',
+             lambda client, rng, state: client.put(
+                 '/users/bulk',
+                 json=[{'id': user_id, 'name': 'Updated User', 'email': f'updated{state.unique()}@example.com'}
+                       for user_id in _user_ids(rng, state, BULK_SIZE)])),
+    Scenario('users.bulk_delete', 'DELETE', '/users/bulk',
+             lambda client, rng, state: client.delete(
+                 '/users/bulk', json=_take(state, 'users.bulk_delete', BULK_SIZE)),
+             prepare=_extra_rows(User, lambda n: user_row(n, 'bulkdelete'), 'users.bulk_delete', BULK_SIZE)),
+]
+
+PRODUCT_SCENARIOS = [
+    Scenario('products.list_page', 'GET', '/products/',
+             lambda client, rng, state: client.get('/products/?limit=50')),
+    Scenario('products.list_page_sparse', 'GET', '/products/',
+             lambda client, rng, state: client.get('/products/?limit=50&fields=name,price')),
+    Scenario('products.list_page_sorted', 'GET', '/products/',
+             lambda client, rng, state: client.get(
+                 f'/products/?limit=50&sort=price&order=desc&max_price={rng.randint(10, 100)}')),
+    Scenario('products.list_all', 'GET', '/products/',
+             lambda client, rng, state: client.get('/products/')),
+    Scenario('products.export', 'GET', '/products/export',
+             lambda client, rng, state: client.get('/products/export')),
+    Scenario('products.export_csv', 'GET', '/products/export',
+             lambda client, rng, state: client.get('/products/export?format=csv')),
+    Scenario('products.search', 'GET', '/products/search',
+             lambda client, rng, state: client.get('/products/search?q=brake%20pa&limit=20')),
+    Scenario('products.get', 'GET', '/products/<int:product_id>',
+             lambda client, rng, state: client.get(f'/products/{_random_product(rng, state)}')),
+    Scenario('products.create', 'POST', '/products/',
+             lambda client, rng, state: client.post('/products/', json=product_row(state.unique())),
+             expected=(201,)),
+    Scenario('products.update', 'PUT', '/products/<int:product_id>',
+             lambda client, rng, state: client.put(
+                 f'/products/{_random_product(rng, state)}',
+                 json={'name': f'Updated product {state.unique()}', 'price': 9.99})),
+    Scenario('products.delete', 'DELETE', '/products/<int:product_id>',
+             lambda client, rng, state: client.delete(f'/products/{_take(state, "products.delete")[0]}'),
+             prepare=_extra_rows(Product, product_row, 'products.delete')),
+    Scenario('products.upload_image', 'POST', '/products/<int:product_id>/upload_image',
+             # Distinct bytes per request, so every upload stores a new blob
+             lambda client, rng, state: client.post(
+                 f'/products/{_random_product(rng, state)}/upload_image',
+                 data=state.image + str(state.unique()).encode(), content_type='image/png'),
+             expected=(201,), prepare=_prepare_upload),
+    Scenario('products.image', 'GET', '/products/<int:product_id>/image',
+             lambda client, rng, state: client.get(f"/products/1/image?v={state.pools['products.image']}"),
+             prepare=_prepare_image),
+    Scenario('products.bulk_create', 'POST', '/products/bulk',
+             lambda client, rng, state: client.post(
+                 '/products/bulk', json=[product_row(state.unique()) for _ in range(BULK_SIZE)]),
+             expected=(201,)),
+    Scenario('products.bulk_update', 'PUT', '/products/bulk',
+             lambda client, rng, state: client.put(
+                 '/products/bulk',
+                 json=[{'id': product_id, 'name': f'Updated product {product_id}', 'price': 9.99}
+                       for product_id in _product_ids(rng, state, BULK_SIZE)])),
+    Scenario('products.bulk_delete', 'DELETE', '/products/bulk',
+             lambda client, rng, state: client.delete(
+                 '/products/bulk', json=_take(state, 'products.bulk_delete', BULK_SIZE)),
+             prepare=_extra_rows(Product, product_row, 'products.bulk_delete', BULK_SIZE)),
+]
+
+SCENARIOS = USER_SCENARIOS + PRODUCT_SCENARIOS
+
+
+def select_scenarios(patterns=None):
+    """Scenarios whose name starts with one of ``patterns``, e.g. ``users.`` or ``products.get``."""
+    if not patterns:
+        return list(SCENARIOS)
+    return [scenario for scenario in SCENARIOS if any(scenario.name.startswith(p) for p in patterns)]
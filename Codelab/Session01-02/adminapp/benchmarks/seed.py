@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import insert
+
+from app import create_app
+from config import ProductionConfig
+from extensions import db
+from products.models import Product
+from users.models import User, normalize_email
+from versioning import bump_table_version
+
+SEED_BATCH_SIZE = 10000
+WORDS = ('brake', 'pad', 'filter', 'oil', 'wiper', 'blade', 'spark', 'plug', 'battery', 'tyre', 'lamp', 'belt')
+
+
+class BenchmarkConfig(ProductionConfig):
+    TESTING = True
+    # Benchmarks measure the application, not the request log
+    METRICS_ENABLED = False
+
+
+class Workspace:
+    """A temporary directory holding the benchmark database and uploads."""
+
+    def __init__(self, root=None):
+        self.root = root or tempfile.mkdtemp(prefix='adminapp-bench-')
+        self.database = os.path.join(self.root, 'bench.db')
+        self.uploads = os.path.join(self.root, 'uploads')
+
+    def config(self, **overrides):
+        attributes = {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + self.database,
+            'UPLOAD_FOLDER': self.uploads,
+            **overrides
+        }
+        return type('Config', (BenchmarkConfig,), attributes)
+
+    def create_app(self, **overrides):
+        app = create_app(self.config(**overrides))
+        with app.app_context():
+            db.create_all()
+        return app
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def user_row(n, prefix='user'):
+    email = f'{prefix}{n}@example.com'
+    return {'name': f'User {n}', 'email': email, 'email_normalized': normalize_email(email)}
+
+
+def product_row(n):
+    name = f'{WORDS[n % len(WORDS)].title()} {WORDS[n * 7 % len(WORDS)]} {n}'
+    return {
+        'name': name,
+        'price': round(1 + n % 10000 / 100, 2),
+        'description': f'{name} for models {n % 97} and {n % 89}'
+    }
+
+
+def insert_rows(model, rows):
+    """Insert ``rows`` in batches, each one a single executemany."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            db.session.execute(insert(model), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+    bump_table_version(model.__tablename__)
+    db.session.commit()
+
+
+def seed(app, users, products):
+    with app.app_context():
+        insert_rows(User, (user_row(n) for n in range(1, users + 1)))
+        insert_rows(Product, (product_row(n) for n in range(1, products + 1)))
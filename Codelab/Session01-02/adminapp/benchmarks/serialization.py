@@ -0,0 +1,116 @@
+import gc
+import time
+import tracemalloc
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.seed import insert_rows, product_row
+from extensions import db
+from json_provider import OrjsonProvider, orjson
+from products.dtos import ProductDTO
+from products.models import Product
+from products.repositories import ProductRepository
+
+
+class DictProductDTO:
+    """The product DTO as it was before __slots__: one __dict__ per instance."""
+
+    def __init__(self, id, name, price, picture, description):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.picture = picture
+        self.description = description
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'price': self.price, 'description': self.description}
+
+
+def _dict_dto_items(rows):
+    return [DictProductDTO(row.id, row.name, row.price, None, row.description).to_dict() for row in rows]
+
+
+def _list_items(rows):
+    return [ProductDTO.list_item(row) for row in rows]
+
+
+def _per_row(provider):
+    # The former streaming path: one encoder call per row
+    def encode(items):
+        return '[' + ','.join(provider.dumps(item) for item in items) + ']'
+    return encode
+
+
+def _batched(provider):
+    return provider.dumps
+
+
+def strategies(app):
+    stdlib = DefaultJSONProvider(app)
+    found = [
+        ('dict-dto, json per row (before)', _dict_dto_items, _per_row(stdlib)),
+        ('slotted rows, json per batch', _list_items, _batched(stdlib)),
+    ]
+    if orjson is not None:
+        found.append(('slotted rows, orjson per batch', _list_items, _batched(OrjsonProvider(app))))
+    return found
+
+
+def measure(rows, build, encode, repeats=5):
+    """Best time and peak traced memory per row of turning ``rows`` into a JSON array."""
+    count = len(rows)
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        encode(build(rows))
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    encode(build(rows))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'us_per_row': round(best / count * 1e6, 3),
+        'peak_bytes_per_row': round(peak / count, 1),
+    }
+
+
+def instance_bytes(dto_class, count=10000):
+    """Memory held per DTO instance, e.g. by a page of results kept for a response."""
+    gc.collect()
+    tracemalloc.start()
+    instances = [dto_class(n, 'Brake pad', 10.0, None, 'Front axle') for n in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return round(current / count, 1)
+
+
+def run(rows=10000, repeats=5):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        insert_rows(Product, (product_row(n) for n in range(1, rows + 1)))
+        fetched = list(ProductRepository.iter_all(1000))
+        results = []
+        for name, build, encode in strategies(app):
+            results.append(dict(strategy=name, rows=rows, **measure(fetched, build, encode, repeats)))
+    return {
+        'list': results,
+        'instance_bytes': {'dict': instance_bytes(DictProductDTO), 'slots': instance_bytes(ProductDTO)},
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{result['strategy']:<34} {result['us_per_row']:>8.3f} us/row  peak {result['peak_bytes_per_row']:>7.1f} B/row"
+        for result in report['list']
+    ]
+    sizes = report['instance_bytes']
+    lines.append(f"ProductDTO instance: {sizes['dict']} B with __dict__, {sizes['slots']} B with __slots__")
+    return '\n'.join(lines)
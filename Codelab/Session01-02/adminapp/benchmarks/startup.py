@@ -0,0 +1,97 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_PROFILES = ('config.Config', 'config.ProductionConfig')
+# Import plus create_app of the production profile, in a fresh interpreter
+DEFAULT_BUDGET_MS = 1000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter, so nothing is imported or cached beforehand
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app(sys.argv[1])
+created = time.perf_counter()
+timings = {'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000, 'first_docs_ms': None}
+if application.config['SWAGGER_ENABLED']:
+    started = time.perf_counter()
+    application.test_client().get('/apispec_1.json')
+    timings['first_docs_ms'] = (time.perf_counter() - started) * 1000
+print(json.dumps(timings))
+'''
+
+
+def _probe(profile, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE, profile]
+    # The profile must come from the argument, not from the caller's environment
+    env = {key: value for key, value in os.environ.items() if key != 'APP_CONFIG'}
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def parse_importtime(text):
+    """
+    Read ``-X importtime`` output into ``(name, level, self_us, cumulative_us)`` tuples.
+
+    ``level`` is the nesting depth; 0 for modules the program imported itself.
+    """
+    modules = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2][1:]
+        stripped = name.lstrip(' ')
+        modules.append((stripped, (len(name) - len(stripped)) // 2, int(fields[0]), int(fields[1])))
+    return modules
+
+
+def slowest_packages(modules, count=10):
+    """Self import time per top-level package, in milliseconds, slowest first."""
+    totals = {}
+    for name, _, self_us, _ in modules:
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + self_us
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [{'package': package, 'self_ms': round(us / 1000, 1)} for package, us in ranked]
+
+
+def measure(profile, repeats=5):
+    runs = [_probe(profile)[0] for _ in range(repeats)]
+    _, importtime = _probe(profile, importtime=True)
+    result = {'profile': profile, 'repeats': repeats}
+    for key in ('import_ms', 'create_app_ms', 'first_docs_ms'):
+        values = [run[key] for run in runs if run[key] is not None]
+        result[key] = round(statistics.median(values), 1) if values else None
+    result['startup_ms'] = round(result['import_ms'] + result['create_app_ms'], 1)
+    result['slowest_packages'] = slowest_packages(parse_importtime(importtime))
+    return result
+
+
+def run(profiles=DEFAULT_PROFILES, repeats=5):
+    return [measure(profile, repeats) for profile in profiles]
+
+
+def over_budget(results, budget_ms, profile=DEFAULT_PROFILES[-1]):
+    """The results of ``profile`` whose startup exceeded ``budget_ms``."""
+    return [result for result in results if result['profile'] == profile and result['startup_ms'] > budget_ms]
+
+
+def format_report(results):
+    lines = []
+    for result in results:
+        docs = f"{result['first_docs_ms']:.1f} ms" if result['first_docs_ms'] is not None else 'disabled'
+        lines.append(
+            f"{result['profile']:<24} startup {result['startup_ms']:>7.1f} ms "
+            f"(import {result['import_ms']:.1f}, create_app {result['create_app_ms']:.1f})  first /apispec_1.json {docs}"
+        )
+        lines.append('    ' + ', '.join(f"{item['package']} {item['self_ms']}" for item in result['slowest_packages']))
+    return '\n'.join(lines)
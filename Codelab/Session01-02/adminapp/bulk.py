@@ -0,0 +1,55 @@
+from flask import current_app, jsonify, request
+
+# Keeps IN (...) lists well below SQLite's bound parameter limit
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+def chunked(values, size=IN_CLAUSE_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def read_bulk_body():
+    """
+    Read the JSON array body of a bulk request.
+
+    Returns ``(items, error_response)``; exactly one of them is None.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'message': 'Request body must be a non-empty array'}), 400)
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 50000)
+    if len(items) > max_items:
+        return None, (jsonify({'message': f'At most {max_items} items are allowed per request'}), 400)
+    return items, None
+
+
+def validation_error_response(errors):
+    return jsonify({'message': 'Validation failed', 'errors': errors}), 400
+
+
+def collect_errors(items, validate):
+    errors = []
+    for index, item in enumerate(items):
+        message = validate(item)
+        if message:
+            errors.append({'index': index, 'message': message})
+    return errors
+
+
+def duplicate_errors(values, message):
+    errors = []
+    seen = set()
+    for index, value in enumerate(values):
+        if value in seen:
+            errors.append({'index': index, 'message': message})
+        seen.add(value)
+    return errors
+
+
+def id_results(ids, affected_ids, success_status):
+    return [
+        {'index': index, 'id': item_id, 'status': success_status if item_id in affected_ids else 404}
+        for index, item_id in enumerate(ids)
+    ]
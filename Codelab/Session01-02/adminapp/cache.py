@@ -0,0 +1,350 @@
+import fnmatch
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_size=1024, ttl=60, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedClient:
+    """
+    In-process stand-in for a shared cache server.
+
+    Implements the small subset of the redis-py client used by SharedCache,
+    so tests and single-node deployments run without a cache server.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (value, self._clock() + ex if ex else None)
+        return True
+
+    def mget(self, *names):
+        return [self.get(name) for name in names]
+
+    def incr(self, name):
+        with self._lock:
+            value, expires_at = self._data.get(name, (b'0', None))
+            value = int(value) + 1
+            self._data[name] = (str(value).encode('ascii'), expires_at)
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match):
+        with self._lock:
+            return [name for name in list(self._data) if fnmatch.fnmatchcase(name, match)]
+
+
+class SharedCache:
+    """
+    Cache layer shared between processes, storing JSON encoded values.
+
+    Each key has a generation, a counter bumped by every delete. A value is
+    stored with the generation read before it was loaded and only served
+    while that is still the current one, so a load that raced a delete in
+    any process cannot put the old value back. Generation counters are kept
+    without expiry, one per key ever deleted.
+    """
+
+    def __init__(self, client, ttl=300, prefix='adminapp:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _generation_key(self, key):
+        return self.prefix + 'generation:' + key
+
+    def generation(self, key):
+        return int(self.client.get(self._generation_key(key)) or 0)
+
+    def get(self, key):
+        # One round trip for the value and its key's current generation
+        generation, raw = self.client.mget(self._generation_key(key), self.prefix + key)
+        if raw is None:
+            return MISSING
+        entry = json.loads(raw)
+        if entry['generation'] != int(generation or 0):
+            return MISSING
+        return entry['value']
+
+    def set(self, key, value, generation=None):
+        if generation is None:
+            generation = self.generation(key)
+        raw = json.dumps({'generation': generation, 'value': value})
+        self.client.set(self.prefix + key, raw, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.incr(self._generation_key(key))
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        # Only this app's keys; the database may be shared with others
+        names = list(self.client.scan_iter(match=self.prefix + '*'))
+        for start in range(0, len(names), 500):
+            self.client.delete(*names[start:start + 500])
+
+    @classmethod
+    def from_url(cls, url, ttl=300):
+        if url.startswith('local://'):
+            return cls(LocalSharedClient(), ttl)
+        import redis  # optional dependency, only needed for a real shared backend
+        return cls(redis.Redis.from_url(url), ttl)
+
+
+class TieredCache:
+    """
+    An in-process LRU in front of an optional shared cache.
+
+    Loads go through load_token and set: a value loaded while its key was
+    deleted is not cached, so a load racing an invalidation cannot bring
+    the old value back.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        # Bumped by every delete; a coarse local generation shared by all keys
+        self._deletes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self._count('local_hits')
+            return value
+        if self.shared is not None:
+            deletes = self._deletes
+            value = self.shared.get(key)
+            if value is not MISSING:
+                self._count('shared_hits')
+                self._set_local(key, value, deletes)
+                return value
+        self._count('misses')
+        return MISSING
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def load_token(self, key):
+        """Taken before loading a value for ``key``; pass it to set."""
+        shared_generation = self.shared.generation(key) if self.shared is not None else None
+        return self._deletes, shared_generation
+
+    def set(self, key, value, token=None):
+        deletes, shared_generation = token if token is not None else (None, None)
+        if self.shared is not None:
+            self.shared.set(key, value, shared_generation)
+        self._set_local(key, value, deletes)
+
+    def _set_local(self, key, value, deletes):
+        with self._lock:
+            # Under the lock delete takes too, so no delete can slip in between
+            if deletes is None or deletes == self._deletes:
+                self.local.set(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._deletes += 1
+            self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._deletes += 1
+            self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        with self._lock:
+            local_hits, shared_hits, misses = self.local_hits, self.shared_hits, self.misses
+        hits = local_hits + shared_hits
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'local_hits': local_hits,
+            'shared_hits': shared_hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+            'size': len(self.local)
+        }
+
+
+class EntityCache:
+    """
+    Read-through cache for single entity lookups done by the services.
+
+    Values are plain dicts so they can live in a shared backend. Apps that
+    did not call init_app (or set CACHE_ENABLED to False) bypass the cache.
+
+    An invalidation clears the entry in this process and in the shared
+    backend at once, but other processes' local LRUs keep their copy until
+    it expires. With CACHE_SHARED_URL set, local entries therefore live at
+    most CACHE_SHARED_LOCAL_TTL seconds, which bounds how long another
+    worker serves a changed entity (and its ETag). Without a shared backend
+    that bound is CACHE_TTL, so run several workers only with a short one.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_ENABLED', True)
+        app.config.setdefault('CACHE_MAX_SIZE', 10000)
+        app.config.setdefault('CACHE_TTL', 60)
+        app.config.setdefault('CACHE_SHARED_URL', None)
+        app.config.setdefault('CACHE_SHARED_TTL', 300)
+        app.config.setdefault('CACHE_SHARED_LOCAL_TTL', 1)
+        if not app.config['CACHE_ENABLED']:
+            return
+
+        shared = None
+        local_ttl = app.config['CACHE_TTL']
+        if app.config['CACHE_SHARED_URL']:
+            shared = SharedCache.from_url(app.config['CACHE_SHARED_URL'], app.config['CACHE_SHARED_TTL'])
+            local_ttl = min(local_ttl, app.config['CACHE_SHARED_LOCAL_TTL'])
+        local = LRUCache(app.config['CACHE_MAX_SIZE'], local_ttl)
+        app.extensions['entity_cache'] = TieredCache(local, shared)
+
+    @property
+    def backend(self):
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('entity_cache')
+
+    @staticmethod
+    def make_key(namespace, entity_id):
+        return f'{namespace}:{entity_id}'
+
+    def get_or_load(self, namespace, entity_id, loader):
+        backend = self.backend
+        if backend is None:
+            return loader(entity_id)
+        key = self.make_key(namespace, entity_id)
+        value = backend.get(key)
+        if value is MISSING:
+            token = backend.load_token(key)
+            value = loader(entity_id)
+            if value is not None:
+                backend.set(key, value, token)
+        return value
+
+    def peek(self, namespace, entity_id):
+        """Return the cached value, or None without loading anything."""
+        backend = self.backend
+        if backend is None:
+            return None
+        value = backend.get(self.make_key(namespace, entity_id))
+        return None if value is MISSING else value
+
+    def invalidate(self, namespace, entity_id):
+        backend = self.backend
+        if backend is not None:
+            backend.delete(self.make_key(namespace, entity_id))
+
+    def clear(self):
+        backend = self.backend
+        if backend is not None:
+            backend.clear()
+
+    def stats(self):
+        backend = self.backend
+        return backend.stats() if backend is not None else {}
+
+
+class AsyncEntityCache(EntityCache):
+    """
+    EntityCache for the ASGI app, whose loaders are coroutines.
+
+    The backend is the same TieredCache, looked up in Quart's app context.
+    """
+
+    @property
+    def backend(self):
+        # Imported here so the WSGI app does not need Quart installed
+        from quart import current_app, has_app_context
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('entity_cache')
+
+    async def get_or_load(self, namespace, entity_id, loader):
+        backend = self.backend
+        if backend is None:
+            return await loader(entity_id)
+        key = self.make_key(namespace, entity_id)
+        value = backend.get(key)
+        if value is MISSING:
+            token = backend.load_token(key)
+            value = await loader(entity_id)
+            if value is not None:
+                backend.set(key, value, token)
+        return value
@@ -0,0 +1,198 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from bulk import duplicate_errors
+from extensions import refresh_replica
+from importing import FORMATS, ImportFailed, ParseError, detect_format, import_records, read_records
+from products.derivatives import pillow_available, render_many
+from products.export import FORMATS as EXPORT_FORMATS, export_chunks, parse_since
+from products.services import ProductService
+from products.storage import content_store
+from users.models import normalize_email
+from users.services import UserService
+
+PRODUCT_CSV_TYPES = {'id': int, 'price': float}
+USER_CSV_TYPES = {'id': int}
+
+
+def _errors(items, validate):
+    errors = {}
+    for index, item in enumerate(items):
+        message = item.message if isinstance(item, ParseError) else validate(item)
+        if message:
+            errors[index] = message
+    return errors
+
+
+def _add_duplicates(errors, items, key, message):
+    # Among the valid items with a key, every repeat of a key after its first occurrence
+    indexes = [index for index in range(len(items)) if index not in errors and key(items[index]) is not None]
+    for error in duplicate_errors([key(items[index]) for index in indexes], message):
+        errors[indexes[error['index']]] = error['message']
+
+
+def validate_products(items):
+    errors = _errors(items, lambda item: ProductService.validate_product_data(
+        item, require_id=isinstance(item, dict) and item.get('id') is not None))
+    _add_duplicates(errors, items, lambda item: item.get('id'), 'Duplicate id')
+    return errors
+
+
+def validate_users(items):
+    errors = _errors(items, lambda item: UserService.validate_user_data(
+        item, require_id=isinstance(item, dict) and item.get('id') is not None))
+    _add_duplicates(errors, items, lambda item: normalize_email(item['email']), 'Duplicate email')
+    _add_duplicates(errors, items, lambda item: item.get('id'), 'Duplicate id')
+    # Rows matched by id must not take an email another user has; rows matched by email cannot
+    by_id = [index for index, item in enumerate(items) if index not in errors and item.get('id') is not None]
+    for conflict in UserService.email_conflicts([items[index] for index in by_id]):
+        errors[by_id[conflict]] = 'Email already in use'
+    return errors
+
+
+def run_import(path, format, batch_size, offset, types, validate_batch, write_batch):
+    format = format or detect_format(path)
+    if format is None:
+        raise click.UsageError('Cannot tell the format from the file name, pass --format')
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 1000)
+
+    def on_invalid(line, message):
+        click.echo(f'Line {line}: {message}', err=True)
+
+    def on_progress(stats):
+        click.echo(f'{stats.read} records read, {stats.written} written, {stats.invalid} invalid')
+
+    with click.open_file(path, encoding='utf-8') as stream:
+        try:
+            stats = import_records(
+                read_records(stream, format, types), validate_batch, write_batch,
+                batch_size, offset, on_invalid, on_progress
+            )
+        except ImportFailed as error:
+            raise click.ClickException(
+                f'{error}. Records before {error.offset} are imported; rerun with --offset {error.offset} to resume.'
+            )
+    click.echo(f'Done: {stats.written} records imported, {stats.invalid} skipped as invalid.')
+
+
+import_options = [
+    click.argument('path', type=click.Path(allow_dash=True)),
+    click.option('--format', type=click.Choice(FORMATS), help='Input format; by default taken from the file extension.'),
+    click.option('--batch-size', type=click.IntRange(min=1), help='Records per transaction (IMPORT_BATCH_SIZE).'),
+    click.option('--offset', type=click.IntRange(min=0), default=0, help='Number of records to skip, to resume an import.'),
+]
+
+
+def with_import_options(command):
+    for option in reversed(import_options):
+        command = option(command)
+    return command
+
+
+@click.command('import-products')
+@with_import_options
+@with_appcontext
+def import_products_command(path, format, batch_size, offset):
+    """Create or update products from a CSV or NDJSON file ('-' reads stdin).
+
+    Records with an id update that product, the others create one.
+    """
+    run_import(path, format, batch_size, offset, PRODUCT_CSV_TYPES, validate_products, ProductService.upsert_products)
+
+
+@click.command('import-users')
+@with_import_options
+@with_appcontext
+def import_users_command(path, format, batch_size, offset):
+    """Create or update users from a CSV or NDJSON file ('-' reads stdin).
+
+    Records with an id update that user, the others update the user with
+    the same email (ignoring case) or create one.
+    """
+    run_import(path, format, batch_size, offset, USER_CSV_TYPES, validate_users, UserService.upsert_users)
+
+
+@click.command('export-products')
+@click.argument('path', type=click.Path(allow_dash=True, dir_okay=False), default='-')
+@click.option('--format', type=click.Choice(tuple(EXPORT_FORMATS)), help='Output format; by default taken from the file extension, else ndjson.')
+@click.option('--since', help='Only products updated at or after this ISO 8601 timestamp (UTC unless it has an offset).')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Rows fetched and written at a time (STREAM_BATCH_SIZE).')
+@with_appcontext
+def export_products_command(path, format, since, batch_size):
+    """Write the catalog as NDJSON or CSV to PATH (default stdout).
+
+    Rows are streamed from the database cursor, so memory use does not
+    grow with the catalog.
+    """
+    format = format or detect_format(path) or 'ndjson'
+    since, error = parse_since(since)
+    if error:
+        raise click.BadParameter(error, param_hint='--since')
+    batch_size = batch_size or current_app.config.get('STREAM_BATCH_SIZE', 1000)
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for count, row in enumerate(rows, 1):
+            yield row
+
+    rows = counted(ProductService.iter_export(batch_size, since))
+    with click.open_file(path, 'w', encoding='utf-8', atomic=path != '-') as output:
+        for chunk in export_chunks(rows, format, current_app.json.dumps, batch_size):
+            output.write(chunk)
+    click.echo(f'Exported {count} products.', err=True)
+
+
+@click.command('generate-derivatives')
+@click.option('--workers', type=click.IntRange(min=1), help='Worker processes (IMAGE_DERIVATIVE_WORKERS).')
+@click.option('--all', 'render_all', is_flag=True, help='Render every image again, not only those missing a size.')
+@with_appcontext
+def generate_derivatives_command(workers, render_all):
+    """
+    Render the scaled copies of stored images, in parallel.
+
+    By default only images lacking one of IMAGE_DERIVATIVE_SIZES are
+    rendered, so an interrupted run picks up where it stopped.
+    """
+    if not pillow_available():
+        raise click.ClickException('Rendering derivatives needs Pillow, which is not installed.')
+    config = current_app.config
+    sizes = config['IMAGE_DERIVATIVE_SIZES']
+    keys = ProductService.image_keys_missing_derivatives(None if render_all else sizes)
+    click.echo(f'{len(keys)} images to render.')
+    rendered = failed = 0
+    results = render_many(
+        content_store(), keys, sizes, config['IMAGE_DERIVATIVE_FORMAT'], config['IMAGE_DERIVATIVE_QUALITY'],
+        workers or config['IMAGE_DERIVATIVE_WORKERS']
+    )
+    # Results are recorded here, one transaction each, so SQLite sees a single writer
+    for key, derivatives, error in results:
+        if error is None and ProductService.record_image_derivatives(key, derivatives):
+            rendered += 1
+        elif error is not None:
+            failed += 1
+            click.echo(f'{key}: {error}', err=True)
+    if failed:
+        raise click.ClickException(f'{rendered} rendered, {failed} failed; rerun to retry the failed ones.')
+    click.echo(f'Done: {rendered} rendered.')
+
+
+@click.command('refresh-replicas')
+@with_appcontext
+def refresh_replicas_command():
+    """Copy the primary database into each SQLite replica of DB_READ_REPLICAS."""
+    replicas = current_app.config.get('DB_READ_REPLICAS') or ()
+    if not replicas:
+        raise click.ClickException('No replicas configured, set DB_READ_REPLICAS.')
+    for key in replicas:
+        refresh_replica(key)
+        click.echo(f'Refreshed {key}.')
+
+
+def init_cli(app):
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(export_products_command)
+    app.cli.add_command(generate_derivatives_command)
+    app.cli.add_command(refresh_replicas_command)
+    app.cli.add_command(import_users_command)
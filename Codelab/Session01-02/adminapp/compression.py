@@ -0,0 +1,189 @@
+import zlib
+
+from flask import current_app, request
+
+from cache import MISSING, LRUCache
+from metrics import Counter
+
+try:
+    import brotli  # optional dependency, enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard  # optional dependency, enables Content-Encoding: zstd
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing; images and other binary formats are already compressed
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+
+
+def _gzip_stream(level):
+    # wbits 31 writes a gzip container; its header carries no timestamp, so output is reproducible
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def _brotli_stream(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.finish
+
+
+def _zstd_stream(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def available_codecs():
+    """Content codings this process can produce, most preferred first."""
+    codecs = {}
+    if zstandard is not None:
+        codecs['zstd'] = _zstd_stream
+    if brotli is not None:
+        codecs['br'] = _brotli_stream
+    codecs['gzip'] = _gzip_stream
+    return codecs
+
+
+def compress(data, coding, level):
+    write, finish = available_codecs()[coding](level)
+    return write(data) + finish()
+
+
+def is_compressible(response):
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return False
+    # send_file responses, and anything the client may request ranges of
+    if response.direct_passthrough or 'Accept-Ranges' in response.headers:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return response.mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+
+
+class CompressionState:
+    """Codecs, compressed body cache and metrics of one app."""
+
+    def __init__(self, codecs, cache, registry=None):
+        self.codecs = codecs
+        self.cache = cache
+        self.responses = self.cache_lookups = None
+        if registry is not None:
+            self.responses = registry.register(Counter(
+                'adminapp_compressed_responses_total', 'Compressed responses by content coding.', ('coding',)))
+            self.cache_lookups = registry.register(Counter(
+                'adminapp_compression_cache_total', 'Compressed body cache lookups.', ('result',)))
+
+
+class Compression:
+    """
+    Negotiated Content-Encoding for responses: zstd and br when their
+    libraries are installed, gzip always.
+
+    Buffered bodies under COMPRESSION_MIN_SIZE are sent as they are;
+    streamed bodies are compressed as they are produced. Compressed bodies
+    of GET responses with an ETag are kept in a bounded LRU cache, keyed by
+    URL, ETag and coding: an ETag names exactly one body, so entries never
+    go stale, and a hit skips compression and, for streamed lists, the
+    query behind the stream.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESSION_ENABLED', True)
+        app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESSION_LEVELS', DEFAULT_LEVELS)
+        app.config.setdefault('COMPRESSION_CACHE_SIZE', 256)
+        app.config.setdefault('COMPRESSION_CACHE_MAX_ENTRY_SIZE', 1024 * 1024)
+        if not app.config['COMPRESSION_ENABLED']:
+            return
+
+        app.extensions['compression'] = CompressionState(
+            available_codecs(),
+            LRUCache(app.config['COMPRESSION_CACHE_SIZE'], ttl=float('inf')),
+            app.extensions.get('metrics')
+        )
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _after_request(response):
+        if not is_compressible(response):
+            return response
+        config = current_app.config
+        if not response.is_streamed and len(response.get_data()) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        state = current_app.extensions['compression']
+        coding = request.accept_encodings.best_match(state.codecs)
+        if coding is None:
+            return response
+        level = config['COMPRESSION_LEVELS'].get(coding, DEFAULT_LEVELS[coding])
+
+        etag, _ = response.get_etag()
+        key = None
+        if etag and request.method == 'GET' and 'no-store' not in response.headers.get('Cache-Control', ''):
+            key = (request.full_path, etag, coding)
+        body = state.cache.get(key) if key else MISSING
+        if state.cache_lookups is not None and key:
+            state.cache_lookups.inc('hit' if body is not MISSING else 'miss')
+
+        if body is not MISSING:
+            if response.is_streamed:
+                # The stream was never iterated, so its query never ran
+                close = getattr(response.response, 'close', None)
+                if close is not None:
+                    close()
+            response.set_data(body)
+        elif response.is_streamed:
+            store = None
+            if key:
+                store = lambda body: state.cache.set(key, body)
+            response.response = _compress_chunks(
+                response.response, response.iter_encoded(), state.codecs[coding](level),
+                config['COMPRESSION_CACHE_MAX_ENTRY_SIZE'], store)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = compress(response.get_data(), coding, level)
+            if key and len(body) <= config['COMPRESSION_CACHE_MAX_ENTRY_SIZE']:
+                state.cache.set(key, body)
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = coding
+        if etag:
+            # The encoded body is a different byte sequence than the identity one
+            response.set_etag(etag, weak=True)
+        if state.responses is not None:
+            state.responses.inc(coding)
+        return response
+
+
+def _compress_chunks(source, chunks, codec, max_cache_size, store=None):
+    """Compress ``chunks`` on the fly; once complete, pass the body to ``store`` if it fits the cache."""
+    write, finish = codec
+    parts = [] if store is not None else None
+    size = 0
+    try:
+        for chunk in chunks:
+            data = write(chunk)
+            if not data:
+                continue
+            size += len(data)
+            if parts is not None and size > max_cache_size:
+                parts = None
+            if parts is not None:
+                parts.append(data)
+            yield data
+        data = finish()
+        if parts is not None and size + len(data) <= max_cache_size:
+            store(b''.join(parts) + data)
+        yield data
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
@@ -6,5 +6,109 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Bind keys of read replicas, e.g. SQLALCHEMY_BINDS = {'replica': 'sqlite:///replica.db'}
+    # with DB_READ_REPLICAS = ('replica',). Lists, search and exports read from one
+    # refreshed within DB_REPLICA_MAX_LAG seconds; writes and a request's reads
+    # after its writes, or with an X-Read-Primary header, use the primary.
+    DB_READ_REPLICAS = ()
+    DB_REPLICA_MAX_LAG = 5.0
+    DB_REPLICA_LAG_CHECK_INTERVAL = 1.0
+    # Seconds between refreshes of SQLite replica files from the primary through
+    # the backup API, on a background thread; for local use, None to leave it off
+    DB_REPLICA_REFRESH_INTERVAL = None
     UPLOAD_FOLDER = UPLOAD_FOLDER
-    DEBUG = True
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    # GET /products/<id>/image: None sends the file from this process (sendfile
+    # through wsgi.file_wrapper); 'x-sendfile' (Apache) or 'x-accel-redirect'
+    # (nginx) leaves it to the proxy. nginx needs an internal location at the
+    # prefix aliasing UPLOAD_FOLDER.
+    IMAGE_OFFLOAD = None
+    IMAGE_ACCEL_REDIRECT_PREFIX = '/_uploads/'
+    # Scaled copies served by GET /products/<id>/image?size=<name>, each fitting
+    # a square of the given side. Rendered after upload by a pool of worker
+    # processes when Pillow is installed; `flask generate-derivatives` renders
+    # those of earlier uploads.
+    IMAGE_DERIVATIVES_ENABLED = True
+    IMAGE_DERIVATIVE_SIZES = {'thumb': 64, 'small': 256, 'medium': 1024}
+    IMAGE_DERIVATIVE_FORMAT = 'webp'
+    IMAGE_DERIVATIVE_QUALITY = 80
+    IMAGE_DERIVATIVE_WORKERS = 2
+    # Uploads arriving with this many renders queued are left to the command
+    IMAGE_DERIVATIVE_MAX_PENDING = 64
+    DEBUG = True
+    PAGE_SIZE_DEFAULT = 50
+    PAGE_SIZE_MAX = 1000
+    # Deepest offset of a search page; SQLite ranks and skips every result before it
+    SEARCH_OFFSET_MAX = 10000
+    STREAM_BATCH_SIZE = 1000
+    BULK_MAX_ITEMS = 50000
+    # Records per transaction of the import-products and import-users commands
+    IMPORT_BATCH_SIZE = 1000
+    # Sent with ETag/Last-Modified on GET responses; no-cache makes clients revalidate
+    HTTP_CACHE_CONTROL = 'no-cache'
+    CACHE_ENABLED = True
+    CACHE_MAX_SIZE = 10000
+    CACHE_TTL = 60
+    # e.g. 'redis://localhost:6379/0', or 'local://' for the in-process stand-in
+    CACHE_SHARED_URL = os.getenv('CACHE_SHARED_URL')
+    CACHE_SHARED_TTL = 300
+    # With a shared cache, how long each process keeps its own copy of an entry:
+    # the longest another worker serves an entity after it was changed
+    CACHE_SHARED_LOCAL_TTL = 1
+    SQLITE_PRAGMAS = {}
+    DB_WRITE_RETRIES = 5
+    DB_WRITE_RETRY_BASE_DELAY = 0.01
+    DB_WRITE_RETRY_MAX_DELAY = 0.5
+    # Single-row creates, updates and deletes from concurrent requests are
+    # committed together by one writer thread: those arriving within
+    # GROUP_COMMIT_WINDOW seconds, up to GROUP_COMMIT_MAX_BATCH, share a transaction.
+    # Batches cannot outgrow ADMISSION_MAX_WRITERS, so raise it along with this.
+    GROUP_COMMIT_ENABLED = False
+    GROUP_COMMIT_WINDOW = 0.002
+    GROUP_COMMIT_MAX_BATCH = 64
+    # Longest a request waits for its write to be committed before getting 503
+    GROUP_COMMIT_TIMEOUT = 30
+    # Encode JSON with orjson when it is installed
+    JSON_FAST_ENCODER = True
+    # Content-Encoding negotiation: gzip, plus br/zstd when brotli/zstandard are installed
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+    # Compressed bodies of responses with an ETag, reused until the ETag changes
+    COMPRESSION_CACHE_SIZE = 256
+    COMPRESSION_CACHE_MAX_ENTRY_SIZE = 1024 * 1024
+    METRICS_ENABLED = True
+    # Write requests (POST/PUT/PATCH/DELETE) running at once, per process; up to
+    # ADMISSION_QUEUE_SIZE more wait ADMISSION_QUEUE_TIMEOUT seconds for a slot,
+    # the rest get 503 with Retry-After
+    ADMISSION_ENABLED = True
+    ADMISSION_MAX_WRITERS = 2
+    ADMISSION_QUEUE_SIZE = 16
+    ADMISSION_QUEUE_TIMEOUT = 2.0
+    ADMISSION_RETRY_AFTER = 1
+    # Writes per second and burst per client address, beyond which 429 is sent; None for no limit
+    ADMISSION_CLIENT_RATE = None
+    ADMISSION_CLIENT_BURST = 10
+    # Swagger UI at /apidocs/; flasgger is imported and the spec built on the first request
+    SWAGGER_ENABLED = True
+    # Registers Flask-Migrate (Alembic) for the `flask db` commands
+    MIGRATIONS_ENABLED = True
+    METRICS_PATH = '/metrics'
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    # WAL lets readers proceed while a writer is active; the remaining
+    # pragmas are per connection and applied by an engine connect hook
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,
+        'cache_size': -64000,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY'
+    }
+    # Workers start without flasgger and Alembic; run `flask db upgrade`
+    # with MIGRATIONS_ENABLED=1 in its environment
+    SWAGGER_ENABLED = False
+    MIGRATIONS_ENABLED = os.getenv('MIGRATIONS_ENABLED') == '1'
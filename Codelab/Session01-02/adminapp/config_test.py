@@ -5,4 +5,13 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 
 TESTING = True
 SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-UPLOAD_FOLDER = UPLOAD_FOLDER
\ No newline at end of file
+UPLOAD_FOLDER = UPLOAD_FOLDER
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 1000
+STREAM_BATCH_SIZE = 1000
+# The suite builds an app per test; neither is exercised through it
+SWAGGER_ENABLED = False
+MIGRATIONS_ENABLED = False
+# No worker processes behind uploads; the tests that need them turn this on
+IMAGE_DERIVATIVES_ENABLED = False
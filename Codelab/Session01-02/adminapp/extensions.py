@@ -1,4 +1,365 @@
 # extensions.py
+import contextlib
+import functools
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+from cache import EntityCache
+from admission import AdmissionControl
+from compression import Compression
+from apidocs import LazySwagger
+from metrics import Counter, Gauge, Metrics
+from products.derivatives import DerivativePipeline
+
+# Sent with any value, makes every read of the request go to the primary
+PRIMARY_READ_HEADER = 'X-Read-Primary'
+# Written into a replica after each refresh, so any process can tell its lag
+REPLICA_SYNC_TABLE = 'replica_sync'
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs made inside replica_reads() to a read
+    replica, when the app has any (see ReplicaRouting). Everything else,
+    writes and reads after a write included, goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                _note_write(self)
+            elif self.info.get('replica_reads') and has_app_context():
+                engine = _replica_engine(self)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+cache = EntityCache()
+metrics = Metrics()
+compression = Compression()
+swagger = LazySwagger()
+derivatives = DerivativePipeline()
+admission = AdmissionControl()
+
+
+def init_sqlite_pragmas(app):
+    """Apply app.config['SQLITE_PRAGMAS'] to every new SQLite connection of the app's engines."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', functools.partial(_apply_pragmas, pragmas))
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def is_lock_error(error):
+    if not isinstance(error, OperationalError) or not isinstance(error.orig, sqlite3.OperationalError):
+        return False
+    message = str(error.orig).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _retry_settings():
+    config = current_app.config if has_app_context() else {}
+    return (
+        config.get('DB_WRITE_RETRIES', 5),
+        config.get('DB_WRITE_RETRY_BASE_DELAY', 0.01),
+        config.get('DB_WRITE_RETRY_MAX_DELAY', 0.5)
+    )
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    # Exponential backoff with jitter so retrying writers do not collide again
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _backoff(attempt, base_delay, max_delay):
+    time.sleep(backoff_delay(attempt, base_delay, max_delay))
+
+
+def retry_on_lock(func):
+    """
+    Retry a self-contained write when SQLite reports lock contention.
+
+    The wrapped function must be safe to run again from scratch; the session
+    is rolled back before each retry.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries, base_delay, max_delay = _retry_settings()
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not is_lock_error(e) or attempt >= retries:
+                    raise
+                _backoff(attempt, base_delay, max_delay)
+                attempt += 1
+    return wrapper
+
+
+def commit_with_retry(expire=True):
+    """
+    Commit the session's pending unit of work, retrying on lock contention.
+
+    A failed flush forces a rollback, which discards pending changes, so the
+    new, modified and deleted objects are recorded first and re-applied
+    before each retry. ``expire=False`` keeps the committed attributes loaded,
+    for callers that only read back what they just wrote.
+    """
+    session = db.session
+    new = list(session.new)
+    deleted = list(session.deleted)
+    changes = [
+        (obj, {attr.key: attr.value for attr in inspect(obj).attrs if attr.history.has_changes()})
+        for obj in session.dirty
+    ]
+    if expire:
+        _commit_replaying(session, new, deleted, changes)
+        return
+    current = session()
+    previous, current.expire_on_commit = current.expire_on_commit, False
+    try:
+        _commit_replaying(session, new, deleted, changes)
+    finally:
+        current.expire_on_commit = previous
+
+
+def _commit_replaying(session, new, deleted, changes):
+    retries, base_delay, max_delay = _retry_settings()
+    attempt = 0
+    while True:
+        try:
+            session.commit()
+            return
+        except OperationalError as e:
+            session.rollback()
+            if not is_lock_error(e) or attempt >= retries:
+                raise
+        except Exception:
+            # e.g. IntegrityError: leave the session usable for the caller
+            session.rollback()
+            raise
+        _backoff(attempt, base_delay, max_delay)
+        attempt += 1
+        session.add_all(new)
+        for obj, values in changes:
+            for key, value in values.items():
+                setattr(obj, key, value)
+        for obj in deleted:
+            session.delete(obj)
+
+
+def _note_write(session):
+    session.info['wrote'] = True
+    if has_request_context():
+        g._db_wrote = True
+
+
+def note_write():
+    """Record that this request wrote, for writes made on another session; later reads go to the primary."""
+    _note_write(db.session())
+
+
+def force_primary_reads():
+    """Send the remaining reads of the current request to the primary."""
+    g._db_primary = True
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """Let the SELECTs made in the block go to a read replica."""
+    # Kept on the session, not in a context variable: a streamed body runs
+    # its query from a generator, after the view returned
+    info = db.session().info
+    info['replica_reads'] = info.get('replica_reads', 0) + 1
+    try:
+        yield
+    finally:
+        info['replica_reads'] -= 1
+
+
+def _replica_engine(session):
+    routing = current_app.extensions.get('replica_routing')
+    if routing is None or session.info.get('wrote'):
+        return None
+    if not has_request_context():
+        key = routing.choose()
+    elif g.get('_db_wrote') or g.get('_db_primary') or PRIMARY_READ_HEADER in request.headers:
+        return None
+    else:
+        # One replica per request, so its reads see one state of the data
+        if '_db_replica' not in g:
+            g._db_replica = routing.choose()
+        key = g._db_replica
+    return db.engines[key] if key is not None else None
+
+
+def read_replica_sync_time(engine):
+    """When the replica behind ``engine`` was last refreshed, as a Unix time; None if never."""
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(f'SELECT synced_at FROM {REPLICA_SYNC_TABLE}')).scalar()
+    except OperationalError:
+        return None
+
+
+def refresh_replica(bind_key):
+    """
+    Copy the primary database into the SQLite replica ``bind_key`` with
+    SQLite's online backup API, and record when.
+
+    The backup reads one consistent snapshot of the primary while writers
+    go on, and replaces the replica's pages under its write lock, so replica
+    readers see either the old or the new copy. Returns the snapshot time.
+    """
+    source = db.engines[None].raw_connection()
+    target = db.engines[bind_key].raw_connection()
+    try:
+        started = time.time()
+        source.driver_connection.backup(target.driver_connection)
+        replica = target.driver_connection
+        replica.execute(f'CREATE TABLE IF NOT EXISTS {REPLICA_SYNC_TABLE} (synced_at REAL NOT NULL)')
+        replica.execute(f'DELETE FROM {REPLICA_SYNC_TABLE}')
+        replica.execute(f'INSERT INTO {REPLICA_SYNC_TABLE} (synced_at) VALUES (?)', (started,))
+        replica.commit()
+    finally:
+        source.close()
+        target.close()
+    return started
+
+
+class ReplicaState:
+    """Replica binds of one app and what is known about their lag."""
+
+    def __init__(self, app, replicas, registry=None):
+        self.app = app
+        self.replicas = replicas
+        self._synced = {}
+        self.routed = None
+        if registry is not None:
+            self.routed = registry.register(Counter(
+                'adminapp_replica_routing_total', 'Replica choices, by bind; primary when none was fresh enough.',
+                ('target',)))
+            lag = registry.register(Gauge('adminapp_replica_lag_seconds', 'Age of each replica\'s data.', ('bind',)))
+
+            def collect():
+                with app.app_context():
+                    for key in replicas:
+                        value = self.lag(key)
+                        if value is not None:
+                            lag.set(round(value, 3), key)
+            registry.collectors.append(collect)
+
+    def lag(self, key):
+        """Seconds since replica ``key`` was refreshed, or None if it never was."""
+        synced_at, checked_at = self._synced.get(key, (None, None))
+        now = time.monotonic()
+        if checked_at is None or now - checked_at >= self.app.config['DB_REPLICA_LAG_CHECK_INTERVAL']:
+            synced_at = read_replica_sync_time(db.engines[key])
+            self._synced[key] = (synced_at, now)
+        return None if synced_at is None else max(0.0, time.time() - synced_at)
+
+    def choose(self):
+        """A replica within DB_REPLICA_MAX_LAG, or None to read from the primary."""
+        max_lag = self.app.config['DB_REPLICA_MAX_LAG']
+        fresh = [
+            key for key in self.replicas
+            if max_lag is None or (lag := self.lag(key)) is not None and lag <= max_lag
+        ]
+        key = random.choice(fresh) if fresh else None
+        if self.routed is not None:
+            self.routed.inc(key or 'primary')
+        return key
+
+
+class ReplicaRouting:
+    """
+    Read/write routing over the SQLALCHEMY_BINDS named in DB_READ_REPLICAS.
+
+    Reads the repositories mark with replica_reads() (lists, search,
+    exports, and the table versions list ETags come from) go to a replica
+    picked once per request among those refreshed within
+    DB_REPLICA_MAX_LAG seconds, or to the primary when none is. After a
+    request writes, and in requests sent with PRIMARY_READ_HEADER or that
+    call force_primary_reads(), all of its reads go to the primary.
+
+    For local use, DB_REPLICA_REFRESH_INTERVAL refreshes SQLite replica
+    files from the primary with the backup API on a background thread;
+    `flask refresh-replicas` does it once.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DB_READ_REPLICAS', ())
+        app.config.setdefault('DB_REPLICA_MAX_LAG', 5.0)
+        app.config.setdefault('DB_REPLICA_LAG_CHECK_INTERVAL', 1.0)
+        app.config.setdefault('DB_REPLICA_REFRESH_INTERVAL', None)
+        replicas = tuple(app.config['DB_READ_REPLICAS'])
+        if not replicas:
+            return
+        unknown = [key for key in replicas if key not in (app.config.get('SQLALCHEMY_BINDS') or {})]
+        if unknown:
+            raise RuntimeError(f'DB_READ_REPLICAS names binds missing from SQLALCHEMY_BINDS: {", ".join(unknown)}')
+        app.extensions['replica_routing'] = ReplicaState(app, replicas, app.extensions.get('metrics'))
+        app.teardown_request(self._teardown_request)
+        interval = app.config['DB_REPLICA_REFRESH_INTERVAL']
+        if interval:
+            stop = threading.Event()
+            threading.Thread(
+                target=_refresh_replicas_every, args=(app, replicas, interval, stop),
+                name='replica-refresh', daemon=True
+            ).start()
+            app.extensions['replica_refresh_stop'] = stop
+
+    @staticmethod
+    def _teardown_request(error=None):
+        # An app context pushed around several requests (tests, CLI) keeps g and the session
+        for name in ('_db_wrote', '_db_primary', '_db_replica'):
+            g.pop(name, None)
+        db.session().info.pop('wrote', None)
+
+
+def _refresh_replicas_every(app, replicas, interval, stop):
+    with app.app_context():
+        while True:
+            for key in replicas:
+                try:
+                    refresh_replica(key)
+                except Exception:
+                    logger.exception('Refreshing replica %s failed', key)
+            if stop.wait(interval):
+                return
+
 
-db = SQLAlchemy()
\ No newline at end of file
+replica_routing = ReplicaRouting()
@@ -0,0 +1,19 @@
+def parse_fields(args, allowed, default):
+    """
+    Read the ``fields`` query parameter, a comma separated subset of ``allowed``.
+
+    Returns a ``(fields, error)`` tuple. Without the parameter ``fields`` is
+    ``default``. ``id`` is always part of the result, and fields come back in
+    the order of ``allowed`` so equivalent requests select the same columns.
+    """
+    value = args.get('fields')
+    if value is None:
+        return default, None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    if not requested:
+        return None, 'fields must name at least one field'
+    unknown = sorted(requested.difference(allowed))
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+    requested.add('id')
+    return tuple(name for name in allowed if name in requested), None
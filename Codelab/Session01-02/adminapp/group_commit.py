@@ -0,0 +1,241 @@
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from flask import current_app, has_app_context, jsonify
+from sqlalchemy import text
+
+from extensions import _backoff, _retry_settings, db, is_lock_error, note_write, retry_on_lock
+from metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitTimeout(Exception):
+    """The writer did not commit a write in time; answered with 503."""
+
+
+def group_commit_enabled():
+    return has_app_context() and 'group_commit' in current_app.extensions
+
+
+def run_write(operation):
+    """
+    Run ``operation(session)`` in a transaction and return its result.
+
+    With group commit on it is handed to the app's writer and committed
+    together with concurrent writes; otherwise it runs here in a
+    transaction of its own, retried on lock contention. Either way an
+    exception it raises is raised here, with nothing it wrote committed.
+    """
+    if group_commit_enabled():
+        # Written on the writer's session; this request's reads must still see it
+        note_write()
+        return current_app.extensions['group_commit'].submit(operation)
+    return _run_alone(operation)
+
+
+@retry_on_lock
+def _run_alone(operation):
+    try:
+        result = operation(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+class GroupCommitWriter:
+    """
+    A thread that applies queued writes in shared transactions.
+
+    The first write it takes starts a batch; writes arriving within
+    ``window`` seconds join it, up to ``max_batch``. The batch runs in one
+    transaction, each write in a savepoint of its own, so a failing write
+    is rolled back alone and its caller gets its exception while the others
+    commit. SQLite then syncs once per batch instead of once per write.
+    """
+
+    def __init__(self, app, window, max_batch, registry=None, timeout=None):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batch_sizes = None
+        if registry is not None:
+            self.batch_sizes = registry.register(Histogram(
+                'adminapp_group_commit_batch_size', 'Writes committed per group commit transaction.',
+                buckets=BATCH_SIZE_BUCKETS))
+
+    def submit(self, operation):
+        """
+        Queue ``operation`` and wait for its result.
+
+        Raises GroupCommitTimeout after ``timeout`` seconds. A write the
+        writer has not taken yet by then is withdrawn and never runs.
+        """
+        future = Future()
+        timeout = self.timeout
+        with self._lock:
+            if self._thread is None:
+                # Started on first use, so a server forking after create_app gets one per worker
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+            self._queue.put((operation, future))
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise GroupCommitTimeout(f'Write not committed within {timeout} seconds') from None
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = []
+                stop = False
+                try:
+                    stop = self._collect(batch)
+                    if batch:
+                        self._commit(batch)
+                        db.session.remove()
+                except Exception as error:
+                    # The thread must live on: callers would otherwise wait on it until they time out
+                    logger.exception('Group commit writer failed')
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                    self._discard_session()
+                if stop:
+                    return
+
+    @staticmethod
+    def _discard_session():
+        # A fresh session for the next batch, whatever state this one was left in
+        try:
+            db.session.remove()
+        except Exception:
+            logger.exception('Discarding the group commit session failed')
+
+    def _take(self, item, batch):
+        _, future = item
+        # False for a write its caller withdrew after timing out
+        if future.set_running_or_notify_cancel():
+            batch.append(item)
+
+    def _collect(self, batch):
+        """Fill ``batch`` with the next writes; returns whether to stop."""
+        item = self._queue.get()
+        if item is _STOP:
+            return True
+        self._take(item, batch)
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                # Writes that queued up during the previous commit join without waiting
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return True
+            self._take(item, batch)
+        return False
+
+    def _commit(self, batch):
+        retries, base_delay, max_delay = _retry_settings()
+        attempt = 0
+        while True:
+            try:
+                outcomes = self._apply(batch)
+                break
+            except Exception as error:
+                db.session.rollback()
+                if not is_lock_error(error) or attempt >= retries:
+                    for _, future in batch:
+                        future.set_exception(error)
+                    return
+            _backoff(attempt, base_delay, max_delay)
+            attempt += 1
+        if self.batch_sizes is not None:
+            self.batch_sizes.observe(len(batch))
+        for (_, future), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    @staticmethod
+    def _apply(batch):
+        session = db.session
+        if session.get_bind().dialect.name == 'sqlite':
+            # Takes the write lock up front; the driver's own BEGIN is deferred,
+            # and a savepoint opened outside a transaction would commit on release
+            session.execute(text('BEGIN IMMEDIATE'))
+        outcomes = []
+        for operation, _ in batch:
+            try:
+                with session.begin_nested():
+                    outcomes.append((True, operation(session)))
+            except Exception as error:
+                if is_lock_error(error):
+                    raise
+                outcomes.append((False, error))
+        session.commit()
+        return outcomes
+
+
+class GroupCommit:
+    """
+    Opt-in group commit (GROUP_COMMIT_ENABLED) for the repositories'
+    single-row writes: run_write hands them to a GroupCommitWriter, which
+    batches writes arriving within GROUP_COMMIT_WINDOW seconds, up to
+    GROUP_COMMIT_MAX_BATCH, into one transaction. Callers block until their
+    batch is committed, so responses are unchanged; throughput rises with
+    the number of concurrent writers, at the cost of up to one window of
+    added latency for a lone write. A caller not answered within
+    GROUP_COMMIT_TIMEOUT seconds gets 503 with Retry-After:
+    GROUP_COMMIT_RETRY_AFTER.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GROUP_COMMIT_ENABLED', False)
+        app.config.setdefault('GROUP_COMMIT_WINDOW', 0.002)
+        app.config.setdefault('GROUP_COMMIT_MAX_BATCH', 64)
+        app.config.setdefault('GROUP_COMMIT_TIMEOUT', 30)
+        app.config.setdefault('GROUP_COMMIT_RETRY_AFTER', 1)
+        if not app.config['GROUP_COMMIT_ENABLED']:
+            return
+        app.extensions['group_commit'] = GroupCommitWriter(
+            app, app.config['GROUP_COMMIT_WINDOW'], app.config['GROUP_COMMIT_MAX_BATCH'],
+            app.extensions.get('metrics'), app.config['GROUP_COMMIT_TIMEOUT']
+        )
+        app.register_error_handler(GroupCommitTimeout, self._timeout_response)
+
+    @staticmethod
+    def _timeout_response(error):
+        response = jsonify({'message': 'Server busy, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, math.ceil(current_app.config['GROUP_COMMIT_RETRY_AFTER'])))
+        return response
@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+
+def list_etag(table_name, table_version, args):
+    # The same table state and query parameters always serialize to the same bytes
+    query = urlencode(sorted(args.items(multi=True)))
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    return f'{table_name}-{table_version}-{digest}'
+
+
+def entity_etag(table_name, entity_id, version, fields=None):
+    # A sparse fieldset is a different representation of the same version
+    if fields is not None:
+        return f"{table_name}-{entity_id}-{version}-{'.'.join(fields)}"
+    return f'{table_name}-{entity_id}-{version}'
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def is_not_modified(etag, last_modified=None, req=None):
+    # ``req`` defaults to Flask's request; the ASGI app passes Quart's
+    req = request if req is None else req
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2)
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+    last_modified = _as_utc(last_modified)
+    if last_modified is not None and req.if_modified_since is not None:
+        return last_modified <= req.if_modified_since
+    return False
+
+
+def is_conditional(req=None):
+    req = request if req is None else req
+    return bool(req.if_none_match) or req.if_modified_since is not None
+
+
+def add_cache_headers(response, etag, last_modified=None, cache_control=None):
+    response.set_etag(etag)
+    last_modified = _as_utc(last_modified)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if cache_control is None:
+        cache_control = current_app.config.get('HTTP_CACHE_CONTROL', 'no-cache')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    return add_cache_headers(current_app.response_class(status=304), etag, last_modified)
@@ -0,0 +1,130 @@
+import csv
+import json
+import os
+from itertools import islice
+
+FORMATS = ('csv', 'ndjson')
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class ParseError:
+    """Stands in for a record the reader could not parse; it fails validation."""
+
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+
+class ImportFailed(Exception):
+    """
+    Writing a batch failed. ``offset`` is the number of records before that
+    batch; every record before it is committed, so an import resumed from
+    ``offset`` neither skips nor repeats a record. ``line`` is the input
+    line of the batch's first record.
+    """
+
+    def __init__(self, offset, line, error):
+        super().__init__(f'Import failed at record {offset} (line {line}): {error}')
+        self.offset = offset
+        self.line = line
+        self.error = error
+
+
+class ImportStats:
+    __slots__ = ('read', 'written', 'invalid')
+
+    def __init__(self, read=0, written=0, invalid=0):
+        self.read = read
+        self.written = written
+        self.invalid = invalid
+
+
+def detect_format(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def read_csv(stream, types=None):
+    """
+    Yield ``(line, row)`` for the rows of a CSV file with a header line, the
+    rows as dicts, one at a time. ``line`` is the last line of the row.
+
+    Empty cells become None and the columns named in ``types`` are converted
+    with the given callable; a value that does not convert is kept as is, so
+    validation reports it like the same value sent to the API.
+    """
+    types = types or {}
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # Cells beyond the header end up under the None key
+        row.pop(None, None)
+        record = {}
+        for name, value in row.items():
+            if value is None or value == '':
+                record[name] = None
+                continue
+            convert = types.get(name)
+            if convert is not None:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    pass
+            record[name] = value
+        yield reader.line_num, record
+
+
+def read_ndjson(stream):
+    """Yield ``(line, value)`` for the decoded JSON value of every non-blank line."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            yield number, ParseError(f'Not valid JSON: {error}')
+
+
+def read_records(stream, format, types=None):
+    if format == 'csv':
+        return read_csv(stream, types)
+    return read_ndjson(stream)
+
+
+def import_records(records, validate_batch, write_batch, batch_size, offset=0, on_invalid=None, on_progress=None):
+    """
+    Validate and write ``records`` batch by batch, each batch in its own transaction.
+
+    ``records`` yields ``(line, item)`` pairs and is consumed lazily, so only
+    one batch is held in memory. The first ``offset`` records are skipped.
+    ``validate_batch(items)`` returns ``{index: message}`` for the items to
+    leave out, which are reported through ``on_invalid(line, message)``;
+    ``write_batch(items)`` writes the rest. ``on_progress(stats)`` is called after every batch.
+    Raises ImportFailed when a write fails.
+    """
+    stats = ImportStats(read=offset)
+    records = islice(records, offset, None)
+    while True:
+        numbered = list(islice(records, batch_size))
+        if not numbered:
+            return stats
+        lines = [line for line, _ in numbered]
+        batch = [item for _, item in numbered]
+        errors = validate_batch(batch)
+        valid = []
+        for index, item in enumerate(batch):
+            message = errors.get(index)
+            if message is None:
+                valid.append(item)
+                continue
+            stats.invalid += 1
+            if on_invalid is not None:
+                on_invalid(lines[index], message)
+        if valid:
+            try:
+                write_batch(valid)
+            except Exception as error:
+                raise ImportFailed(stats.read, lines[0], error) from error
+        stats.read += len(batch)
+        stats.written += len(valid)
+        if on_progress is not None:
+            on_progress(stats)
@@ -0,0 +1,63 @@
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # optional dependency, a C encoder several times faster than json
+except ImportError:
+    orjson = None
+
+# orjson reads integers beyond 64 bits as floats; a digit run this long may be one
+LONG_DIGITS = re.compile(r'\d{19,}')
+LONG_DIGITS_BYTES = re.compile(rb'\d{19,}')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+
+    Output matches the default provider: keys are sorted when ``sort_keys``
+    is set, and dates, decimals, UUIDs and dataclasses go through the same
+    ``default`` hook. Values orjson cannot encode at all (integers beyond
+    64 bits) fall back to the standard library encoder, and so does decoding
+    input that may hold such integers or that orjson rejects, like NaN.
+    """
+
+    def _options(self, kwargs):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def dumps_bytes(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=self._options(kwargs))
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def loads(self, s, **kwargs):
+        long_digits = LONG_DIGITS if isinstance(s, str) else LONG_DIGITS_BYTES
+        if kwargs or long_digits.search(s):
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return super().loads(s)
+
+
+def init_json_provider(app):
+    """
+    Switch the app to OrjsonProvider when JSON_FAST_ENCODER is set and orjson is installed.
+
+    Without orjson the default provider stays in place, so it remains an
+    optional dependency.
+    """
+    app.config.setdefault('JSON_FAST_ENCODER', True)
+    if app.config['JSON_FAST_ENCODER'] and orjson is not None:
+        app.json = OrjsonProvider(app)
+    return app.json
@@ -0,0 +1,295 @@
+import bisect
+import functools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """Base class for a named metric family with a fixed set of label names."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, value, *labels):
+        # For a running total kept elsewhere and copied in at scrape time
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, amount, *labels):
+        # Counts are kept per bucket and accumulated only when rendering
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += amount
+
+    def count(self, *labels):
+        entry = self._values.get(labels)
+        return entry[1] if entry else 0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((labels, ([*entry[0]], entry[1], entry[2])) for labels, entry in self._values.items())
+        for labels, (bucket_counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_count{label_text} {count}')
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+        return lines
+
+
+class Registry:
+    """Metrics of one app, plus collectors that refresh gauges at scrape time."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    def __init__(self, registry, latency_buckets=LATENCY_BUCKETS):
+        labels = ('blueprint', 'route', 'method')
+        self.latency = registry.register(Histogram(
+            'adminapp_request_duration_seconds', 'Request latency in seconds.', labels, latency_buckets))
+        self.responses = registry.register(Counter(
+            'adminapp_responses_total', 'Responses by status code.', labels + ('status',)))
+        self.in_flight = registry.register(Gauge(
+            'adminapp_requests_in_flight', 'Requests currently being handled.'))
+        self.sql_statements = registry.register(Counter(
+            'adminapp_sql_statements_total', 'SQL statements executed.'))
+        self.sql_seconds = registry.register(Counter(
+            'adminapp_sql_seconds_total', 'Time spent executing SQL statements.'))
+        self.request_sql_statements = registry.register(Histogram(
+            'adminapp_request_sql_statements', 'SQL statements executed per request.', labels, SQL_COUNT_BUCKETS))
+        self.request_sql_seconds = registry.register(Histogram(
+            'adminapp_request_sql_seconds', 'Time spent in SQL per request.', labels, latency_buckets))
+
+
+class Metrics:
+    """
+    Request, SQL and cache instrumentation exposed in Prometheus text format.
+
+    Everything is kept in process memory, per app; with several worker
+    processes each one is scraped (or aggregated) separately. Requests to
+    the metrics endpoint itself are not recorded.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, db=None, caches=None):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('METRICS_LATENCY_BUCKETS', LATENCY_BUCKETS)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        registry = Registry()
+        request_metrics = RequestMetrics(registry, app.config['METRICS_LATENCY_BUCKETS'])
+        app.extensions['metrics'] = registry
+        app.extensions['request_metrics'] = request_metrics
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.render)
+
+        if db is not None:
+            with app.app_context():
+                engines = list(db.engines.values())
+            for engine in engines:
+                _listen_sql(engine, request_metrics)
+        if caches:
+            registry.collectors.append(_cache_collector(registry, caches, app))
+
+    @staticmethod
+    def _before_request():
+        if request.endpoint == 'metrics':
+            return
+        g._metrics_start = time.perf_counter()
+        g._metrics_sql = [0, 0.0]
+        g._metrics_in_flight = True
+        current_app.extensions['request_metrics'].in_flight.inc()
+
+    @staticmethod
+    def _after_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        rule = request.url_rule
+        labels = (request.blueprint or '', rule.rule if rule else '<unmatched>', request.method)
+        record = functools.partial(
+            _record_request, current_app.extensions['request_metrics'], labels,
+            str(response.status_code), start, g._metrics_sql
+        )
+        if response.is_streamed:
+            # The body, and the queries behind it, are only produced once the
+            # server iterates it; the SQL listener keeps counting into the same
+            # totals meanwhile, as the streamed body runs in this request's context
+            response.call_on_close(record)
+        else:
+            record()
+        return response
+
+    @staticmethod
+    def _teardown_request(error=None):
+        g.pop('_metrics_sql', None)
+        if g.pop('_metrics_in_flight', False):
+            current_app.extensions['request_metrics'].in_flight.dec()
+
+    @staticmethod
+    def render():
+        registry = current_app.extensions['metrics']
+        return current_app.response_class(registry.render(), content_type=CONTENT_TYPE)
+
+
+def _record_request(request_metrics, labels, status, start, sql):
+    statements, seconds = sql
+    request_metrics.latency.observe(time.perf_counter() - start, *labels)
+    request_metrics.responses.inc(*labels, status)
+    request_metrics.request_sql_statements.observe(statements, *labels)
+    request_metrics.request_sql_seconds.observe(seconds, *labels)
+
+
+def _listen_sql(engine, request_metrics):
+    event.listen(engine, 'before_cursor_execute', _sql_started)
+    event.listen(engine, 'after_cursor_execute', functools.partial(_sql_finished, request_metrics))
+
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _sql_finished(request_metrics, conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    request_metrics.sql_statements.inc()
+    request_metrics.sql_seconds.inc(amount=elapsed)
+    if has_request_context():
+        totals = g.get('_metrics_sql')
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def _cache_collector(registry, caches, app):
+    hits = registry.register(Counter('adminapp_cache_hits_total', 'Cache hits since start.', ('cache', 'tier')))
+    misses = registry.register(Counter('adminapp_cache_misses_total', 'Cache misses since start.', ('cache',)))
+    ratio = registry.register(Gauge('adminapp_cache_hit_ratio', 'Cache hits over lookups.', ('cache',)))
+    size = registry.register(Gauge('adminapp_cache_entries', 'Entries in the in-process cache.', ('cache',)))
+
+    def collect():
+        with app.app_context():
+            for name, cache in caches.items():
+                stats = cache.stats()
+                if not stats:
+                    continue
+                hits.set_total(stats['local_hits'], name, 'local')
+                hits.set_total(stats['shared_hits'], name, 'shared')
+                misses.set_total(stats['misses'], name)
+                ratio.set(stats['hit_ratio'], name)
+                size.set(stats['size'], name)
+    return collect
@@ -0,0 +1,84 @@
+"""Add content-addressed image storage
+
+Revision ID: 31286f85bdee
+Revises: 95d1bb5f2bf9
+Create Date: 2026-10-17 11:02:17.664013
+
+"""
+import hashlib
+import os
+import shutil
+
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '31286f85bdee'
+down_revision = '95d1bb5f2bf9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_blob',
+        sa.Column('key', sa.String(length=80), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_picture_ai AFTER INSERT ON product "
+        "WHEN new.picture IS NOT NULL BEGIN "
+        "UPDATE image_blob SET refcount = refcount + 1 WHERE key = new.picture; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_picture_au AFTER UPDATE OF picture ON product "
+        "WHEN old.picture IS NOT new.picture BEGIN "
+        "UPDATE image_blob SET refcount = refcount - 1 WHERE key = old.picture; "
+        "UPDATE image_blob SET refcount = refcount + 1 WHERE key = new.picture; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_picture_ad AFTER DELETE ON product "
+        "WHEN old.picture IS NOT NULL BEGIN "
+        "UPDATE image_blob SET refcount = refcount - 1 WHERE key = old.picture; "
+        "END"
+    )
+    _move_existing_pictures()
+
+
+def _move_existing_pictures():
+    # Copy pictures stored as file paths into the content store and point the
+    # products at their content key. Missing files are left as they are.
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, picture FROM product WHERE picture IS NOT NULL')).all()
+    for product_id, picture in rows:
+        if not os.path.isfile(picture) or '.' not in picture:
+            continue
+        digest = hashlib.sha256()
+        with open(picture, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        key = f"{digest.hexdigest()}.{picture.rsplit('.', 1)[1].lower()}"
+        target = os.path.join(upload_folder, key[:2], key)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(picture, target)
+        connection.execute(
+            sa.text('INSERT OR IGNORE INTO image_blob (key, size, refcount) VALUES (:key, :size, 0)'),
+            {'key': key, 'size': os.path.getsize(target)}
+        )
+        # The update trigger increments the blob's refcount
+        connection.execute(sa.text('UPDATE product SET picture = :key WHERE id = :id'), {'key': key, 'id': product_id})
+
+
+def downgrade():
+    # Content keys stay in product.picture; the files remain under UPLOAD_FOLDER
+    op.execute('DROP TRIGGER IF EXISTS product_picture_ad')
+    op.execute('DROP TRIGGER IF EXISTS product_picture_au')
+    op.execute('DROP TRIGGER IF EXISTS product_picture_ai')
+    op.drop_table('image_blob')
@@ -0,0 +1,30 @@
+"""Add product sort indexes
+
+Revision ID: 4f0c8a2e7d15
+Revises: b7e2c41d9a53
+Create Date: 2026-10-17 16:41:37.218905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f0c8a2e7d15'
+down_revision = 'b7e2c41d9a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_price_id', ['price', 'id'], unique=False)
+        batch_op.create_index('ix_product_name_id', ['name', 'id'], unique=False)
+    # Give the planner statistics to choose between the new indexes
+    op.execute('ANALYZE product')
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_name_id')
+        batch_op.drop_index('ix_product_price_id')
@@ -0,0 +1,41 @@
+"""Add row versions and table change counters
+
+Revision ID: 6760392696c0
+Revises: 31286f85bdee
+Create Date: 2026-10-17 13:27:51.380224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6760392696c0'
+down_revision = '31286f85bdee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('table_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    for table_name in ('product', 'user'):
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE "{table_name}" SET updated_at = CURRENT_TIMESTAMP')
+        op.execute(
+            f"INSERT INTO table_version (name, version, updated_at) VALUES ('{table_name}', 1, CURRENT_TIMESTAMP)"
+        )
+
+
+def downgrade():
+    for table_name in ('user', 'product'):
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
+    op.drop_table('table_version')
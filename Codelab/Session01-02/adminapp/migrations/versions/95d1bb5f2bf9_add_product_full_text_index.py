@@ -0,0 +1,53 @@
+"""Add product full-text index
+
+Revision ID: 95d1bb5f2bf9
+Revises: ddc4273d4d76
+Create Date: 2026-10-17 09:12:44.107532
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '95d1bb5f2bf9'
+down_revision = 'ddc4273d4d76'
+branch_labels = None
+depends_on = None
+
+
+# The DDL is frozen here on purpose rather than imported from
+# products/search.py: a migration must keep creating the schema of its own
+# revision when the current definitions change in a later one.
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, description, content='product', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+        "END"
+    )
+    # Backfill the index from the rows that already exist
+    op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS product_fts_au')
+    op.execute('DROP TRIGGER IF EXISTS product_fts_ad')
+    op.execute('DROP TRIGGER IF EXISTS product_fts_ai')
+    op.execute('DROP TABLE IF EXISTS product_fts')
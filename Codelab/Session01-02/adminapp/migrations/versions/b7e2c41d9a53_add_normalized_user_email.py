@@ -0,0 +1,33 @@
+"""Add normalized user email
+
+Revision ID: b7e2c41d9a53
+Revises: 6760392696c0
+Create Date: 2026-10-17 15:02:11.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c41d9a53'
+down_revision = '6760392696c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_normalized', sa.String(length=120), nullable=True))
+    # Same normalization as users.models.normalize_email; fails on emails that
+    # differ only in case, which have to be merged by hand first
+    op.execute('UPDATE "user" SET email_normalized = lower(trim(email))')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('email_normalized', existing_type=sa.String(length=120), nullable=False)
+        batch_op.create_unique_constraint('uq_user_email_normalized', ['email_normalized'])
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_email_normalized', type_='unique')
+        batch_op.drop_column('email_normalized')
@@ -0,0 +1,26 @@
+"""Add product updated_at index
+
+Revision ID: c5a81f3e2b64
+Revises: 4f0c8a2e7d15
+Create Date: 2026-10-17 18:02:11.604317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a81f3e2b64'
+down_revision = '4f0c8a2e7d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_updated_at_id', ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_updated_at_id')
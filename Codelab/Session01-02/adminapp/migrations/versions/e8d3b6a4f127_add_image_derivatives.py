@@ -0,0 +1,32 @@
+"""Add image derivatives
+
+Revision ID: e8d3b6a4f127
+Revises: c5a81f3e2b64
+Create Date: 2026-10-17 19:14:36.208511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8d3b6a4f127'
+down_revision = 'c5a81f3e2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_derivative',
+        sa.Column('source_key', sa.String(length=80), nullable=False),
+        sa.Column('name', sa.String(length=20), nullable=False),
+        sa.Column('path', sa.String(length=200), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('source_key', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('image_derivative')
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+
+from flask import current_app, stream_with_context
+
+# SQLite's INTEGER range; larger Python ints cannot be bound as parameters
+SQLITE_INT_MIN = -2 ** 63
+SQLITE_INT_MAX = 2 ** 63 - 1
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(values, list) or not values:
+        return None
+    return values
+
+
+def is_sqlite_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+
+
+def parse_id_cursor(values):
+    """The id of a cursor holding exactly one integer id; None for any other cursor."""
+    if len(values) != 1 or not is_sqlite_int(values[0]):
+        return None
+    return values[0]
+
+
+def parse_page_args(args, config=None):
+    """
+    Read the ``limit`` and ``after`` query parameters of a list endpoint.
+
+    Returns a ``(limit, after, error)`` tuple where ``after`` is the decoded
+    cursor (or None for the first page) and ``error`` is a message suitable
+    for a 400 response. ``config`` defaults to the current Flask app's.
+    """
+    config = current_app.config if config is None else config
+    default_limit = config.get('PAGE_SIZE_DEFAULT', 50)
+    max_limit = config.get('PAGE_SIZE_MAX', 1000)
+
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        return None, None, 'limit must be an integer'
+    if limit < 1 or limit > max_limit:
+        return None, None, f'limit must be between 1 and {max_limit}'
+
+    after = None
+    if args.get('after'):
+        after = decode_cursor(args['after'])
+        if after is None:
+            return None, None, 'Invalid cursor'
+    return limit, after, None
+
+
+def parse_offset(args, config=None):
+    """
+    Read the ``offset`` query parameter of an offset-paged endpoint.
+
+    Returns an ``(offset, error)`` tuple like parse_page_args.
+    """
+    config = current_app.config if config is None else config
+    max_offset = config.get('SEARCH_OFFSET_MAX', 10000)
+    try:
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        return None, 'offset must be an integer'
+    if offset < 0 or offset > max_offset:
+        return None, f'offset must be between 0 and {max_offset}'
+    return offset, None
+
+
+def is_page_request(args):
+    return 'limit' in args or 'after' in args
+
+
+def stream_json_array(rows, serialize):
+    """
+    Stream ``rows`` as a JSON array without materializing the whole list.
+
+    The query behind ``rows`` is only executed once the response body is
+    iterated, inside the request context kept alive by stream_with_context.
+    """
+    batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+    dumps = current_app.json.dumps
+
+    def generate():
+        # One encoder call per batch; the batch's own brackets are cut off
+        yield '['
+        chunk = []
+        separator = ''
+        for row in rows:
+            chunk.append(serialize(row))
+            if len(chunk) >= batch_size:
+                yield separator + dumps(chunk)[1:-1]
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + dumps(chunk)[1:-1]
+        yield ']'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
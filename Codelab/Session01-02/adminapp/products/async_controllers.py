@@ -0,0 +1,164 @@
+import asyncio
+import functools
+
+from quart import Blueprint, request, jsonify, current_app
+from products.async_services import AsyncProductService
+from products.services import ProductService
+from products.controllers import IMAGE_MIMETYPES, allowed_file
+from products.storage import CHUNK_SIZE, UploadTooLarge
+from products.dtos import ProductDTO
+from products.catalog import parse_catalog_args
+from fieldsets import parse_fields
+from http_cache import entity_etag, list_etag
+from pagination import encode_cursor, is_page_request
+from async_http import add_cache_headers, is_conditional, is_not_modified, not_modified_response, parse_offset, parse_page_args, stream_json_array
+
+# The ASGI app's /products routes; parameters and responses are documented on products.controllers
+products_bp = Blueprint('products', __name__)
+
+@products_bp.route('/', methods=['GET'])
+async def get_products():
+    """Get all products, streamed, or a page of them; filtered and sorted as requested."""
+    fields, error = parse_fields(request.args, ProductDTO.FIELDS, ProductDTO.LIST_FIELDS)
+    if error:
+        return jsonify({'message': error}), 400
+    catalog, error = parse_catalog_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+
+    # Read the change counter before any row, so the ETag can never claim newer data than it labels
+    version, last_modified = await AsyncProductService.get_catalog_version()
+    etag = list_etag('product', version, request.args)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    if not is_page_request(request.args):
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+        response = stream_json_array(AsyncProductService.iter_product_batches(batch_size, fields, catalog), functools.partial(ProductDTO.list_item, fields=fields))
+        return add_cache_headers(response, etag, last_modified)
+
+    limit, after, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    if after is not None:
+        after = catalog.parse_cursor(after)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+    products, next_key = await AsyncProductService.get_products_page(limit, after, fields, catalog)
+    response = jsonify({
+        'items': [ProductDTO.list_item(p, fields) for p in products],
+        'next_cursor': encode_cursor(*next_key) if next_key is not None else None
+    })
+    return add_cache_headers(response, etag, last_modified)
+
+@products_bp.route('/search', methods=['GET'])
+async def search_products():
+    """Full-text search over product names and descriptions."""
+    query = request.args.get('q', '').strip()
+    if not query or len(query) > 100:
+        return jsonify({'message': 'q must be between 1 and 100 characters'}), 400
+
+    limit, _, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    offset, error = parse_offset(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+
+    rows, next_offset = await AsyncProductService.search_products(query, limit, offset)
+    return jsonify({
+        'items': [ProductDTO.search_item(row) for row in rows],
+        'next_offset': next_offset
+    })
+
+@products_bp.route('/<int:product_id>', methods=['GET'])
+async def get_product(product_id):
+    """Get a product by ID."""
+    fields, error = parse_fields(request.args, ProductDTO.FIELDS, None)
+    if error:
+        return jsonify({'message': error}), 400
+
+    if is_conditional():
+        # A 304 needs only the validators, not the row
+        version, last_modified = await AsyncProductService.get_product_validators(product_id)
+        if version is not None:
+            etag = entity_etag('product', product_id, version, fields)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+    product, version, last_modified = await AsyncProductService.get_product_with_version(product_id, fields)
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+
+    etag = entity_etag('product', product_id, version, fields)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return add_cache_headers(jsonify(product.to_dict(fields)), etag, last_modified)
+
+@products_bp.route('/', methods=['POST'])
+async def create_product():
+    """Create a new product."""
+    data = await request.get_json()
+    error = ProductService.validate_product_data(data)
+    if error:
+        return jsonify({'message': error}), 400
+    product = await AsyncProductService.create_product(data['name'], data['price'], data.get('description'))
+    return jsonify({'id': product.id, 'name': product.name, 'price': product.price, 'description': product.description}), 201
+
+@products_bp.route('/<int:product_id>', methods=['PUT'])
+async def update_product(product_id):
+    """Update a product."""
+    data = await request.get_json()
+    product = await AsyncProductService.update_product(product_id, data['name'], data['price'], description=data.get('description'))
+    if product:
+        return jsonify({'id': product.id, 'name': product.name, 'price': product.price, 'description': product.description})
+    return jsonify({'message': 'Product not found'}), 404
+
+@products_bp.route('/<int:product_id>', methods=['DELETE'])
+async def delete_product(product_id):
+    """Delete a product."""
+    if await AsyncProductService.delete_product(product_id):
+        return jsonify({'message': 'Product deleted'})
+    return jsonify({'message': 'Product not found'}), 404
+
+async def read_chunks(stream):
+    # A spooled form file; reads may hit the disk, so they run in a worker thread
+    while True:
+        chunk = await asyncio.to_thread(stream.read, CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+@products_bp.route('/<int:product_id>/upload_image', methods=['POST'])
+async def upload_image(product_id):
+    """Upload an image for a product, as a multipart "image" part or as the raw body."""
+    product, _, _ = await AsyncProductService.get_product_with_version(product_id)
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+
+    # Reject oversized uploads before anything is read from the body
+    max_size = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_size is not None and request.content_length is not None and request.content_length > max_size:
+        return jsonify({'message': 'Image too large'}), 413
+
+    if request.mimetype in IMAGE_MIMETYPES:
+        chunks, extension = request.body, IMAGE_MIMETYPES[request.mimetype]
+    else:
+        files = await request.files
+        if 'image' not in files:
+            return jsonify({'message': 'No image part'}), 400
+
+        file = files['image']
+        if file.filename == '':
+            return jsonify({'message': 'No selected file'}), 400
+        if not allowed_file(file.filename):
+            return jsonify({'message': 'Invalid file type'}), 400
+        chunks, extension = read_chunks(file.stream), file.filename.rsplit('.', 1)[1]
+
+    try:
+        product = await AsyncProductService.upload_product_image(product_id, chunks, extension, max_size)
+    except UploadTooLarge:
+        return jsonify({'message': 'Image too large'}), 413
+    if product is None:
+        return jsonify({'message': 'Product not found'}), 404
+    return jsonify({'message': 'Image uploaded successfully', 'picture': product.picture}), 201
@@ -0,0 +1,105 @@
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from products.models import Product, ImageBlob
+from products.dtos import ProductDTO
+from products.repositories import ProductRepository, columns
+from products.search import SEARCH_STATEMENT
+from products.catalog import CatalogQuery
+from async_extensions import db, retry_on_lock
+from versioning import table_version_query, table_version_upsert
+
+
+class AsyncProductRepository:
+    """ProductRepository for the ASGI app: the same statements, awaited on an AsyncSession."""
+
+    @staticmethod
+    async def get_table_version():
+        row = (await db.session.execute(table_version_query(Product.__tablename__))).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    @staticmethod
+    async def get_page(limit, after=None, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        query = ProductRepository.catalog_query(fields, catalog or CatalogQuery(), after)
+        return (await db.session.execute(query.limit(limit))).all()
+
+    @staticmethod
+    def iter_batches(batch_size, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        return db.stream_batches(ProductRepository.catalog_query(fields, catalog or CatalogQuery()), batch_size)
+
+    @staticmethod
+    async def search(match, limit, offset=0):
+        params = {'match': match, 'limit': limit, 'offset': offset}
+        return (await db.session.execute(text(SEARCH_STATEMENT), params)).all()
+
+    @staticmethod
+    async def get_fields(product_id, fields):
+        # version and updated_at feed the ETag
+        query = select(*columns(fields), Product.version, Product.updated_at).where(Product.id == product_id)
+        return (await db.session.execute(query)).first()
+
+    @staticmethod
+    @retry_on_lock
+    async def create(values):
+        try:
+            row = (await db.session.execute(
+                insert(Product).values(**values).returning(*columns(ProductDTO.FIELDS))
+            )).first()
+            await db.session.execute(table_version_upsert(Product.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def update_by_id(product_id, values):
+        try:
+            row = (await db.session.execute(ProductRepository.update_statement(product_id, values))).first()
+            if row is not None:
+                await db.session.execute(table_version_upsert(Product.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def delete_by_id(product_id):
+        try:
+            row = (await db.session.execute(ProductRepository.delete_statement(product_id))).first()
+            if row is not None:
+                await db.session.execute(table_version_upsert(Product.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def attach_image(product_id, key, size, place_file):
+        # As ProductRepository.attach_image; ``place_file`` is awaited while the blob row holds the write lock
+        try:
+            if (await db.session.execute(select(Product.id).where(Product.id == product_id))).first() is None:
+                return None
+            await db.session.execute(sqlite_insert(ImageBlob).values(key=key, size=size, refcount=0).on_conflict_do_nothing())
+            await place_file()
+            row = (await db.session.execute(ProductRepository.update_statement(product_id, {'picture': key}))).first()
+            await db.session.execute(table_version_upsert(Product.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def delete_unreferenced_blobs(remove_file):
+        keys = (await db.session.scalars(delete(ImageBlob).where(ImageBlob.refcount <= 0).returning(ImageBlob.key))).all()
+        # Files go while the write lock is held, as in ProductRepository
+        for key in keys:
+            await remove_file(key)
+        await db.session.commit()
+        return keys
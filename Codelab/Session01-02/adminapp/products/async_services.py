@@ -0,0 +1,121 @@
+import asyncio
+
+from quart import current_app
+
+from products.async_repositories import AsyncProductRepository
+from products.dtos import ProductDTO
+from products.search import build_match_query
+from products.catalog import CatalogQuery
+from products.storage import ContentStore, is_content_key
+from async_extensions import cache
+
+
+def content_store():
+    return ContentStore(current_app.config['UPLOAD_FOLDER'])
+
+
+class AsyncProductService:
+    """ProductService for the ASGI app. Validation stays in ProductService and is shared."""
+
+    @staticmethod
+    async def get_catalog_version():
+        return await AsyncProductRepository.get_table_version()
+
+    @staticmethod
+    async def get_products_page(limit, after=None, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        # Returns (rows, next_key); fetches one extra row to know whether another page follows
+        catalog = catalog or CatalogQuery()
+        rows = await AsyncProductRepository.get_page(limit + 1, after, fields, catalog)
+        next_key = catalog.cursor_for(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_key
+
+    @staticmethod
+    def iter_product_batches(batch_size=1000, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        return AsyncProductRepository.iter_batches(batch_size, fields, catalog)
+
+    @staticmethod
+    async def search_products(query, limit, offset=0):
+        match = build_match_query(query)
+        if match is None:
+            return [], None
+        rows = await AsyncProductRepository.search(match, limit + 1, offset)
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+    @staticmethod
+    async def get_product_with_version(product_id, fields=None):
+        # Same cache entries, and the same (dto, version, updated_at) result, as ProductService
+        if fields is None:
+            data = await cache.get_or_load('product', product_id, AsyncProductService._load_product)
+        else:
+            data = cache.peek('product', product_id) or await AsyncProductService._load_product_fields(product_id, fields)
+        if data:
+            return ProductDTO.from_dict(data), data['version'], data['updated_at']
+        return None, None, None
+
+    @staticmethod
+    async def get_product_validators(product_id):
+        data = cache.peek('product', product_id) or await AsyncProductService._load_product_fields(product_id, ())
+        if data:
+            return data['version'], data['updated_at']
+        return None, None
+
+    @staticmethod
+    async def _load_product(product_id):
+        return await AsyncProductService._load_product_fields(product_id, ProductDTO.FIELDS)
+
+    @staticmethod
+    async def _load_product_fields(product_id, fields):
+        row = await AsyncProductRepository.get_fields(product_id, fields)
+        if row:
+            data = dict(zip(fields, row))
+            data['version'] = row.version
+            data['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+            return data
+        return None
+
+    @staticmethod
+    async def create_product(name, price, description=None):
+        row = await AsyncProductRepository.create({'name': name, 'price': price, 'description': description})
+        cache.invalidate('product', row.id)
+        return ProductDTO(*row)
+
+    @staticmethod
+    async def update_product(product_id, name, price, description=None):
+        row = await AsyncProductRepository.update_by_id(
+            product_id, {'name': name, 'price': price, 'description': description})
+        if row is None:
+            return None
+        cache.invalidate('product', product_id)
+        return ProductDTO(*row)
+
+    @staticmethod
+    async def delete_product(product_id):
+        row = await AsyncProductRepository.delete_by_id(product_id)
+        if row is None:
+            return False
+        cache.invalidate('product', product_id)
+        if is_content_key(row.picture):
+            await AsyncProductService.collect_image_garbage()
+        return True
+
+    @staticmethod
+    async def upload_product_image(product_id, chunks, extension, max_size=None):
+        # File system calls run in worker threads; only the database work is awaited in the loop
+        store = content_store()
+        upload = await store.receive_async(chunks, extension, max_size)
+        try:
+            row = await AsyncProductRepository.attach_image(
+                product_id, upload.key, upload.size, lambda: asyncio.to_thread(store.place, upload))
+        finally:
+            await asyncio.to_thread(upload.discard)
+        if row is None:
+            return None
+        cache.invalidate('product', product_id)
+        await AsyncProductService.collect_image_garbage()
+        return ProductDTO(*row)
+
+    @staticmethod
+    async def collect_image_garbage():
+        store = content_store()
+        return await AsyncProductRepository.delete_unreferenced_blobs(lambda key: asyncio.to_thread(store.remove, key))
@@ -0,0 +1,97 @@
+import math
+
+from pagination import is_sqlite_int
+
+SORT_FIELDS = ('id', 'price', 'name')
+ORDERS = ('asc', 'desc')
+MAX_PREFIX_LENGTH = 50
+
+
+def prefix_upper_bound(prefix):
+    """
+    A string greater than every string starting with ``prefix``.
+
+    ``name >= prefix AND name < bound`` is a prefix match the (name, id)
+    index can answer as a range scan, which LIKE cannot under SQLite's
+    default case-insensitive LIKE. None when there is no such string.
+    """
+    while prefix and ord(prefix[-1]) == 0x10FFFF:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class CatalogQuery:
+    """Filters and ordering of a product list request."""
+
+    __slots__ = ('min_price', 'max_price', 'name_prefix', 'sort', 'descending')
+
+    def __init__(self, min_price=None, max_price=None, name_prefix=None, sort='id', descending=False):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.name_prefix = name_prefix
+        self.sort = sort
+        self.descending = descending
+
+    @property
+    def key_fields(self):
+        # The sort column plus id as tie breaker; the cursor holds their values
+        return ('id',) if self.sort == 'id' else (self.sort, 'id')
+
+    def cursor_for(self, row):
+        return tuple(getattr(row, name) for name in self.key_fields)
+
+    def parse_cursor(self, values):
+        """Validate decoded cursor values against the sort order; None if they do not fit."""
+        if len(values) != len(self.key_fields):
+            return None
+        for name, value in zip(self.key_fields, values):
+            if name == 'id' and not is_sqlite_int(value):
+                return None
+            if name == 'price' and not (is_sqlite_int(value) or isinstance(value, float) and math.isfinite(value)):
+                return None
+            if name == 'name' and not isinstance(value, str):
+                return None
+        return tuple(values)
+
+
+def _parse_price(args, name):
+    if name not in args:
+        return None, None
+    try:
+        value = float(args[name])
+    except ValueError:
+        return None, f'{name} must be a number'
+    if not math.isfinite(value):
+        return None, f'{name} must be a number'
+    return value, None
+
+
+def parse_catalog_args(args):
+    """
+    Read the filter and sort query parameters of the product list.
+
+    Returns a ``(CatalogQuery, error)`` tuple, where ``error`` is a message
+    suitable for a 400 response.
+    """
+    min_price, error = _parse_price(args, 'min_price')
+    if error:
+        return None, error
+    max_price, error = _parse_price(args, 'max_price')
+    if error:
+        return None, error
+    if min_price is not None and max_price is not None and min_price > max_price:
+        return None, 'min_price must not be greater than max_price'
+
+    name_prefix = args.get('name_prefix') or None
+    if name_prefix is not None and len(name_prefix) > MAX_PREFIX_LENGTH:
+        return None, f'name_prefix must be at most {MAX_PREFIX_LENGTH} characters'
+
+    sort = args.get('sort', 'id')
+    if sort not in SORT_FIELDS:
+        return None, f"sort must be one of {', '.join(SORT_FIELDS)}"
+    order = args.get('order', 'asc')
+    if order not in ORDERS:
+        return None, f"order must be one of {', '.join(ORDERS)}"
+    return CatalogQuery(min_price, max_price, name_prefix, sort, order == 'desc'), None
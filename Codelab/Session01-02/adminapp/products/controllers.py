@@ -1,19 +1,78 @@
-import os
-from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
+import functools
+
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from products.services import ProductService
+from products.images import resolve_picture, send_image
+from products.derivatives import DEFAULT_SIZES as DERIVATIVE_SIZES
+from products.storage import UploadTooLarge, is_content_key
+from fieldsets import parse_fields
+from http_cache import add_cache_headers, entity_etag, is_conditional, is_not_modified, list_etag, not_modified_response
 from products.dtos import ProductDTO
+from products.catalog import parse_catalog_args
+from products.export import FORMATS as EXPORT_FORMATS, export_chunks, parse_since
+from pagination import encode_cursor, is_page_request, is_sqlite_int, parse_offset, parse_page_args, stream_json_array
+from bulk import collect_errors, duplicate_errors, id_results, read_bulk_body, validation_error_response
 
 products_bp = Blueprint('products', __name__)
 
+IMAGE_MIMETYPES = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif'}
+
 @products_bp.route('/', methods=['GET'])
 def get_products():
     """
     Get all products
     ---
+    description: >
+      Without paging parameters the full list is streamed as a JSON array.
+      With limit and/or after a single page is returned together with the
+      cursor of the next page. Filters and sort order apply to both; a
+      cursor is only valid with the sort order it was issued for.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of products in the page
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor returned as next_cursor by the previous page
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return (id, name, price, picture, description); id is always included
+      - name: min_price
+        in: query
+        type: number
+        required: false
+        description: Only products priced at least this much
+      - name: max_price
+        in: query
+        type: number
+        required: false
+        description: Only products priced at most this much
+      - name: name_prefix
+        in: query
+        type: string
+        required: false
+        description: Only products whose name starts with this (case-sensitive)
+      - name: sort
+        in: query
+        type: string
+        enum: [id, price, name]
+        required: false
+        description: Sort key, ties are broken by id (default id)
+      - name: order
+        in: query
+        type: string
+        enum: [asc, desc]
+        required: false
+        description: Sort direction (default asc)
     responses:
         200:
-            description: A list of products
+            description: A list of products, or a page of products
             schema:
                 type: array
                 items:
@@ -27,9 +86,158 @@ def get_products():
                             type: number
                         description:
                             type: string
+        304:
+            description: Not modified since the version named in If-None-Match
+        400:
+            description: Invalid paging, filter or sort parameters
+    """
+    fields, error = parse_fields(request.args, ProductDTO.FIELDS, ProductDTO.LIST_FIELDS)
+    if error:
+        return jsonify({'message': error}), 400
+    catalog, error = parse_catalog_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+
+    # Read the change counter before any row, so the ETag can never claim newer data than it labels
+    version, last_modified = ProductService.get_catalog_version()
+    etag = list_etag('product', version, request.args)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    if not is_page_request(request.args):
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+        response = stream_json_array(ProductService.iter_all_products(batch_size, fields, catalog), functools.partial(ProductDTO.list_item, fields=fields))
+        return add_cache_headers(response, etag, last_modified)
+
+    limit, after, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    if after is not None:
+        after = catalog.parse_cursor(after)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+    products, next_key = ProductService.get_products_page(limit, after, fields, catalog)
+    response = jsonify({
+        'items': [ProductDTO.list_item(p, fields) for p in products],
+        'next_cursor': encode_cursor(*next_key) if next_key is not None else None
+    })
+    return add_cache_headers(response, etag, last_modified)
+
+@products_bp.route('/search', methods=['GET'])
+def search_products():
+    """
+    Full-text search over product names and descriptions
+    ---
+    description: >
+      Results are ranked by BM25 relevance, name matches first. The last
+      search term also matches as a prefix.
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Search terms
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of products in the page
+      - name: offset
+        in: query
+        type: integer
+        required: false
+        description: Number of ranked results to skip (at most SEARCH_OFFSET_MAX)
+    responses:
+      200:
+        description: A page of matching products, best match first
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  name:
+                    type: string
+                  price:
+                    type: number
+                  description:
+                    type: string
+                  rank:
+                    type: number
+            next_offset:
+              type: integer
+      400:
+        description: Invalid search query or paging parameters
+    """
+    query = request.args.get('q', '').strip()
+    if not query or len(query) > 100:
+        return jsonify({'message': 'q must be between 1 and 100 characters'}), 400
+
+    limit, _, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    offset, error = parse_offset(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+
+    rows, next_offset = ProductService.search_products(query, limit, offset)
+    return jsonify({
+        'items': [ProductDTO.search_item(row) for row in rows],
+        'next_offset': next_offset
+    })
+
+@products_bp.route('/export', methods=['GET'])
+def export_products():
+    """
+    Export the whole catalog as NDJSON or CSV
+    ---
+    description: >
+      Rows are streamed from an open cursor, so the export runs in constant
+      memory however large the catalog is. With since, only products updated
+      at or after that time are exported; pass the largest updated_at of the
+      previous export to get the changes since. Deleted products are not
+      part of an incremental export.
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [ndjson, csv]
+        required: false
+        description: Output format (default ndjson)
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 timestamp, e.g. 2026-10-17T12:00:00; naive values are UTC
+    responses:
+      200:
+        description: One product per line (id, name, price, picture, description, updated_at)
+      304:
+        description: Not modified since the version named in If-None-Match
+      400:
+        description: Invalid format or since
     """
-    products = ProductService.get_all_products()
-    return jsonify([{'id': p.id, 'name': p.name, 'price': p.price, 'description': p.description} for p in products])
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    since, error = parse_since(request.args.get('since'))
+    if error:
+        return jsonify({'message': error}), 400
+
+    version, last_modified = ProductService.get_catalog_version()
+    etag = list_etag('product', version, request.args)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+    chunks = export_chunks(ProductService.iter_export(batch_size, since), format, current_app.json.dumps, batch_size)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[format])
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{format}'
+    return add_cache_headers(response, etag, last_modified)
 
 @products_bp.route('/<int:product_id>', methods=['GET'])
 def get_product(product_id):
@@ -42,9 +250,16 @@ def get_product(product_id):
         type: integer
         required: true
         description: ID of the product
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return (id, name, price, picture, description); id is always included
     responses:
       200:
         description: A product
+      304:
+        description: Not modified since the version named in If-None-Match
         schema:
           type: object
           properties:
@@ -61,11 +276,26 @@ def get_product(product_id):
       404:
         description: Product not found
     """
-    product = ProductService.get_product_by_id(product_id)
-    if product:
-        product_dto = ProductDTO(product.id, product.name, product.price, product.picture, product.description)
-        return jsonify(product_dto.to_dict())
-    return jsonify({'message': 'Product not found'}), 404
+    fields, error = parse_fields(request.args, ProductDTO.FIELDS, None)
+    if error:
+        return jsonify({'message': error}), 400
+
+    if is_conditional():
+        # A 304 needs only the validators, not the row
+        version, last_modified = ProductService.get_product_validators(product_id)
+        if version is not None:
+            etag = entity_etag('product', product_id, version, fields)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+    product, version, last_modified = ProductService.get_product_with_version(product_id, fields)
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+
+    etag = entity_etag('product', product_id, version, fields)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return add_cache_headers(jsonify(product.to_dict(fields)), etag, last_modified)
 
 @products_bp.route('/', methods=['POST'])
 def create_product():
@@ -145,7 +375,7 @@ def update_product(product_id):
         description: Product not found
     """
     data = request.get_json()
-    product = ProductService.update_product(product_id, data['name'], data['price'], data.get('description'))
+    product = ProductService.update_product(product_id, data['name'], data['price'], description=data.get('description'))
     if product:
         return jsonify({'id': product.id, 'name': product.name, 'price': product.price, 'description': product.description})
     return jsonify({'message': 'Product not found'}), 404
@@ -171,11 +401,84 @@ def delete_product(product_id):
         return jsonify({'message': 'Product deleted'})
     return jsonify({'message': 'Product not found'}), 404
 
+@products_bp.route('/<int:product_id>/image', methods=['GET'])
+def get_product_image(product_id):
+    """
+    Download a product's image
+    ---
+    description: >
+      Supports Range requests and If-None-Match/If-Modified-Since. The ETag
+      is the image's content hash. With v set to the product's current
+      picture key the URL names fixed content, and the response may be
+      cached for a year without revalidation; otherwise clients revalidate.
+      With size a scaled WebP copy is sent instead; until it has been
+      rendered the full image is, and never marked immutable.
+    parameters:
+      - name: product_id
+        in: path
+        type: integer
+        required: true
+        description: ID of the product
+      - name: v
+        in: query
+        type: string
+        required: false
+        description: The product's picture key, as returned by upload_image
+      - name: size
+        in: query
+        type: string
+        required: false
+        description: Name of a configured derivative size (IMAGE_DERIVATIVE_SIZES), e.g. thumb
+    produces:
+      - image/webp
+      - image/png
+      - image/jpeg
+      - image/gif
+    responses:
+      200:
+        description: The image
+      206:
+        description: The requested byte range of the image
+      304:
+        description: Not modified
+      400:
+        description: Unknown size
+      404:
+        description: Product not found, or it has no image
+      416:
+        description: Range not satisfiable
+    """
+    size = request.args.get('size')
+    sizes = current_app.config.get('IMAGE_DERIVATIVE_SIZES', DERIVATIVE_SIZES)
+    if size is not None and size not in sizes:
+        return jsonify({'message': f"Unknown size, expected one of: {', '.join(sizes)}"}), 400
+    product = ProductService.get_product_by_id(product_id)
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+    path = resolve_picture(current_app.config['UPLOAD_FOLDER'], product.picture)
+    if path is None:
+        return jsonify({'message': 'Product has no image'}), 404
+    if not is_content_key(product.picture):
+        return send_image(path)
+    # The key is the SHA-256 of the bytes, a strong validator
+    etag = product.picture.split('.')[0]
+    immutable = request.args.get('v') == product.picture
+    if size is not None:
+        derivative = ProductService.get_image_derivative_path(product.picture, size)
+        if derivative is None:
+            return send_image(path, etag)
+        return send_image(derivative, f'{etag}-{size}', immutable=immutable)
+    return send_image(path, etag, immutable=immutable)
+
 @products_bp.route('/<int:product_id>/upload_image', methods=['POST'])
 def upload_image(product_id):
     """
     Upload an image for a product
     ---
+    description: >
+      Send the image either as the "image" part of a multipart form, or as the
+      raw request body with an image/png, image/jpeg or image/gif content type.
+      Identical images are stored once and shared between products.
     parameters:
       - name: product_id
         in: path
@@ -185,36 +488,152 @@ def upload_image(product_id):
       - name: image
         in: formData
         type: file
-        required: true
+        required: false
         description: Image file to upload
     responses:
       201:
         description: Image uploaded successfully
+      400:
+        description: Missing or invalid image
       404:
         description: Product not found
+      413:
+        description: Image larger than MAX_CONTENT_LENGTH
     """
     product = ProductService.get_product_by_id(product_id)
     if not product:
         return jsonify({'message': 'Product not found'}), 404
 
-    if 'image' not in request.files:
-        return jsonify({'message': 'No image part'}), 400
+    # Reject oversized uploads before anything is read from the body
+    max_size = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_size is not None and request.content_length is not None and request.content_length > max_size:
+        return jsonify({'message': 'Image too large'}), 413
+
+    if request.mimetype in IMAGE_MIMETYPES:
+        stream, extension = request.stream, IMAGE_MIMETYPES[request.mimetype]
+    else:
+        if 'image' not in request.files:
+            return jsonify({'message': 'No image part'}), 400
+
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({'message': 'No selected file'}), 400
+        if not allowed_file(file.filename):
+            return jsonify({'message': 'Invalid file type'}), 400
+        stream, extension = file.stream, file.filename.rsplit('.', 1)[1]
+
+    try:
+        product = ProductService.upload_product_image(product_id, stream, extension, max_size)
+    except UploadTooLarge:
+        return jsonify({'message': 'Image too large'}), 413
+    if product is None:
+        return jsonify({'message': 'Product not found'}), 404
+    return jsonify({'message': 'Image uploaded successfully', 'picture': product.picture}), 201
+
+@products_bp.route('/bulk', methods=['POST'])
+def bulk_create_products():
+    """
+    Create many products in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              name:
+                type: string
+              price:
+                type: number
+              description:
+                type: string
+    responses:
+      201:
+        description: All products created; one result per item, in request order
+      400:
+        description: Invalid input, nothing was written
+    """
+    items, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = collect_errors(items, ProductService.validate_product_data)
+    if errors:
+        return validation_error_response(errors)
 
-    file = request.files['image']
-    if file.filename == '':
-        return jsonify({'message': 'No selected file'}), 400
+    ids = ProductService.bulk_create_products(items)
+    return jsonify({'results': [{'index': index, 'id': product_id, 'status': 201} for index, product_id in enumerate(ids)]}), 201
 
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+@products_bp.route('/bulk', methods=['PUT'])
+def bulk_update_products():
+    """
+    Update many products in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              name:
+                type: string
+              price:
+                type: number
+              description:
+                type: string
+    responses:
+      200:
+        description: One result per item with status 200, or 404 for unknown ids
+      400:
+        description: Invalid input, nothing was written
+    """
+    items, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = collect_errors(items, lambda item: ProductService.validate_product_data(item, require_id=True))
+    if not errors:
+        errors = duplicate_errors([item['id'] for item in items], 'Duplicate id')
+    if errors:
+        return validation_error_response(errors)
 
-        # Save the image file path as the picture of the product
-        ProductService.update_product_picture(product_id, file_path)
+    updated = ProductService.bulk_update_products(items)
+    return jsonify({'results': id_results([item['id'] for item in items], updated, 200)})
 
-        return jsonify({'message': 'Image uploaded successfully'}), 201
+@products_bp.route('/bulk', methods=['DELETE'])
+def bulk_delete_products():
+    """
+    Delete many products in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: integer
+    responses:
+      200:
+        description: One result per id with status 200, or 404 for unknown ids
+      400:
+        description: Invalid input, nothing was deleted
+    """
+    ids, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = [{'index': index, 'message': 'id must be an integer'} for index, item_id in enumerate(ids) if not is_sqlite_int(item_id)]
+    if errors:
+        return validation_error_response(errors)
 
-    return jsonify({'message': 'Invalid file type'}), 400
+    deleted = ProductService.bulk_delete_products(ids)
+    return jsonify({'results': id_results(ids, deleted, 200)})
 
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
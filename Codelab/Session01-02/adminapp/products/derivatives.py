@@ -0,0 +1,197 @@
+import concurrent.futures
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from flask import current_app
+
+from metrics import Counter
+from products.storage import ContentStore
+
+# Longest side in pixels; images are scaled down to fit, never up
+DEFAULT_SIZES = {'thumb': 64, 'small': 256, 'medium': 1024}
+DEFAULT_FORMAT = 'webp'
+DEFAULT_QUALITY = 80
+
+logger = logging.getLogger(__name__)
+
+
+def pillow_available():
+    # Checked without importing it; only the pool workers import Pillow
+    return importlib.util.find_spec('PIL') is not None
+
+
+def targets_for(store, key, sizes, format):
+    return [(name, side, store.derivative_path(key, name, format)) for name, side in sizes.items()]
+
+
+def render(source_path, targets, format, quality):
+    """
+    Write scaled copies of the image at ``source_path``; runs in a pool worker.
+
+    ``targets`` are ``(name, longest_side, path)``. Each file is written
+    beside its final path and renamed into place, so it is never served half
+    written. Returns a dict per target with its name, path, width, height
+    and size in bytes.
+    """
+    from PIL import Image, ImageOps
+
+    derivatives = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            transparent = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if transparent else 'RGB')
+        for name, side, path in targets:
+            scaled = image.copy()
+            scaled.thumbnail((side, side), Image.Resampling.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as temp_file:
+                    scaled.save(temp_file, format=format.upper(), quality=quality)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            derivatives.append({
+                'name': name, 'path': path, 'width': scaled.width, 'height': scaled.height,
+                'size': os.path.getsize(path)
+            })
+    return derivatives
+
+
+def create_pool(workers):
+    # Fresh interpreters rather than forks: a fork of a threaded server
+    # inherits its held locks and open database connections
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def render_many(store, keys, sizes, format, quality, workers):
+    """
+    Render the derivatives of every blob in ``keys`` on ``workers``
+    processes, yielding ``(key, derivatives, error)`` as each one finishes.
+
+    At most two jobs per worker are queued at a time, so ``keys`` may be a
+    long iterator.
+    """
+    keys = iter(keys)
+    with create_pool(workers) as pool:
+        pending = {}
+        while True:
+            for key in keys:
+                job = pool.submit(render, store.path_for(key), targets_for(store, key, sizes, format), format, quality)
+                pending[job] = key
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for job in done:
+                key = pending.pop(job)
+                error = job.exception()
+                yield key, None if error else job.result(), error
+
+
+class DerivativeState:
+    """The worker pool of one app, created on the first upload, and its job accounting."""
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.executor = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.jobs = None
+        if registry is not None:
+            self.jobs = registry.register(Counter(
+                'adminapp_image_derivative_jobs_total', 'Image derivative renders by outcome.', ('result',)))
+
+    @property
+    def sizes(self):
+        return self.app.config['IMAGE_DERIVATIVE_SIZES']
+
+    def _count(self, result):
+        if self.jobs is not None:
+            self.jobs.inc(result)
+
+    def submit(self, key):
+        """Queue rendering the derivatives of blob ``key``; None when the queue is full."""
+        config = self.app.config
+        store = ContentStore(config['UPLOAD_FOLDER'])
+        format = config['IMAGE_DERIVATIVE_FORMAT']
+        with self.lock:
+            if self.pending >= config['IMAGE_DERIVATIVE_MAX_PENDING']:
+                logger.warning('Derivative queue full, skipped %s; `flask generate-derivatives` renders it', key)
+                self._count('dropped')
+                return None
+            if self.executor is None:
+                self.executor = create_pool(config['IMAGE_DERIVATIVE_WORKERS'])
+            job = self.executor.submit(
+                render, store.path_for(key), targets_for(store, key, self.sizes, format), format,
+                config['IMAGE_DERIVATIVE_QUALITY']
+            )
+            self.pending += 1
+        job.add_done_callback(lambda job: self._done(key, job))
+        return job
+
+    def _done(self, key, job):
+        # Runs on the executor's management thread, never on a request thread
+        with self.lock:
+            self.pending -= 1
+        try:
+            derivatives = job.result()
+            from products.services import ProductService
+            with self.app.app_context():
+                recorded = ProductService.record_image_derivatives(key, derivatives)
+        except Exception:
+            logger.exception('Rendering the derivatives of %s failed', key)
+            self._count('failed')
+            return
+        self._count('done' if recorded else 'discarded')
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class DerivativePipeline:
+    """
+    Resized, re-encoded copies of uploaded images, rendered off the request
+    threads.
+
+    After an upload the blob is queued on a pool of IMAGE_DERIVATIVE_WORKERS
+    processes, which scale it to fit each of IMAGE_DERIVATIVE_SIZES and
+    save it as IMAGE_DERIVATIVE_FORMAT; the results are recorded per blob in
+    image_derivative once a job finishes. With IMAGE_DERIVATIVE_MAX_PENDING
+    jobs queued further uploads are skipped, to be picked up by
+    ``flask generate-derivatives``. Needs Pillow; without it nothing is
+    rendered and images are served at full size only.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_DERIVATIVES_ENABLED', True)
+        app.config.setdefault('IMAGE_DERIVATIVE_SIZES', DEFAULT_SIZES)
+        app.config.setdefault('IMAGE_DERIVATIVE_FORMAT', DEFAULT_FORMAT)
+        app.config.setdefault('IMAGE_DERIVATIVE_QUALITY', DEFAULT_QUALITY)
+        app.config.setdefault('IMAGE_DERIVATIVE_WORKERS', 2)
+        app.config.setdefault('IMAGE_DERIVATIVE_MAX_PENDING', 64)
+        if not app.config['IMAGE_DERIVATIVES_ENABLED']:
+            return
+        if not pillow_available():
+            app.logger.info('Pillow is not installed, image derivatives are not rendered')
+            return
+        app.extensions['image_derivatives'] = DerivativeState(app, app.extensions.get('metrics'))
+
+
+def derivative_state():
+    """The app's DerivativeState, or None when it does not render derivatives."""
+    return current_app.extensions.get('image_derivatives')
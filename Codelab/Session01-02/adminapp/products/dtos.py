@@ -1,4 +1,11 @@
 class ProductDTO:
+    FIELDS = ('id', 'name', 'price', 'picture', 'description')
+    __slots__ = FIELDS
+
+    # Default fields of list responses, in the column order of list queries
+    LIST_FIELDS = ('id', 'name', 'price', 'description')
+    SEARCH_FIELDS = LIST_FIELDS + ('rank',)
+
     def __init__(self, id, name, price, picture, description):
         self.id = id
         self.name = name
@@ -6,7 +13,9 @@ class ProductDTO:
         self.picture = picture
         self.description = description
 
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        if fields is not None:
+            return {name: getattr(self, name) for name in fields}
         return {
             'id': self.id,
             'name': self.name,
@@ -15,7 +24,30 @@ class ProductDTO:
             'description': self.description
         }
 
+    @staticmethod
+    def from_dict(data):
+        return ProductDTO(
+            id=data.get('id'),
+            name=data.get('name'),
+            price=data.get('price'),
+            picture=data.get('picture'),
+            description=data.get('description')
+        )
+
+    @staticmethod
+    def from_model(product):
+        return ProductDTO(product.id, product.name, product.price, product.picture, product.description)
+
+    @staticmethod
+    def list_item(row, fields=LIST_FIELDS):
+        # Builds the response dict straight from a row of ``fields``, with no DTO in between
+        return dict(zip(fields, row))
+
+    @staticmethod
+    def search_item(row):
+        return dict(zip(ProductDTO.SEARCH_FIELDS, row))
+
     def __eq__(self, other):
         if isinstance(other, ProductDTO):
             return self.to_dict() == other.to_dict()
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,59 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+from products.dtos import ProductDTO
+
+EXPORT_FIELDS = ProductDTO.FIELDS + ('updated_at',)
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_since(value):
+    """
+    Read an ISO 8601 ``since`` timestamp.
+
+    Returns a ``(datetime, error)`` tuple; the datetime is naive UTC like
+    the stored updated_at values, and None when ``value`` is empty.
+    """
+    if not value:
+        return None, None
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        return None, 'since must be an ISO 8601 timestamp'
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since, None
+
+
+def _export_item(row):
+    item = dict(zip(EXPORT_FIELDS, row))
+    if item['updated_at'] is not None:
+        item['updated_at'] = item['updated_at'].isoformat()
+    return item
+
+
+def export_chunks(rows, format, dumps, batch_size):
+    """
+    Encode ``rows`` of EXPORT_FIELDS as NDJSON or CSV, one string per ``batch_size`` rows.
+
+    Only one batch of rows is held at a time, so the output can be written
+    to a file or a streamed response in constant memory.
+    """
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(EXPORT_FIELDS)
+        write = lambda row: writer.writerow(_export_item(row).values())
+    else:
+        write = lambda row: buffer.write(dumps(_export_item(row)) + '\n')
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
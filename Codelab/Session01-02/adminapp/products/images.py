@@ -0,0 +1,79 @@
+import mimetypes
+import os
+
+from flask import current_app, request
+from werkzeug.utils import send_file
+
+from products.storage import ContentStore, is_content_key
+
+OFFLOAD_MODES = ('x-sendfile', 'x-accel-redirect')
+# A content-keyed URL always names the same bytes
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def resolve_picture(root, picture):
+    """
+    Absolute path of a product's picture file, or None if there is none.
+
+    Content keys map into the content store. Pictures from before the store
+    are plain paths; they are only served when they resolve to a file
+    inside ``root``.
+    """
+    if not picture:
+        return None
+    if is_content_key(picture):
+        path = os.path.realpath(ContentStore(root).path_for(picture))
+    else:
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, picture))
+        if os.path.commonpath([root, path]) != root:
+            return None
+    return path if os.path.isfile(path) else None
+
+
+def _offload(path, mimetype, etag, header, value):
+    # The proxy sends the body and answers Range requests; validators are checked here first
+    response = current_app.response_class(mimetype=mimetype)
+    response.last_modified = os.stat(path).st_mtime
+    if etag:
+        response.set_etag(etag)
+    response = response.make_conditional(request.environ)
+    if response.status_code != 304:
+        response.headers[header] = value
+    return response
+
+
+def send_image(path, etag=None, immutable=False):
+    """
+    Respond with the image at ``path``.
+
+    Without offloading the file goes through send_file, which hands it to
+    the server's ``wsgi.file_wrapper`` (sendfile(2) under gunicorn) and
+    answers Range and If-None-Match/If-Modified-Since itself. IMAGE_OFFLOAD
+    set to 'x-sendfile' or 'x-accel-redirect' leaves the body to a fronting
+    Apache or nginx; the latter maps the file below
+    IMAGE_ACCEL_REDIRECT_PREFIX, an internal location aliasing UPLOAD_FOLDER.
+    ``etag`` defaults to one derived from the file's mtime and size.
+    """
+    config = current_app.config
+    mode = config.get('IMAGE_OFFLOAD')
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mode == 'x-accel-redirect':
+        relative = os.path.relpath(path, os.path.realpath(config['UPLOAD_FOLDER'])).replace(os.sep, '/')
+        prefix = config.get('IMAGE_ACCEL_REDIRECT_PREFIX', '/_uploads/')
+        response = _offload(path, mimetype, etag, 'X-Accel-Redirect', prefix.rstrip('/') + '/' + relative)
+    elif mode == 'x-sendfile':
+        response = _offload(path, mimetype, etag, 'X-Sendfile', path)
+    else:
+        response = send_file(
+            path, request.environ, mimetype=mimetype, etag=etag or True,
+            response_class=current_app.response_class
+        )
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
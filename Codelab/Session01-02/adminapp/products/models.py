@@ -1,8 +1,42 @@
 from extensions import db
+from products.search import register_search_index
+from products.storage import register_refcount_triggers
+from versioning import Versioned
 
-class Product(db.Model):
+class Product(Versioned, db.Model):
+    # Sorted, paged catalog queries are range scans over these (see products.catalog)
+    __table_args__ = (
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        # Incremental exports (?since=) read products by modification time
+        db.Index('ix_product_updated_at_id', 'updated_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     price = db.Column(db.Float, nullable=False)
+    # Content key of the uploaded image (see products.storage); rows from
+    # before content-addressed storage may still hold a file path
     picture = db.Column(db.String(200), nullable=True)
-    description = db.Column(db.String(500), nullable=True)
\ No newline at end of file
+    description = db.Column(db.String(500), nullable=True)
+
+class ImageBlob(db.Model):
+    __tablename__ = 'image_blob'
+    key = db.Column(db.String(80), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    # Maintained by triggers on product.picture
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+
+class ImageDerivative(db.Model):
+    # Resized copies of a blob (see products.derivatives); shared by every
+    # product whose picture is the blob, and deleted with it
+    __tablename__ = 'image_derivative'
+    source_key = db.Column(db.String(80), primary_key=True)
+    name = db.Column(db.String(20), primary_key=True)
+    # Relative to UPLOAD_FOLDER
+    path = db.Column(db.String(200), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+
+register_search_index(Product.__table__)
+register_refcount_triggers(Product.__table__)
\ No newline at end of file
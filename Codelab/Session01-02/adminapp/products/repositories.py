@@ -1,25 +1,333 @@
-from products.models import Product
-from extensions import db
+from sqlalchemy import bindparam, delete, func, insert, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
+from products.models import Product, ImageBlob, ImageDerivative
+from products.dtos import ProductDTO
+from extensions import db, commit_with_retry, replica_reads, retry_on_lock
+from bulk import chunked
+from group_commit import group_commit_enabled, run_write
+from versioning import bump_table_version, column_values, get_table_version, insert_versioned, utcnow
+from products.search import SEARCH_STATEMENT
+from products.catalog import CatalogQuery, prefix_upper_bound
+from products.export import EXPORT_FIELDS
+
+
+def columns(fields):
+    # In the order of ``fields``, which the result rows are zipped with
+    return [getattr(Product, name) for name in fields]
 
 class ProductRepository:
     @staticmethod
     def get_all():
-        return Product.query.all()
+        with replica_reads():
+            return Product.query.all()
+
+    @staticmethod
+    def get_table_version():
+        # From the replica the listing is read from, so the ETag describes that body
+        with replica_reads():
+            return get_table_version(Product.__tablename__)
+
+    @staticmethod
+    def catalog_query(fields, catalog, after=None):
+        """
+        Select ``fields`` of the products matching ``catalog``, in its order.
+
+        The sort key columns are appended when ``fields`` lacks them, so
+        callers can build the next cursor. ``after`` is the key of the last
+        row already seen; the (price, id) and (name, id) indexes turn the
+        keyset condition and the ORDER BY into one range scan.
+        """
+        key_columns = columns(catalog.key_fields)
+        query = select(*columns(fields), *[column for column in key_columns if column.key not in fields])
+        if catalog.min_price is not None:
+            query = query.where(Product.price >= catalog.min_price)
+        if catalog.max_price is not None:
+            query = query.where(Product.price <= catalog.max_price)
+        if catalog.name_prefix:
+            query = query.where(Product.name >= catalog.name_prefix)
+            upper_bound = prefix_upper_bound(catalog.name_prefix)
+            if upper_bound is not None:
+                query = query.where(Product.name < upper_bound)
+        if after is not None:
+            key = tuple_(*key_columns) if len(key_columns) > 1 else key_columns[0]
+            value = tuple_(*after) if len(after) > 1 else after[0]
+            query = query.where(key < value if catalog.descending else key > value)
+        return query.order_by(*[column.desc() if catalog.descending else column for column in key_columns])
+
+    @staticmethod
+    def get_page(limit, after=None, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        catalog = catalog or CatalogQuery()
+        with replica_reads():
+            return db.session.execute(ProductRepository.catalog_query(fields, catalog, after).limit(limit)).all()
+
+    @staticmethod
+    def iter_all(batch_size, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        query = ProductRepository.catalog_query(fields, catalog or CatalogQuery())
+        # A generator, so the query only runs once a streamed body is read
+        def rows():
+            with replica_reads():
+                yield from db.session.execute(query.execution_options(yield_per=batch_size))
+        return rows()
+
+    @staticmethod
+    def iter_export(batch_size, since=None):
+        """
+        Stream every product as a row of EXPORT_FIELDS.
+
+        Without ``since`` in id order; with it, only products updated at or
+        after ``since``, in (updated_at, id) order, a range scan of
+        ix_product_updated_at_id. Rows are fetched ``batch_size`` at a time
+        from the open cursor.
+        """
+        query = select(*columns(EXPORT_FIELDS))
+        if since is None:
+            query = query.order_by(Product.id)
+        else:
+            query = query.where(Product.updated_at >= since).order_by(Product.updated_at, Product.id)
+        def rows():
+            with replica_reads():
+                yield from db.session.execute(query.execution_options(yield_per=batch_size))
+        return rows()
+
+    @staticmethod
+    def search(match, limit, offset=0):
+        with replica_reads():
+            return db.session.execute(text(SEARCH_STATEMENT), {'match': match, 'limit': limit, 'offset': offset}).all()
 
     @staticmethod
     def get_by_id(product_id):
         return Product.query.get(product_id)
 
+    @staticmethod
+    def get_validators(product_id):
+        # The ETag and Last-Modified inputs alone, without the row
+        return db.session.execute(
+            select(Product.version, Product.updated_at).where(Product.id == product_id)
+        ).first()
+
+    @staticmethod
+    def get_fields(product_id, fields):
+        # Other columns are not read; version and updated_at feed the ETag
+        return db.session.query(Product).options(
+            load_only(*columns(fields), Product.version, Product.updated_at)
+        ).filter(Product.id == product_id).first()
+
     @staticmethod
     def create(product):
+        if group_commit_enabled():
+            # Inserted by the group commit writer; the instance stays out of the session
+            values = column_values(product)
+            row = run_write(lambda session: insert_versioned(session, Product, values))
+            for key, value in row._mapping.items():
+                setattr(product, key, value)
+            return
         db.session.add(product)
-        db.session.commit()
+        commit_with_retry()
 
     @staticmethod
     def update():
-        db.session.commit()
+        commit_with_retry()
 
     @staticmethod
     def delete(product):
         db.session.delete(product)
-        db.session.commit()
\ No newline at end of file
+        commit_with_retry()
+
+    @staticmethod
+    def update_statement(product_id, values):
+        return (
+            update(Product)
+            .where(Product.id == product_id)
+            .values(**values, version=Product.version + 1, updated_at=utcnow())
+            .returning(*columns(ProductDTO.FIELDS))
+        )
+
+    @staticmethod
+    def delete_statement(product_id):
+        return delete(Product).where(Product.id == product_id).returning(Product.picture)
+
+    @staticmethod
+    def update_by_id(product_id, values):
+        """
+        Update one product in a single UPDATE ... RETURNING.
+
+        Returns the updated row (ProductDTO.FIELDS), or None when no product
+        has that id. Row and table versions are maintained here, as the ORM
+        flush hook never sees this statement.
+        """
+        def write(session):
+            row = session.execute(ProductRepository.update_statement(product_id, values)).first()
+            if row is not None:
+                bump_table_version(Product.__tablename__, session)
+            return row
+        return run_write(write)
+
+    @staticmethod
+    def delete_by_id(product_id):
+        """Delete one product; returns its former picture as a 1-tuple row, or None when it did not exist."""
+        def write(session):
+            row = session.execute(ProductRepository.delete_statement(product_id)).first()
+            if row is not None:
+                bump_table_version(Product.__tablename__, session)
+            return row
+        return run_write(write)
+
+    @staticmethod
+    @retry_on_lock
+    def attach_image(product_id, key, size, place_file):
+        product = db.session.get(Product, product_id)
+        if product is None:
+            return None
+        # Claiming the blob row takes SQLite's write lock, so the file can be
+        # placed without racing a garbage collection of the same key
+        db.session.execute(sqlite_insert(ImageBlob).values(key=key, size=size, refcount=0).on_conflict_do_nothing())
+        place_file()
+        product.picture = key
+        db.session.commit()
+        return product
+
+    @staticmethod
+    @retry_on_lock
+    def delete_unreferenced_blobs(remove_file):
+        keys = db.session.scalars(delete(ImageBlob).where(ImageBlob.refcount <= 0).returning(ImageBlob.key)).all()
+        for chunk in chunked(keys):
+            db.session.execute(delete(ImageDerivative).where(ImageDerivative.source_key.in_(chunk)))
+        # Files go while the write lock is held, for the same reason as above
+        for key in keys:
+            remove_file(key)
+        db.session.commit()
+        return keys
+
+    @staticmethod
+    @retry_on_lock
+    def record_derivatives(source_key, rows, files_exist, discard_files):
+        """
+        Record the derivatives of a blob, replacing earlier ones of the same
+        names. Returns False, after ``discard_files``, when the blob was
+        collected while they were being rendered.
+        """
+        try:
+            # A no-op write: it takes the write lock, so no collection can run
+            # between the checks below and the commit
+            found = db.session.execute(
+                update(ImageBlob).where(ImageBlob.key == source_key).values(size=ImageBlob.size)).rowcount
+            if not found or not files_exist():
+                discard_files()
+                db.session.rollback()
+                return False
+            statement = sqlite_insert(ImageDerivative)
+            statement = statement.on_conflict_do_update(
+                index_elements=[ImageDerivative.source_key, ImageDerivative.name],
+                set_={column: statement.excluded[column] for column in ('path', 'width', 'height', 'size')}
+            )
+            db.session.execute(statement, [dict(row, source_key=source_key) for row in rows])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return True
+
+    @staticmethod
+    def derivative_names(source_key):
+        return set(db.session.scalars(select(ImageDerivative.name).where(ImageDerivative.source_key == source_key)))
+
+    @staticmethod
+    def get_derivative(source_key, name):
+        return db.session.get(ImageDerivative, (source_key, name))
+
+    @staticmethod
+    def keys_missing_derivatives(names):
+        """Keys of the blobs lacking a derivative of any of ``names``; every blob's key when ``names`` is None."""
+        query = select(ImageBlob.key).order_by(ImageBlob.key)
+        if names is not None:
+            names = list(names)
+            have = (
+                select(func.count()).select_from(ImageDerivative)
+                .where(ImageDerivative.source_key == ImageBlob.key, ImageDerivative.name.in_(names))
+                .scalar_subquery()
+            )
+            query = query.where(have < len(names))
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def existing_ids(ids):
+        found = set()
+        for chunk in chunked(ids):
+            found.update(db.session.scalars(select(Product.id).where(Product.id.in_(chunk))))
+        return found
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_create(rows):
+        try:
+            # A single executemany INSERT; ids come back in parameter order
+            ids = db.session.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), rows).all()
+            bump_table_version(Product.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return ids
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_update(rows):
+        try:
+            existing = ProductRepository.existing_ids(row['id'] for row in rows)
+            matched = [row for row in rows if row['id'] in existing]
+            if matched:
+                # One executemany UPDATE that also bumps each row's version
+                columns = [key for key in matched[0] if key != 'id']
+                values = {key: bindparam('_' + key) for key in columns}
+                values.update(version=Product.version + 1, updated_at=utcnow())
+                statement = update(Product.__table__).where(Product.id == bindparam('_id')).values(values)
+                db.session.connection().execute(statement, [{'_' + key: value for key, value in row.items()} for row in matched])
+                bump_table_version(Product.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return existing
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_upsert(rows):
+        """
+        Insert ``rows``, updating the product instead where a row's id exists.
+
+        Rows whose id is None become new products. A single executemany
+        INSERT ... ON CONFLICT DO UPDATE, which bumps the updated rows' version.
+        """
+        table = Product.__table__
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(index_elements=[table.c.id], set_={
+            'name': statement.excluded.name,
+            'price': statement.excluded.price,
+            'description': statement.excluded.description,
+            'version': table.c.version + 1,
+            'updated_at': utcnow()
+        })
+        try:
+            db.session.connection().execute(statement, rows)
+            bump_table_version(Product.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_delete(ids):
+        deleted = set()
+        try:
+            for chunk in chunked(ids):
+                statement = delete(Product).where(Product.id.in_(chunk)).returning(Product.id)
+                deleted.update(db.session.scalars(statement.execution_options(synchronize_session=False)))
+            if deleted:
+                bump_table_version(Product.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return deleted
\ No newline at end of file
@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import DDL, event
+
+FTS_TABLE = 'product_fts'
+
+# External content FTS5 index over product(name, description). The triggers
+# keep it in sync with every write to the product table, including bulk and
+# raw SQL writes that bypass the ORM.
+CREATE_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "name, description, content='product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+)
+
+DROP_STATEMENTS = (
+    'DROP TRIGGER IF EXISTS product_fts_au',
+    'DROP TRIGGER IF EXISTS product_fts_ad',
+    'DROP TRIGGER IF EXISTS product_fts_ai',
+    'DROP TABLE IF EXISTS product_fts',
+)
+
+REBUILD_STATEMENT = "INSERT INTO product_fts(product_fts) VALUES ('rebuild')"
+
+# Matches in the name weigh more than matches in the description
+SEARCH_STATEMENT = (
+    'SELECT product.id, product.name, product.price, product.description, '
+    'bm25(product_fts, 10.0, 1.0) AS rank '
+    'FROM product_fts JOIN product ON product.id = product_fts.rowid '
+    'WHERE product_fts MATCH :match '
+    'ORDER BY rank LIMIT :limit OFFSET :offset'
+)
+
+MAX_TERMS = 16
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def register_search_index(table):
+    for statement in CREATE_STATEMENTS:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    for statement in DROP_STATEMENTS:
+        event.listen(table, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every term is quoted so user input can never inject FTS5 operators, and
+    the last term is a prefix query so results follow the user's typing.
+    Returns None when the text contains no searchable term.
+    """
+    terms = TERM_PATTERN.findall(text)[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
@@ -1,50 +1,252 @@
+import math
+import os
+
 from products.repositories import ProductRepository
 from products.models import Product  # Import the Product class
 from products.dtos import ProductDTO
+from extensions import cache
+from pagination import is_sqlite_int
+from products.search import build_match_query
+from products.catalog import CatalogQuery
+from products.storage import content_store, is_content_key
+from products.derivatives import derivative_state
 
 class ProductService:
     @staticmethod
     def get_all_products():
         return ProductRepository.get_all()
 
+    @staticmethod
+    def get_catalog_version():
+        return ProductRepository.get_table_version()
+
+    @staticmethod
+    def get_products_page(limit, after=None, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        # Returns (rows, next_key); fetches one extra row to know whether another page follows
+        catalog = catalog or CatalogQuery()
+        rows = ProductRepository.get_page(limit + 1, after, fields, catalog)
+        next_key = catalog.cursor_for(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_key
+
+    @staticmethod
+    def iter_all_products(batch_size=1000, fields=ProductDTO.LIST_FIELDS, catalog=None):
+        return ProductRepository.iter_all(batch_size, fields, catalog)
+
+    @staticmethod
+    def iter_export(batch_size=1000, since=None):
+        return ProductRepository.iter_export(batch_size, since)
+
+    @staticmethod
+    def search_products(query, limit, offset=0):
+        match = build_match_query(query)
+        if match is None:
+            return [], None
+        # Fetch one extra row to know whether another page follows
+        rows = ProductRepository.search(match, limit + 1, offset)
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
     @staticmethod
     def get_product_by_id(product_id):
+        data = cache.get_or_load('product', product_id, ProductService._load_product)
+        if data:
+            return ProductDTO.from_dict(data)
+        return None
+
+    @staticmethod
+    def get_product_with_version(product_id, fields=None):
+        # Returns (dto, version, updated_at); the validators come from the same cache entry.
+        # With ``fields`` a cache miss reads only those columns and is not cached.
+        if fields is None:
+            data = cache.get_or_load('product', product_id, ProductService._load_product)
+        else:
+            data = cache.peek('product', product_id) or ProductService._load_product_fields(product_id, fields)
+        if data:
+            return ProductDTO.from_dict(data), data['version'], data['updated_at']
+        return None, None, None
+
+    @staticmethod
+    def get_product_validators(product_id):
+        # (version, updated_at) to answer a conditional GET with; a cache miss reads only those columns
+        data = cache.peek('product', product_id)
+        if data:
+            return data['version'], data['updated_at']
+        row = ProductRepository.get_validators(product_id)
+        if row:
+            return row.version, row.updated_at.isoformat() if row.updated_at else None
+        return None, None
+
+    @staticmethod
+    def _load_product(product_id):
         product = ProductRepository.get_by_id(product_id)
         if product:
-            return ProductDTO(product.id, product.name, product.price, product.picture, product.description)
+            data = ProductDTO.from_model(product).to_dict()
+            data['version'] = product.version
+            data['updated_at'] = product.updated_at.isoformat() if product.updated_at else None
+            return data
+        return None
+
+    @staticmethod
+    def _load_product_fields(product_id, fields):
+        product = ProductRepository.get_fields(product_id, fields)
+        if product:
+            data = {name: getattr(product, name) for name in fields}
+            data['version'] = product.version
+            data['updated_at'] = product.updated_at.isoformat() if product.updated_at else None
+            return data
         return None
 
     @staticmethod
     def create_product(name, price, description=None):
         product = Product(name=name, price=price, description=description)
         ProductRepository.create(product)
+        cache.invalidate('product', product.id)
         return product
 
     @staticmethod
-    def update_product(product_id, name, price, picture, description=None):
-        product = ProductRepository.get_by_id(product_id)
-        if product:
-            product.name = name
-            product.price = price
-            product.picture = picture
-            product.description = description
-            ProductRepository.update()
-            return product
-        return None
+    def update_product(product_id, name, price, picture=None, description=None):
+        # picture=None keeps the current picture; uploads go through upload_product_image
+        values = {'name': name, 'price': price, 'description': description}
+        if picture is not None:
+            values['picture'] = picture
+        return ProductService._update(product_id, values)
 
     @staticmethod
     def update_product_picture(product_id, file_path):
-        product = ProductRepository.get_by_id(product_id)
-        if product:
-            product.picture = file_path
-            ProductRepository.update()
-            return product
-        return None
+        return ProductService._update(product_id, {'picture': file_path})
+
+    @staticmethod
+    def _update(product_id, values):
+        # One UPDATE ... RETURNING; no row means no such product
+        row = ProductRepository.update_by_id(product_id, values)
+        if row is None:
+            return None
+        cache.invalidate('product', product_id)
+        if 'picture' in values:
+            # The replaced picture is not returned; the refcount triggers
+            # already released it, so collect whatever became unreferenced
+            ProductService.collect_image_garbage()
+        return ProductDTO(*row)
+
+    @staticmethod
+    def upload_product_image(product_id, stream, extension, max_size=None):
+        store = content_store()
+        upload = store.receive(stream, extension, max_size)
+        try:
+            product = ProductRepository.attach_image(product_id, upload.key, upload.size, lambda: store.place(upload))
+        finally:
+            upload.discard()
+        if product is None:
+            return None
+        cache.invalidate('product', product_id)
+        ProductService.collect_image_garbage()
+        ProductService.schedule_image_derivatives(upload.key)
+        return product
+
+    @staticmethod
+    def schedule_image_derivatives(key):
+        """Queue rendering the derivatives of blob ``key``; the job, or None when there is nothing to do."""
+        state = derivative_state()
+        if state is None:
+            return None
+        # Identical uploads share a blob, and with it the derivatives already rendered
+        if not set(state.sizes) - ProductRepository.derivative_names(key):
+            return None
+        return state.submit(key)
+
+    @staticmethod
+    def record_image_derivatives(key, derivatives):
+        """Record files written by products.derivatives.render; False when the blob is gone by now."""
+        store = content_store()
+        rows = [
+            dict(derivative, path=os.path.relpath(derivative['path'], store.root).replace(os.sep, '/'))
+            for derivative in derivatives
+        ]
+        return ProductRepository.record_derivatives(
+            key, rows,
+            lambda: all(os.path.isfile(derivative['path']) for derivative in derivatives),
+            lambda: store.remove_derivatives(key)
+        )
+
+    @staticmethod
+    def get_image_derivative_path(key, name):
+        """Absolute path of the ``name`` derivative of blob ``key``, or None until it is rendered."""
+        derivative = ProductRepository.get_derivative(key, name)
+        if derivative is None:
+            return None
+        path = os.path.join(content_store().root, *derivative.path.split('/'))
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def image_keys_missing_derivatives(names=None):
+        return ProductRepository.keys_missing_derivatives(names)
+
+    @staticmethod
+    def collect_image_garbage():
+        store = content_store()
+        return ProductRepository.delete_unreferenced_blobs(store.remove)
 
     @staticmethod
     def delete_product(product_id):
-        product = ProductRepository.get_by_id(product_id)
-        if product:
-            ProductRepository.delete(product)
-            return True
-        return False
\ No newline at end of file
+        row = ProductRepository.delete_by_id(product_id)
+        if row is None:
+            return False
+        cache.invalidate('product', product_id)
+        if is_content_key(row.picture):
+            ProductService.collect_image_garbage()
+        return True
+
+    @staticmethod
+    def validate_product_data(data, require_id=False):
+        if not isinstance(data, dict):
+            return 'Product must be an object'
+        if require_id and not is_sqlite_int(data.get('id')):
+            return 'id must be an integer'
+        name = data.get('name')
+        if not isinstance(name, str) or not 1 <= len(name) <= 50:
+            return 'Name should be between 1 and 50 characters'
+        price = data.get('price')
+        if not (is_sqlite_int(price) or isinstance(price, float) and math.isfinite(price)):
+            return 'Price must be a number'
+        description = data.get('description')
+        if description is not None and (not isinstance(description, str) or len(description) > 500):
+            return 'Description should be a string of at most 500 characters'
+        return None
+
+    @staticmethod
+    def bulk_create_products(items):
+        rows = [{'name': item['name'], 'price': item['price'], 'description': item.get('description')} for item in items]
+        return ProductRepository.bulk_create(rows)
+
+    @staticmethod
+    def bulk_update_products(items):
+        rows = [
+            {'id': item['id'], 'name': item['name'], 'price': item['price'], 'description': item.get('description')}
+            for item in items
+        ]
+        updated = ProductRepository.bulk_update(rows)
+        for product_id in updated:
+            cache.invalidate('product', product_id)
+        return updated
+
+    @staticmethod
+    def upsert_products(items):
+        # Items with an id replace that product, or create it under that id; the others are new products
+        rows = [
+            {'id': item.get('id'), 'name': item['name'], 'price': item['price'], 'description': item.get('description')}
+            for item in items
+        ]
+        ProductRepository.bulk_upsert(rows)
+        for row in rows:
+            if row['id'] is not None:
+                cache.invalidate('product', row['id'])
+        return len(rows)
+
+    @staticmethod
+    def bulk_delete_products(product_ids):
+        deleted = ProductRepository.bulk_delete(product_ids)
+        for product_id in deleted:
+            cache.invalidate('product', product_id)
+        if deleted:
+            ProductService.collect_image_garbage()
+        return deleted
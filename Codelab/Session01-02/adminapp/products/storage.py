@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from flask import current_app
+from sqlalchemy import DDL, event
+
+CHUNK_SIZE = 64 * 1024
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{1,5}$')
+
+# image_blob.refcount counts the products whose picture is the blob's key.
+# Keeping it in triggers means every write path that touches product.picture
+# (single-row, bulk or raw SQL) keeps the count right. Legacy pictures that
+# are plain paths have no image_blob row and are left alone.
+REFCOUNT_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS product_picture_ai AFTER INSERT ON product "
+    "WHEN new.picture IS NOT NULL BEGIN "
+    "UPDATE image_blob SET refcount = refcount + 1 WHERE key = new.picture; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_picture_au AFTER UPDATE OF picture ON product "
+    "WHEN old.picture IS NOT new.picture BEGIN "
+    "UPDATE image_blob SET refcount = refcount - 1 WHERE key = old.picture; "
+    "UPDATE image_blob SET refcount = refcount + 1 WHERE key = new.picture; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_picture_ad AFTER DELETE ON product "
+    "WHEN old.picture IS NOT NULL BEGIN "
+    "UPDATE image_blob SET refcount = refcount - 1 WHERE key = old.picture; "
+    "END",
+)
+
+
+def register_refcount_triggers(table):
+    for statement in REFCOUNT_TRIGGERS:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def is_content_key(value):
+    return isinstance(value, str) and KEY_PATTERN.match(value) is not None
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class ReceivedUpload:
+    def __init__(self, key, size, temp_path):
+        self.key = key
+        self.size = size
+        self.temp_path = temp_path
+
+    def discard(self):
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.temp_path = None
+
+
+class ContentStore:
+    """
+    Content-addressed file store for uploaded images.
+
+    A file is stored once under the SHA-256 of its bytes plus its extension,
+    sharded by the first two hex digits: <root>/ab/ab12...ef.png. Resized
+    copies of it go in a directory named after the hash, next to it:
+    <root>/ab/ab12...ef/thumb.webp.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.temp_dir = os.path.join(root, '.tmp')
+
+    def path_for(self, key):
+        if not is_content_key(key):
+            raise ValueError(f'Not a content key: {key!r}')
+        return os.path.join(self.root, key[:2], key)
+
+    def derivative_dir(self, key):
+        return os.path.splitext(self.path_for(key))[0]
+
+    def derivative_path(self, key, name, extension):
+        return os.path.join(self.derivative_dir(key), f'{name}.{extension}')
+
+    def receive(self, stream, extension, max_size=None):
+        """Copy ``stream`` to a temp file chunk by chunk, hashing it on the way."""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise UploadTooLarge(f'Upload exceeds {max_size} bytes')
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return ReceivedUpload(f'{digest.hexdigest()}.{extension.lower()}', size, temp_path)
+
+    async def receive_async(self, chunks, extension, max_size=None):
+        """
+        Like receive, for an async iterator of byte chunks.
+
+        Chunks are gathered to CHUNK_SIZE and written from a worker thread,
+        so the event loop serves other requests while the disk is busy.
+        """
+        await asyncio.to_thread(os.makedirs, self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = await asyncio.to_thread(tempfile.mkstemp, dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                pending = bytearray()
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise UploadTooLarge(f'Upload exceeds {max_size} bytes')
+                    digest.update(chunk)
+                    pending += chunk
+                    if len(pending) >= CHUNK_SIZE:
+                        await asyncio.to_thread(temp_file.write, bytes(pending))
+                        pending.clear()
+                if pending:
+                    await asyncio.to_thread(temp_file.write, bytes(pending))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return ReceivedUpload(f'{digest.hexdigest()}.{extension.lower()}', size, temp_path)
+
+    def place(self, upload):
+        # Identical content is already stored; the new copy is simply dropped
+        path = self.path_for(upload.key)
+        if os.path.exists(path):
+            upload.discard()
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(upload.temp_path, path)
+        upload.temp_path = None
+        return path
+
+    def remove(self, key):
+        """Remove the file stored under ``key`` and its derivatives."""
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+        self.remove_derivatives(key)
+
+    def remove_derivatives(self, key):
+        shutil.rmtree(self.derivative_dir(key), ignore_errors=True)
+
+
+def content_store():
+    return ContentStore(current_app.config['UPLOAD_FOLDER'])
@@ -1,11 +1,22 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from products.repositories import ProductRepository
-from products.models import Product
+from products.models import Product, ImageBlob
 from extensions import db
 from flask import Flask
+from sqlalchemy import text, update
+from datetime import datetime
+import csv
+import io
+import json
 import os
+import shutil
+import tempfile
 from products.services import ProductService, ProductDTO
+from products.controllers import products_bp
+from products.catalog import CatalogQuery
+from pagination import encode_cursor
+from tests.helpers import BlueprintTestCase
 
 class TestProductRepository(unittest.TestCase):
 
@@ -86,39 +97,564 @@ class TestProductService(unittest.TestCase):
         mock_create.assert_called_once_with(mock_product)
         mock_product_class.assert_called_once_with(name='Product1', price=100, description='desc')
 
-    @patch('products.services.ProductRepository.update')
-    @patch('products.services.ProductRepository.get_by_id')
-    def test_update_product(self, mock_get_by_id, mock_update):
-        mock_product = MagicMock()
-        mock_get_by_id.return_value = mock_product
+    @patch('products.services.ProductService.collect_image_garbage')
+    @patch('products.services.ProductRepository.update_by_id')
+    def test_update_product(self, mock_update_by_id, mock_collect):
+        mock_update_by_id.return_value = (1, 'Product1', 100, 'pic.jpg', 'desc')
         result = ProductService.update_product(1, 'Product1', 100, 'pic.jpg', 'desc')
-        self.assertEqual(result, mock_product)
-        self.assertEqual(mock_product.name, 'Product1')
-        self.assertEqual(mock_product.price, 100)
-        self.assertEqual(mock_product.picture, 'pic.jpg')
-        self.assertEqual(mock_product.description, 'desc')
-        mock_update.assert_called_once()
-        mock_get_by_id.assert_called_once_with(1)
+        self.assertEqual(result, ProductDTO(1, 'Product1', 100, 'pic.jpg', 'desc'))
+        mock_update_by_id.assert_called_once_with(
+            1, {'name': 'Product1', 'price': 100, 'description': 'desc', 'picture': 'pic.jpg'})
+        mock_collect.assert_called_once()
 
-    @patch('products.services.ProductRepository.update')
-    @patch('products.services.ProductRepository.get_by_id')
-    def test_update_product_picture(self, mock_get_by_id, mock_update):
-        mock_product = MagicMock()
-        mock_get_by_id.return_value = mock_product
+    @patch('products.services.ProductService.collect_image_garbage')
+    @patch('products.services.ProductRepository.update_by_id')
+    def test_update_product_keeps_picture(self, mock_update_by_id, mock_collect):
+        mock_update_by_id.return_value = (1, 'Product1', 100, 'pic.jpg', None)
+        ProductService.update_product(1, 'Product1', 100)
+        self.assertNotIn('picture', mock_update_by_id.call_args.args[1])
+        mock_collect.assert_not_called()
+
+    @patch('products.services.ProductRepository.update_by_id')
+    def test_update_missing_product(self, mock_update_by_id):
+        mock_update_by_id.return_value = None
+        self.assertIsNone(ProductService.update_product(1, 'Product1', 100))
+
+    @patch('products.services.ProductService.collect_image_garbage')
+    @patch('products.services.ProductRepository.update_by_id')
+    def test_update_product_picture(self, mock_update_by_id, mock_collect):
+        mock_update_by_id.return_value = (1, 'Product1', 100, 'new_pic.jpg', None)
         result = ProductService.update_product_picture(1, 'new_pic.jpg')
-        self.assertEqual(result, mock_product)
-        self.assertEqual(mock_product.picture, 'new_pic.jpg')
-        mock_update.assert_called_once()
-        mock_get_by_id.assert_called_once_with(1)
+        self.assertEqual(result.picture, 'new_pic.jpg')
+        mock_update_by_id.assert_called_once_with(1, {'picture': 'new_pic.jpg'})
 
-    @patch('products.services.ProductRepository.delete')
-    @patch('products.services.ProductRepository.get_by_id')
-    def test_delete_product(self, mock_get_by_id, mock_delete):
-        mock_product = MagicMock()
-        mock_get_by_id.return_value = mock_product
+    @patch('products.services.ProductRepository.delete_by_id')
+    def test_delete_product(self, mock_delete_by_id):
+        mock_delete_by_id.return_value = MagicMock(picture=None)
         result = ProductService.delete_product(1)
         self.assertTrue(result)
-        mock_delete.assert_called_once_with(mock_product)
-        mock_get_by_id.assert_called_once_with(1)
+        mock_delete_by_id.assert_called_once_with(1)
+
+    @patch('products.services.ProductRepository.delete_by_id')
+    def test_delete_missing_product(self, mock_delete_by_id):
+        mock_delete_by_id.return_value = None
+        self.assertFalse(ProductService.delete_product(1))
+
+class TestProductPagination(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+    config = {'STREAM_BATCH_SIZE': 2}
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            db.session.add(Product(name=f'Product{i}', price=10.0 + i, description='desc'))
+        db.session.commit()
+
+    def test_stream_all_products(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual([p['name'] for p in response.get_json()], [f'Product{i}' for i in range(5)])
+
+    def test_keyset_pages(self):
+        names = []
+        response = self.client.get('/products/?limit=2')
+        while True:
+            body = response.get_json()
+            names.extend(p['name'] for p in body['items'])
+            if body['next_cursor'] is None:
+                break
+            response = self.client.get(f"/products/?limit=2&after={body['next_cursor']}")
+        self.assertEqual(names, [f'Product{i}' for i in range(5)])
+
+    def test_invalid_page_args(self):
+        self.assertEqual(self.client.get('/products/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/products/?after=not-a-cursor').status_code, 400)
+
+class TestProductBulk(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def test_bulk_create(self):
+        items = [{'name': f'Product{i}', 'price': i, 'description': 'desc'} for i in range(100)]
+        response = self.client.post('/products/bulk', json=items)
+        self.assertEqual(response.status_code, 201)
+        results = response.get_json()['results']
+        self.assertEqual(len(results), 100)
+        self.assertEqual(Product.query.get(results[42]['id']).name, 'Product42')
+
+    def test_bulk_create_validates_up_front(self):
+        response = self.client.post('/products/bulk', json=[{'name': 'Ok', 'price': 1}, {'name': 'No price'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'][0]['index'], 1)
+        self.assertEqual(Product.query.count(), 0)
+
+    def test_bulk_update_and_delete(self):
+        ids = [r['id'] for r in self.client.post('/products/bulk', json=[
+            {'name': 'A', 'price': 1}, {'name': 'B', 'price': 2}
+        ]).get_json()['results']]
+
+        response = self.client.put('/products/bulk', json=[
+            {'id': ids[0], 'name': 'A2', 'price': 10}, {'id': 999, 'name': 'X', 'price': 1}
+        ])
+        self.assertEqual([r['status'] for r in response.get_json()['results']], [200, 404])
+        db.session.expire_all()
+        self.assertEqual(Product.query.get(ids[0]).name, 'A2')
+
+        response = self.client.delete('/products/bulk', json=[ids[1], 999])
+        self.assertEqual([r['status'] for r in response.get_json()['results']], [200, 404])
+        self.assertEqual(Product.query.count(), 1)
+
+class TestProductSearch(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([
+            Product(name='Brake pad', price=20.0, description='Ceramic brake pad for the front axle'),
+            Product(name='Oil filter', price=8.0, description='Fits most brake-by-wire sedans'),
+            Product(name='Wiper blade', price=12.0, description=None),
+        ])
+        db.session.commit()
+
+    def search(self, query):
+        return [p['name'] for p in self.client.get('/products/search', query_string={'q': query}).get_json()['items']]
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search('brake'), ['Brake pad', 'Oil filter'])
+
+    def test_prefix_and_operator_safety(self):
+        self.assertEqual(self.search('wip'), ['Wiper blade'])
+        self.assertEqual(self.search('"brake" OR'), [])
+        self.assertEqual(self.search('brake"*('), ['Brake pad', 'Oil filter'])
+
+    def test_index_follows_writes(self):
+        product = Product.query.filter_by(name='Wiper blade').first()
+        product.name = 'Windscreen wiper'
+        db.session.commit()
+        self.assertEqual(self.search('windscreen'), ['Windscreen wiper'])
+        db.session.delete(product)
+        db.session.commit()
+        self.assertEqual(self.search('wiper'), [])
+
+    def test_paging(self):
+        first = self.client.get('/products/search?q=brake&limit=1').get_json()
+        self.assertEqual(first['next_offset'], 1)
+        second = self.client.get('/products/search?q=brake&limit=1&offset=1').get_json()
+        self.assertEqual([p['name'] for p in second['items']], ['Oil filter'])
+        self.assertIsNone(second['next_offset'])
+
+    def test_requires_query(self):
+        self.assertEqual(self.client.get('/products/search').status_code, 400)
+
+    def test_invalid_offset(self):
+        self.app.config['SEARCH_OFFSET_MAX'] = 100
+        self.assertEqual(self.client.get('/products/search?q=brake&offset=100').status_code, 200)
+        for offset in ('-1', 'first', '101', str(10 ** 30)):
+            response = self.client.get(f'/products/search?q=brake&offset={offset}')
+            self.assertEqual(response.status_code, 400, offset)
+
+class TestProductImageUpload(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+    config = {'MAX_CONTENT_LENGTH': 1024}
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        super().setUp()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.first = ProductService.create_product('First', 1.0)
+        self.second = ProductService.create_product('Second', 2.0)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.upload_folder)
+
+    def upload(self, product_id, content, filename='photo.png'):
+        return self.client.post(f'/products/{product_id}/upload_image',
+                                data={'image': (io.BytesIO(content), filename)},
+                                content_type='multipart/form-data')
+
+    def stored_files(self):
+        return [name for root, _, files in os.walk(self.upload_folder) if not root.endswith('.tmp') for name in files]
+
+    def test_identical_uploads_stored_once(self):
+        first = self.upload(self.first.id, b'same bytes').get_json()['picture']
+        second = self.upload(self.second.id, b'same bytes', 'other-name.png').get_json()['picture']
+        self.assertEqual(first, second)
+        self.assertEqual(self.stored_files(), [first])
+        self.assertEqual(db.session.get(ImageBlob, first).refcount, 2)
+
+    def test_same_filename_does_not_overwrite(self):
+        first = self.upload(self.first.id, b'first image').get_json()['picture']
+        second = self.upload(self.second.id, b'second image').get_json()['picture']
+        self.assertNotEqual(first, second)
+        self.assertEqual(sorted(self.stored_files()), sorted([first, second]))
+
+    def test_unreferenced_files_are_removed(self):
+        old = self.upload(self.first.id, b'old image').get_json()['picture']
+        self.upload(self.first.id, b'new image')
+        self.assertNotIn(old, self.stored_files())
+        ProductService.delete_product(self.first.id)
+        self.assertEqual(self.stored_files(), [])
+        self.assertEqual(ImageBlob.query.count(), 0)
+
+    def test_raw_body_upload(self):
+        response = self.client.post(f'/products/{self.first.id}/upload_image', data=b'raw bytes', content_type='image/png')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.get_json()['picture'].endswith('.png'))
+
+    def test_too_large_rejected_before_reading(self):
+        response = self.upload(self.first.id, b'x' * 2048)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.stored_files(), [])
+
+class TestProductImageDownload(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        super().setUp()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.product = ProductService.create_product('Product', 1.0)
+        self.content = bytes(range(256)) * 4
+        self.key = ProductService.upload_product_image(self.product.id, io.BytesIO(self.content), 'png').picture
+        self.url = f'/products/{self.product.id}/image'
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.upload_folder)
+
+    def test_full_image(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertEqual(response.data, self.content)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.get_etag(), (self.key.split('.')[0], False))
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        response.close()
+
+    def test_versioned_url_is_immutable(self):
+        response = self.client.get(f'{self.url}?v={self.key}')
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        response.close()
+        # A stale key is answered with the current image, but not cached for good
+        response = self.client.get(f'{self.url}?v=0.png')
+        self.assertFalse(response.cache_control.immutable)
+        response.close()
+
+    def test_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.content[10:20])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        response.close()
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=5000-'}).status_code, 416)
+
+    def test_validators(self):
+        first = self.client.get(self.url)
+        first.close()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': first.headers['ETag']}).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code, 304)
+
+    def test_missing_image(self):
+        other = ProductService.create_product('No image', 1.0)
+        self.assertEqual(self.client.get(f'/products/{other.id}/image').status_code, 404)
+        self.assertEqual(self.client.get('/products/999/image').status_code, 404)
+
+    def test_legacy_path_outside_upload_folder(self):
+        ProductService.update_product_picture(self.product.id, '../../etc/passwd')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_x_accel_redirect(self):
+        self.app.config['IMAGE_OFFLOAD'] = 'x-accel-redirect'
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/_uploads/{self.key[:2]}/{self.key}')
+        self.assertEqual(response.mimetype, 'image/png')
+        response = self.client.get(self.url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+
+    def test_x_sendfile(self):
+        self.app.config['IMAGE_OFFLOAD'] = 'x-sendfile'
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Sendfile'], os.path.realpath(os.path.join(self.upload_folder, self.key[:2], self.key)))
+
+class TestProductFieldsets(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def setUp(self):
+        super().setUp()
+        self.product = ProductService.create_product('Product', 1.0, description='A long description')
+        self.record_statements()
+
+    def product_selects(self):
+        return [s for s in self.statements if s.startswith('SELECT') and 'FROM product' in s]
+
+    def test_page_reads_only_requested_columns(self):
+        response = self.client.get('/products/?limit=10&fields=price,name')
+        self.assertEqual(response.get_json()['items'], [{'id': self.product.id, 'name': 'Product', 'price': 1.0}])
+        [select] = self.product_selects()
+        self.assertNotIn('description', select)
+
+    def test_stream_with_fields(self):
+        response = self.client.get('/products/?fields=picture')
+        self.assertEqual(response.get_json(), [{'id': self.product.id, 'picture': None}])
+
+    def test_unknown_field(self):
+        for url in ('/products/?fields=name,secret', f'/products/{self.product.id}?fields=secret'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('secret', response.get_json()['message'])
+
+    def test_detail_reads_only_requested_columns(self):
+        response = self.client.get(f'/products/{self.product.id}?fields=name')
+        self.assertEqual(response.get_json(), {'id': self.product.id, 'name': 'Product'})
+        [select] = self.product_selects()
+        self.assertNotIn('description', select)
+        self.assertNotIn('picture', select)
+
+    def test_detail_etag_is_per_fieldset(self):
+        full = self.client.get(f'/products/{self.product.id}')
+        sparse = self.client.get(f'/products/{self.product.id}?fields=name')
+        self.assertNotEqual(full.headers['ETag'], sparse.headers['ETag'])
+        response = self.client.get(f'/products/{self.product.id}?fields=name',
+                                   headers={'If-None-Match': sparse.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(f'/products/{self.product.id}?fields=name',
+                                   headers={'If-None-Match': full.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+
+class TestProductCatalog(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def setUp(self):
+        super().setUp()
+        names = ['Brake pad', 'Brake disc', 'Oil filter', 'Air filter', 'Bulb', 'Brake fluid', 'Wiper']
+        prices = [20.0, 45.0, 8.5, 8.5, 3.0, 8.5, 12.0]
+        db.session.add_all([Product(name=name, price=price) for name, price in zip(names, prices)])
+        db.session.commit()
+
+    def collect_pages(self, query, limit=2):
+        items = []
+        url = f'/products/?limit={limit}&{query}'
+        while url:
+            body = self.client.get(url).get_json()
+            items.extend(body['items'])
+            url = f"/products/?limit={limit}&{query}&after={body['next_cursor']}" if body['next_cursor'] else None
+        return items
+
+    def test_sort_by_price_pages_through_ties(self):
+        items = self.collect_pages('sort=price')
+        self.assertEqual([(p['price'], p['id']) for p in items],
+                         sorted((p.price, p.id) for p in Product.query.all()))
+        descending = self.collect_pages('sort=price&order=desc')
+        self.assertEqual(descending, items[::-1])
+
+    def test_sort_by_name_with_filters(self):
+        items = self.collect_pages('sort=name&min_price=5&max_price=30&fields=name')
+        self.assertEqual([p['name'] for p in items], ['Air filter', 'Brake fluid', 'Brake pad', 'Oil filter', 'Wiper'])
+
+    def test_name_prefix_is_a_range(self):
+        items = self.collect_pages('name_prefix=Brake&sort=name&order=desc')
+        self.assertEqual([p['name'] for p in items], ['Brake pad', 'Brake fluid', 'Brake disc'])
+        streamed = self.client.get('/products/?name_prefix=Brake%20d').get_json()
+        self.assertEqual([p['name'] for p in streamed], ['Brake disc'])
+
+    def test_stream_is_sorted(self):
+        streamed = self.client.get('/products/?sort=price&order=desc&max_price=10').get_json()
+        self.assertEqual([p['price'] for p in streamed], [8.5, 8.5, 8.5, 3.0])
+
+    def test_invalid_parameters(self):
+        for query in ('min_price=cheap', 'max_price=nan', 'min_price=5&max_price=1', 'sort=description',
+                      'order=up', 'limit=2&sort=price&after=' + encode_cursor(3),
+                      'limit=1&after=' + encode_cursor(10 ** 30),
+                      'limit=1&sort=price&after=' + encode_cursor(1, 10 ** 30),
+                      'limit=1&sort=price&after=' + encode_cursor(10 ** 30, 1),
+                      'limit=1&sort=price&after=' + encode_cursor(float('inf'), 1),
+                      'limit=1&sort=price&after=' + encode_cursor(float('nan'), 1)):
+            response = self.client.get(f'/products/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def explain(self, catalog, after=None, fields=ProductDTO.LIST_FIELDS):
+        query = ProductRepository.catalog_query(fields, catalog, after).limit(10)
+        sql = str(query.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        return ' '.join(row[3] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)))
+
+    def test_sorted_pages_are_index_range_scans(self):
+        plan = self.explain(CatalogQuery(sort='price'), after=(8.5, 3))
+        self.assertIn('USING INDEX ix_product_price_id (price>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = self.explain(CatalogQuery(sort='price', descending=True, min_price=5), after=(20.0, 1))
+        self.assertIn('USING INDEX ix_product_price_id', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = self.explain(CatalogQuery(sort='name', name_prefix='Brake'))
+        self.assertIn('USING INDEX ix_product_name_id (name>? AND name<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = self.explain(CatalogQuery(sort='price'), after=(8.5, 3), fields=('id', 'price'))
+        self.assertIn('USING COVERING INDEX ix_product_price_id', plan)
+
+class TestProductWrites(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+
+    def setUp(self):
+        super().setUp()
+        self.product = ProductService.create_product('Product', 1.0, 'desc')
+        self.record_statements()
+
+    def product_statements(self):
+        return [s for s in self.statements if 'product' in s and 'table_version' not in s]
+
+    def test_update_is_a_single_statement(self):
+        product_id = self.product.id
+        response = self.client.put(f'/products/{product_id}', json={'name': 'Renamed', 'price': 2.0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(),
+                         {'id': product_id, 'name': 'Renamed', 'price': 2.0, 'description': None})
+        statements = self.product_statements()
+        self.assertEqual(len(statements), 1, statements)
+        self.assertTrue(statements[0].startswith('UPDATE product'))
+        product = db.session.get(Product, product_id)
+        self.assertEqual((product.name, product.version), ('Renamed', 2))
+
+    def test_delete_is_a_single_statement(self):
+        response = self.client.delete(f'/products/{self.product.id}')
+        self.assertEqual(response.status_code, 200)
+        statements = self.product_statements()
+        self.assertEqual(len(statements), 1, statements)
+        self.assertTrue(statements[0].startswith('DELETE FROM product'))
+        self.assertIsNone(db.session.get(Product, self.product.id))
+
+    def test_missing_product(self):
+        missing = self.product.id + 1
+        self.assertEqual(self.client.put(f'/products/{missing}', json={'name': 'Renamed', 'price': 2.0}).status_code, 404)
+        self.assertEqual(self.client.delete(f'/products/{missing}').status_code, 404)
+
+    def test_writes_change_the_list_etag(self):
+        etag = self.client.get('/products/').headers['ETag']
+        ProductService.update_product(self.product.id, 'Renamed', 1.0)
+        updated = self.client.get('/products/').headers['ETag']
+        self.assertNotEqual(updated, etag)
+        ProductService.delete_product(self.product.id)
+        self.assertNotEqual(self.client.get('/products/').headers['ETag'], updated)
+
+class TestProductConditionalGet(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+    config = {'HTTP_CACHE_CONTROL': 'private, no-cache'}
+
+    def setUp(self):
+        super().setUp()
+        self.product = ProductService.create_product('Product', 1.0)
+        self.record_statements()
+
+    def test_list_not_modified_without_reading_rows(self):
+        first = self.client.get('/products/?limit=10')
+        self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+        self.assertIsNotNone(first.last_modified)
+
+        self.statements.clear()
+        response = self.client.get('/products/?limit=10', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertFalse([s for s in self.statements if 'FROM product' in s])
+
+    def test_list_etag_changes_on_write_and_with_parameters(self):
+        etag = self.client.get('/products/').headers['ETag']
+        self.assertNotEqual(self.client.get('/products/?limit=5').headers['ETag'], etag)
+        ProductService.create_product('Another', 2.0)
+        response = self.client.get('/products/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_detail_etag_follows_row_version(self):
+        url = f'/products/{self.product.id}'
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        ProductService.update_product(self.product.id, 'Renamed', 1.0)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['name'], 'Renamed')
+
+    def test_detail_not_modified_reads_only_validators(self):
+        for url in (f'/products/{self.product.id}', f'/products/{self.product.id}?fields=name'):
+            etag = self.client.get(url).headers['ETag']
+            self.statements.clear()
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['ETag'], etag)
+            reads = [s for s in self.statements if 'FROM product' in s]
+            self.assertEqual(len(reads), 1)
+            self.assertNotIn('product.name', reads[0])
+        self.assertEqual(self.client.get('/products/999', headers={'If-None-Match': etag}).status_code, 404)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/products/').headers['Last-Modified']
+        response = self.client.get('/products/', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+class TestProductExport(BlueprintTestCase):
+    blueprint = products_bp
+    url_prefix = '/products'
+    config = {'STREAM_BATCH_SIZE': 2}
+
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([Product(name=f'Product {n}', price=n, description='Front, left' if n == 1 else None) for n in range(1, 6)])
+        db.session.commit()
+        # Products 4 and 5 changed later than the rest
+        db.session.execute(update(Product).values(updated_at=datetime(2026, 1, 1)))
+        db.session.execute(update(Product).where(Product.id >= 4).values(updated_at=datetime(2026, 3, 1, 12)))
+        db.session.commit()
+
+    def test_ndjson(self):
+        response = self.client.get('/products/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([line['id'] for line in lines], [1, 2, 3, 4, 5])
+        self.assertEqual(lines[0], {
+            'id': 1, 'name': 'Product 1', 'price': 1.0, 'picture': None,
+            'description': 'Front, left', 'updated_at': '2026-01-01T00:00:00'
+        })
+
+    def test_csv(self):
+        response = self.client.get('/products/export?format=csv')
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['description'], 'Front, left')
+        self.assertEqual(rows[1]['description'], '')
+
+    def test_since(self):
+        response = self.client.get('/products/export?since=2026-03-01T12:00:00')
+        self.assertEqual([json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()], [4, 5])
+        # An offset is converted to UTC
+        response = self.client.get('/products/export?since=2026-03-01T14:00:01%2B02:00')
+        self.assertEqual(response.get_data(as_text=True), '')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/products/export?format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/products/export?since=yesterday').status_code, 400)
+
+    def test_since_uses_index(self):
+        plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id FROM product WHERE updated_at >= :since ORDER BY updated_at, id'
+        ), {'since': datetime(2026, 3, 1)}).all()
+        self.assertIn('ix_product_updated_at_id', ' '.join(row[-1] for row in plan))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import unittest
+
+from flask import Flask
+from sqlalchemy import event
+
+from extensions import db
+
+
+class FakeClock:
+    """A clock for the ``clock`` parameters of the cache and admission classes, moved by setting ``now``."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BlueprintTestCase(unittest.TestCase):
+    """
+    Serves ``blueprint`` at ``url_prefix`` from a bare Flask app on the
+    config_test database, with ``config`` applied on top of it.
+
+    setUp leaves the app context pushed and the tables created, so subclasses
+    add their rows after calling it; tearDown drops the tables again.
+    """
+    blueprint = None
+    url_prefix = None
+    config = {}
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.from_object('config_test')
+        self.app.config.update(self.config)
+        db.init_app(self.app)
+        self.app.register_blueprint(self.blueprint, url_prefix=self.url_prefix)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def record_statements(self):
+        """Collect the SQL of every statement run from now to the end of the test in ``statements``."""
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record_statement)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', self.record_statement)
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
@@ -0,0 +1,160 @@
+import threading
+import unittest
+
+from admission import TokenBuckets, WriterGate
+from app import create_app
+from extensions import db
+from tests.helpers import FakeClock
+
+
+class TestWriterGate(unittest.TestCase):
+
+    def test_queue_full(self):
+        gate = WriterGate(max_writers=1, queue_size=0, timeout=1)
+        self.assertIsNone(gate.acquire())
+        self.assertEqual(gate.acquire(), 'queue_full')
+        gate.release()
+        self.assertIsNone(gate.acquire())
+
+    def test_timeout(self):
+        gate = WriterGate(max_writers=1, queue_size=1, timeout=0.01)
+        gate.acquire()
+        self.assertEqual(gate.acquire(), 'timeout')
+        self.assertEqual(gate.waiting, 0)
+
+    def test_release_admits_waiter(self):
+        gate = WriterGate(max_writers=1, queue_size=1, timeout=5)
+        gate.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+        waiter.start()
+        while gate.waiting == 0:
+            pass
+        gate.release()
+        waiter.join()
+        self.assertEqual(results, [None])
+        self.assertEqual(gate.active, 1)
+
+
+class TestTokenBuckets(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        buckets = TokenBuckets(rate=2, burst=3, clock=clock)
+        self.assertEqual([buckets.take('a') for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(buckets.take('a'), 0.5)
+        # Another client has its own bucket
+        self.assertEqual(buckets.take('b'), 0)
+        clock.now = 0.5
+        self.assertEqual(buckets.take('a'), 0)
+
+    def test_forgets_least_recent_clients(self):
+        buckets = TokenBuckets(rate=1, burst=1, max_clients=2, clock=FakeClock())
+        for client in ('a', 'b', 'c'):
+            buckets.take(client)
+        self.assertEqual(buckets.take('a'), 0)
+        self.assertGreater(buckets.take('c'), 0)
+
+
+class Config:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SWAGGER_ENABLED = False
+    MIGRATIONS_ENABLED = False
+    IMAGE_DERIVATIVES_ENABLED = False
+    ADMISSION_MAX_WRITERS = 1
+    ADMISSION_QUEUE_SIZE = 0
+    ADMISSION_RETRY_AFTER = 3
+
+
+class TestAdmissionControl(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(Config)
+        self.entered = threading.Event()
+        self.proceed = threading.Event()
+
+        @self.app.route('/test-write', methods=['POST'])
+        def write():
+            self.entered.set()
+            self.proceed.wait(5)
+            return {'message': 'Written'}
+
+        @self.app.route('/test-failing-write', methods=['POST'])
+        def failing_write():
+            raise RuntimeError('Write failed')
+
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.proceed.set()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_sheds_writes_beyond_the_queue(self):
+        first = []
+        writer = threading.Thread(target=lambda: first.append(self.app.test_client().post('/test-write')))
+        writer.start()
+        self.entered.wait(5)
+
+        response = self.client.post('/products/', json={'name': 'Product', 'price': 1.0})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '3')
+        # Reads are not held back
+        self.assertEqual(self.client.get('/products/?limit=1').status_code, 200)
+        metrics = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('adminapp_admission_rejected_total{reason="queue_full"} 1', metrics)
+        self.assertIn('adminapp_admission_writers 1', metrics)
+        self.assertIn('adminapp_admission_queue_depth 0', metrics)
+
+        self.proceed.set()
+        writer.join()
+        self.assertEqual(first[0].status_code, 200)
+        self.assertEqual(self.client.post('/products/', json={'name': 'Product', 'price': 1.0}).status_code, 201)
+
+    def test_slot_released_after_error(self):
+        with self.assertRaises(RuntimeError):
+            self.client.post('/test-failing-write')
+        self.assertEqual(self.app.extensions['admission'].gate.active, 0)
+
+    def test_disabled(self):
+        class Disabled(Config):
+            ADMISSION_ENABLED = False
+        self.assertNotIn('admission', create_app(Disabled).extensions)
+
+
+class TestClientRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        class Limited(Config):
+            ADMISSION_CLIENT_RATE = 0.01
+            ADMISSION_CLIENT_BURST = 2
+        self.app = create_app(Limited)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_limited_per_client(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post('/products/', json={'name': 'Product', 'price': 1.0}).status_code, 201)
+        response = self.client.post('/products/', json={'name': 'Product', 'price': 1.0})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 99)
+        other = self.client.post('/products/', json={'name': 'Product', 'price': 1.0},
+                                 environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(other.status_code, 201)
+        self.assertEqual(self.client.get('/products/?limit=1').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
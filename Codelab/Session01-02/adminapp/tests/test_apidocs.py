@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+
+import app as app_module
+from app import create_app
+from flasgger import Swagger
+
+
+class Config:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SWAGGER_ENABLED = True
+
+
+class TestLazySwagger(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(Config)
+        self.client = self.app.test_client()
+
+    def test_spec_built_once_on_first_request(self):
+        self.assertIsNone(self.app.extensions['swagger']['spec'])
+        with patch.object(Swagger, 'get_apispecs', autospec=True, side_effect=Swagger.get_apispecs) as get_apispecs:
+            first = self.client.get('/apispec_1.json')
+            second = self.client.get('/apispec_1.json')
+        self.assertEqual(get_apispecs.call_count, 1)
+        self.assertEqual(first.get_json(), second.get_json())
+        paths = first.get_json()['paths']
+        self.assertIn('/products/{product_id}', paths)
+        self.assertIn('get', paths['/users/'])
+
+    def test_ui_and_static_files(self):
+        response = self.client.get('/apidocs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'/apispec_1.json', self.client.get('/apidocs/?json=1').data)
+        self.assertIn(b'/flasgger_static/swagger-ui-bundle.js', response.data)
+        self.assertEqual(self.client.get('/flasgger_static/swagger-ui-bundle.js').status_code, 200)
+        self.assertEqual(self.client.get('/apidocs/index.html').status_code, 302)
+
+
+class TestStartupProfiles(unittest.TestCase):
+
+    def test_production_skips_swagger_and_migrate(self):
+        app = create_app('config.ProductionConfig')
+        self.assertNotIn('swagger', app.extensions)
+        self.assertNotIn('migrate', app.extensions)
+        self.assertEqual(app.test_client().get('/apispec_1.json').status_code, 404)
+
+    def test_default_profile_keeps_them(self):
+        app = create_app('config.Config')
+        self.assertIn('swagger', app.extensions)
+        self.assertIn('migrate', app.extensions)
+
+    def test_default_app_is_built_on_access(self):
+        with patch.object(app_module, 'create_app', return_value='app') as factory:
+            vars(app_module).pop('app', None)
+            self.assertEqual(app_module.app, 'app')
+            self.assertEqual(app_module.app, 'app')
+            vars(app_module).pop('app')
+        factory.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
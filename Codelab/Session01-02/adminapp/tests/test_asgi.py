@@ -0,0 +1,154 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from werkzeug.datastructures import FileStorage
+from app import create_app
+from extensions import db
+from pagination import encode_cursor
+from products.models import ImageBlob, Product
+
+try:
+    import aiosqlite  # noqa: F401, the async engine's driver
+    from asgi import create_asgi_app
+except ImportError:  # Quart and aiosqlite are only needed for the ASGI app
+    create_asgi_app = None
+
+
+@unittest.skipIf(create_asgi_app is None, 'quart or aiosqlite is not installed')
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.root = tempfile.mkdtemp()
+        self.upload_folder = os.path.join(self.root, 'uploads')
+
+        class Config:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.root, 'test.db')
+            UPLOAD_FOLDER = self.upload_folder
+            MAX_CONTENT_LENGTH = 1024
+            STREAM_BATCH_SIZE = 2
+
+        # The WSGI app owns the schema; both apps share the database file
+        self.wsgi = create_app(Config)
+        with self.wsgi.app_context():
+            db.create_all()
+            db.session.add_all([Product(name=f'Product {n}', price=n, description='desc') for n in range(1, 6)])
+            db.session.commit()
+        self.app = create_asgi_app(Config)
+        self.serving = self.app.test_app()
+        await self.serving.startup()
+        self.client = self.app.test_client()
+
+    async def asyncTearDown(self):
+        await self.serving.shutdown()
+        with self.wsgi.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.root)
+
+    def stored_files(self):
+        return [name for root, _, files in os.walk(self.upload_folder) if not root.endswith('.tmp') for name in files]
+
+    async def test_lists_match_the_wsgi_app(self):
+        sync_client = self.wsgi.test_client()
+        for url in ('/products/', '/products/?limit=2', '/products/?limit=2&sort=price&order=desc&fields=price',
+                    '/products/?min_price=2&max_price=4', '/products/search?q=product', '/users/', '/users/?limit=1'):
+            response = await self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(await response.get_json(), sync_client.get(url).get_json(), url)
+
+    async def test_out_of_range_cursor(self):
+        response = await self.client.get(f'/users/?limit=1&after={encode_cursor(10 ** 30)}')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((await response.get_json())['message'], 'Invalid cursor')
+
+    async def test_search_offset_is_bounded(self):
+        response = await self.client.get(f'/products/search?q=product&offset={10 ** 30}')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_user_lifecycle(self):
+        response = await self.client.post('/users/', json={'name': 'Test User', 'email': 'test@example.com'})
+        self.assertEqual(response.status_code, 201)
+        user_id = (await response.get_json())['id']
+
+        response = await self.client.post('/users/', json={'name': 'Other User', 'email': 'TEST@example.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await response.get_json(), {'message': 'Email already in use'})
+
+        other = await self.client.post('/users/', json={'name': 'Other User', 'email': 'other@example.com'})
+        response = await self.client.put(f'/users/{user_id}', json={'name': 'Renamed', 'email': 'OTHER@example.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((await self.client.delete(f"/users/{(await other.get_json())['id']}")).status_code, 200)
+
+        response = await self.client.put(f'/users/{user_id}', json={'name': 'Renamed', 'email': 'new@example.com'})
+        self.assertEqual(await response.get_json(), {'id': user_id, 'name': 'Renamed', 'email': 'new@example.com'})
+        response = await self.client.get(f'/users/{user_id}?fields=email')
+        self.assertEqual(await response.get_json(), {'id': user_id, 'email': 'new@example.com'})
+
+        self.assertEqual((await self.client.delete(f'/users/{user_id}')).status_code, 200)
+        self.assertEqual((await self.client.delete(f'/users/{user_id}')).status_code, 404)
+        self.assertEqual((await self.client.get(f'/users/{user_id}')).status_code, 404)
+
+    async def test_writes_bump_versions_seen_by_the_wsgi_app(self):
+        etag = self.wsgi.test_client().get('/products/').headers['ETag']
+        response = await self.client.put('/products/1', json={'name': 'Renamed', 'price': 2.0})
+        self.assertEqual((await response.get_json())['name'], 'Renamed')
+        self.assertNotEqual(self.wsgi.test_client().get('/products/').headers['ETag'], etag)
+        with self.wsgi.app_context():
+            self.assertEqual(db.session.get(Product, 1).version, 2)
+        self.assertEqual((await self.client.put('/products/99', json={'name': 'x', 'price': 1})).status_code, 404)
+
+    async def test_conditional_get(self):
+        response = await self.client.get('/products/1')
+        etag = response.headers['ETag']
+        response = await self.client.get('/products/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        await self.client.put('/products/1', json={'name': 'Renamed', 'price': 1.0})
+        response = await self.client.get('/products/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_create_product_is_validated(self):
+        response = await self.client.post('/products/', json={'name': 'Brake pad', 'price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.client.post('/products/', json={'name': 'Brake pad', 'price': 9.5})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((await response.get_json())['id'], 6)
+
+    async def test_uploads_are_stored_by_content(self):
+        response = await self.client.post('/products/1/upload_image', data=b'raw bytes',
+                                          headers={'Content-Type': 'image/png'})
+        self.assertEqual(response.status_code, 201)
+        first = (await response.get_json())['picture']
+        self.assertEqual(self.stored_files(), [first])
+
+        response = await self.client.post('/products/1/upload_image',
+                                          files={'image': _file_storage(b'other bytes', 'photo.jpg')})
+        self.assertEqual(response.status_code, 201)
+        second = (await response.get_json())['picture']
+        self.assertTrue(second.endswith('.jpg'))
+        # The replaced picture lost its last reference
+        self.assertEqual(self.stored_files(), [second])
+        with self.wsgi.app_context():
+            self.assertEqual([blob.key for blob in ImageBlob.query.all()], [second])
+
+        self.assertEqual((await self.client.delete('/products/1')).status_code, 200)
+        self.assertEqual(self.stored_files(), [])
+
+    async def test_upload_errors(self):
+        response = await self.client.post('/products/1/upload_image', data=b'x' * 2048,
+                                          headers={'Content-Type': 'image/png'})
+        self.assertEqual(response.status_code, 413)
+        response = await self.client.post('/products/99/upload_image', data=b'raw bytes',
+                                          headers={'Content-Type': 'image/png'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stored_files(), [])
+
+
+def _file_storage(content, filename):
+    return FileStorage(io.BytesIO(content), filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+from benchmarks import report, runner, scaling, startup
+from benchmarks.scenarios import SCENARIOS, select_scenarios
+from benchmarks.seed import Workspace, seed
+from app import create_app
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        self.app = self.workspace.create_app(CACHE_ENABLED=False)
+        seed(self.app, 150, 150)
+
+    def tearDown(self):
+        self.workspace.cleanup()
+
+    def test_every_route_is_covered(self):
+        app = create_app('config_test')
+        routes = {
+            (method, rule.rule)
+            for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in ('users', 'products')
+            for method in rule.methods - {'HEAD', 'OPTIONS'}
+        }
+        self.assertEqual(routes, {(scenario.method, scenario.rule) for scenario in SCENARIOS})
+
+    def test_run_all_scenarios_without_errors(self):
+        results = runner.run(self.app, SCENARIOS, 150, 150, [1, 2], requests=4, warmup=1)
+        self.assertEqual(len(results), 2 * len(SCENARIOS))
+        for result in results:
+            self.assertEqual(result['errors'], 0, result)
+            self.assertEqual(result['requests'], 4)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        results = runner.run(self.app, select_scenarios(['products.get']), 150, 150, [1], requests=5, warmup=0)
+        baseline = {'results': results}
+        slower = {'results': [dict(results[0], rps=results[0]['rps'] / 2)]}
+        self.assertFalse(report.compare(baseline, baseline)[0]['regressed'])
+        comparison = report.compare(baseline, slower)[0]
+        self.assertTrue(comparison['regressed'])
+        self.assertIn('throughput -50%', comparison['reasons'])
+
+
+try:
+    import aiosqlite, hypercorn, quart  # noqa: F401
+    ASGI_SERVER = True
+except ImportError:
+    ASGI_SERVER = False
+
+
+@unittest.skipIf(not ASGI_SERVER, 'quart, aiosqlite or hypercorn is not installed')
+class TestScalingBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        self.app = self.workspace.create_app()
+        seed(self.app, 50, 50)
+
+    def tearDown(self):
+        self.workspace.cleanup()
+
+    def test_both_servers_over_http(self):
+        scenarios = select_scenarios(['users.create', 'products.get', 'products.list_all', 'products.delete'])
+        results = scaling.run(self.workspace, self.app, scenarios, 50, 50, levels=[1, 3], requests_per_client=2,
+                              warmup=1)
+        self.assertEqual(len(results), 2 * 2 * len(scenarios))
+        for result in results:
+            self.assertEqual(result['errors'], 0, result)
+            self.assertEqual(result['requests'], 2 * result['concurrency'])
+            self.assertTrue(result['scenario'].startswith(result['server'] + ':'))
+        table = scaling.format_table(results).splitlines()
+        self.assertEqual(len(table), 1 + 2 * len(scenarios))
+        self.assertIn('asgi req/s', table[0])
+
+
+class TestStartupBenchmark(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        modules = startup.parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     sqlalchemy.sql\n'
+            'import time:        80 |        200 |   sqlalchemy\n'
+            'import time:        30 |        230 | app\n'
+        )
+        self.assertEqual(modules, [('sqlalchemy.sql', 2, 120, 120), ('sqlalchemy', 1, 80, 200), ('app', 0, 30, 230)])
+        self.assertEqual(startup.slowest_packages(modules, 1), [{'package': 'sqlalchemy', 'self_ms': 0.2}])
+
+    def test_fresh_interpreter(self):
+        results = startup.run(['config.ProductionConfig'], repeats=1)
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertGreater(result['startup_ms'], 0)
+        self.assertIsNone(result['first_docs_ms'])
+        self.assertIn('sqlalchemy', [item['package'] for item in result['slowest_packages']])
+        self.assertEqual(startup.over_budget(results, result['startup_ms'] - 1), results)
+        self.assertEqual(startup.over_budget(results, result['startup_ms'] + 1), [])
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 0.50), 50)
+        self.assertEqual(runner.percentile(values, 0.95), 95)
+        self.assertEqual(runner.percentile(values, 0.99), 99)
+        self.assertEqual(runner.percentile([7], 0.99), 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import threading
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from cache import LRUCache, LocalSharedClient, SharedCache, TieredCache, MISSING
+from extensions import db, cache
+from products.models import Product
+from products.services import ProductService
+from tests.helpers import FakeClock
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIs(lru.get('b'), MISSING)
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        lru = LRUCache(max_size=2, ttl=10, clock=clock)
+        lru.set('a', 1)
+        clock.now = 11
+        self.assertIs(lru.get('a'), MISSING)
+        self.assertEqual(len(lru), 0)
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def test_shared_hit_fills_local(self):
+        shared = SharedCache(LocalSharedClient())
+        shared.set('product:1', {'id': 1})
+        tiered = TieredCache(LRUCache(), shared)
+        self.assertEqual(tiered.get('product:1'), {'id': 1})
+        self.assertEqual(tiered.get('product:1'), {'id': 1})
+        self.assertIs(tiered.get('product:2'), MISSING)
+        stats = tiered.stats()
+        self.assertEqual((stats['shared_hits'], stats['local_hits'], stats['misses']), (1, 1, 1))
+
+    def test_delete_reaches_shared(self):
+        shared = SharedCache(LocalSharedClient())
+        tiered = TieredCache(LRUCache(), shared)
+        tiered.set('user:1', {'id': 1})
+        tiered.delete('user:1')
+        self.assertIs(shared.get('user:1'), MISSING)
+
+    def test_load_racing_a_delete_is_not_cached(self):
+        for shared in (None, SharedCache(LocalSharedClient())):
+            tiered = TieredCache(LRUCache(), shared)
+            token = tiered.load_token('user:1')
+            # Another request updates and invalidates the entry while the old row is being loaded
+            tiered.delete('user:1')
+            tiered.set('user:1', {'id': 1, 'name': 'Old'}, token)
+            self.assertIs(tiered.get('user:1'), MISSING)
+            tiered.set('user:1', {'id': 1, 'name': 'New'}, tiered.load_token('user:1'))
+            self.assertEqual(tiered.get('user:1'), {'id': 1, 'name': 'New'})
+
+    def test_delete_in_another_process_invalidates_shared_entry(self):
+        client = LocalSharedClient()
+        first = TieredCache(LRUCache(), SharedCache(client))
+        second = TieredCache(LRUCache(), SharedCache(client))
+        token = first.load_token('user:1')
+        second.delete('user:1')
+        first.set('user:1', {'id': 1}, token)
+        first.local.clear()
+        self.assertIs(first.get('user:1'), MISSING)
+
+    def test_clear_keeps_other_apps_keys(self):
+        client = LocalSharedClient()
+        client.set('other:key', b'1')
+        shared = SharedCache(client)
+        shared.set('user:1', {'id': 1})
+        shared.delete('user:2')
+        shared.clear()
+        self.assertIs(shared.get('user:1'), MISSING)
+        self.assertEqual(client.scan_iter(match='adminapp:*'), [])
+        self.assertEqual(client.get('other:key'), b'1')
+
+    def test_counters_are_exact_under_concurrency(self):
+        tiered = TieredCache(LRUCache())
+        tiered.set('user:1', {'id': 1})
+
+        def lookups():
+            for _ in range(1000):
+                tiered.get('user:1')
+                tiered.get('user:2')
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = tiered.stats()
+        self.assertEqual((stats['local_hits'], stats['misses']), (8000, 8000))
+
+
+class TestServiceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.from_object('config_test')
+        self.app.config['CACHE_SHARED_URL'] = 'local://'
+        db.init_app(self.app)
+        cache.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_read_through_and_invalidation(self):
+        product = ProductService.create_product('Cached', 10.0, 'desc')
+        with patch('products.services.ProductRepository.get_by_id', wraps=Product.query.get) as mock_get:
+            ProductService.get_product_by_id(product.id)
+            ProductService.get_product_by_id(product.id)
+            self.assertEqual(mock_get.call_count, 1)
+
+            ProductService.update_product_picture(product.id, 'new.png')
+            self.assertEqual(ProductService.get_product_by_id(product.id).picture, 'new.png')
+
+        self.assertEqual(cache.stats()['hits'], 1)
+        ProductService.delete_product(product.id)
+        self.assertIsNone(ProductService.get_product_by_id(product.id))
+
+    def test_local_ttl_is_short_with_a_shared_backend(self):
+        backend = self.app.extensions['entity_cache']
+        self.assertEqual(backend.local.ttl, self.app.config['CACHE_SHARED_LOCAL_TTL'])
+        self.assertLess(backend.local.ttl, self.app.config['CACHE_TTL'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import gzip
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+import compression
+from app import create_app
+from extensions import db
+from products.models import Product
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        self.app.config['COMPRESSION_MIN_SIZE'] = 200
+
+        @self.app.route('/test-image')
+        def image():
+            return self.app.response_class(b'\x89PNG' + b'\0' * 4096, mimetype='image/png')
+
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add_all([
+            Product(name=f'Product {n}', price=n, description='A long description that repeats ' * 3)
+            for n in range(1, 51)
+        ])
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record_statement)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def get(self, url, encoding='gzip', **headers):
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+        return self.client.get(url, headers=headers)
+
+    def test_gzip_page(self):
+        identity = self.get('/products/?limit=20', encoding=None)
+        response = self.get('/products/?limit=20')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('Accept-Encoding', identity.headers['Vary'])
+        self.assertLess(response.content_length, identity.content_length)
+        self.assertEqual(gzip.decompress(response.data), identity.data)
+        self.assertEqual(response.headers['ETag'], 'W/' + identity.headers['ETag'])
+
+    def test_streamed_list(self):
+        identity = self.get('/products/', encoding=None)
+        response = self.get('/products/', encoding='br;q=1, gzip;q=0.8')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.data), identity.data)
+
+    def test_cached_body_skips_compression_and_query(self):
+        first = self.get('/products/').data
+        self.statements.clear()
+        with patch('compression._compress_chunks') as compress_chunks:
+            second = self.get('/products/')
+        compress_chunks.assert_not_called()
+        self.assertEqual(second.data, first)
+        self.assertFalse([s for s in self.statements if 'FROM product ' in s])
+        self.assertIn('adminapp_compression_cache_total{result="hit"} 1', self.client.get('/metrics').get_data(as_text=True))
+
+        db.session.add(Product(name='Another', price=1.0))
+        db.session.commit()
+        third = self.get('/products/')
+        self.assertIn(b'Another', gzip.decompress(third.data))
+
+    def test_not_modified_with_weak_etag(self):
+        etag = self.get('/products/?limit=20').headers['ETag']
+        self.assertEqual(self.get('/products/?limit=20', **{'If-None-Match': etag}).status_code, 304)
+
+    def test_skipped_responses(self):
+        product_id = Product.query.first().id
+        small = self.get(f'/products/{product_id}')
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertNotIn('Content-Encoding', self.get('/test-image').headers)
+        self.assertNotIn('Content-Encoding', self.get('/products/?limit=20', encoding='gzip;q=0').headers)
+        self.assertNotIn('Content-Encoding', self.get('/products/?limit=20', encoding='identity').headers)
+
+    def test_level_is_configurable(self):
+        self.app.config['COMPRESSION_LEVELS'] = {'gzip': 1}
+        with patch('compression.zlib.compressobj', wraps=compression.zlib.compressobj) as compressobj:
+            self.get('/products/?limit=20')
+        self.assertEqual(compressobj.call_args.args[0], 1)
+
+    def test_disabled(self):
+        class Config:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+            COMPRESSION_ENABLED = False
+        app = create_app(Config)
+        self.assertNotIn('compression', app.extensions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app
+from extensions import db
+from products.derivatives import pillow_available
+from products.models import ImageDerivative
+from products.services import ProductService
+from products.storage import content_store
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), 'test_image.png')
+
+
+class TestImageDerivatives(unittest.TestCase):
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        self.app = create_app('config_test')
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.product = ProductService.create_product('Product', 1.0)
+        with open(TEST_IMAGE, 'rb') as image:
+            self.key = ProductService.upload_product_image(self.product.id, image, 'png').picture
+        self.url = f'/products/{self.product.id}/image'
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        state = self.app.extensions.get('image_derivatives')
+        if state is not None:
+            state.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        shutil.rmtree(self.upload_folder)
+
+    def write_derivative(self, name='thumb', content=b'RIFF....WEBP'):
+        path = content_store().derivative_path(self.key, name, 'webp')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return {'name': name, 'path': path, 'width': 64, 'height': 48, 'size': len(content)}
+
+    def test_size_served_once_recorded(self):
+        response = self.client.get(f'{self.url}?size=thumb&v={self.key}')
+        # Not rendered yet: the full image, which must not be cached as the thumbnail
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertFalse(response.cache_control.immutable)
+        response.close()
+
+        self.assertTrue(ProductService.record_image_derivatives(self.key, [self.write_derivative()]))
+        response = self.client.get(f'{self.url}?size=thumb&v={self.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/webp')
+        self.assertEqual(response.data, b'RIFF....WEBP')
+        self.assertEqual(response.get_etag(), (self.key.split('.')[0] + '-thumb', False))
+        self.assertTrue(response.cache_control.immutable)
+        response.close()
+        row = db.session.get(ImageDerivative, (self.key, 'thumb'))
+        self.assertEqual(row.path, f'{self.key[:2]}/{self.key.split(".")[0]}/thumb.webp')
+
+    def test_unknown_size(self):
+        response = self.client.get(f'{self.url}?size=huge')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('thumb', response.get_json()['message'])
+
+    def test_collected_with_blob(self):
+        ProductService.record_image_derivatives(self.key, [self.write_derivative()])
+        ProductService.delete_product(self.product.id)
+        self.assertIsNone(db.session.get(ImageDerivative, (self.key, 'thumb')))
+        self.assertFalse(os.path.exists(content_store().derivative_dir(self.key)))
+
+    def test_rendered_after_collection_is_discarded(self):
+        derivative = self.write_derivative()
+        ProductService.delete_product(self.product.id)
+        os.makedirs(os.path.dirname(derivative['path']), exist_ok=True)
+        with open(derivative['path'], 'wb') as file:
+            file.write(b'late')
+        self.assertFalse(ProductService.record_image_derivatives(self.key, [derivative]))
+        self.assertIsNone(db.session.get(ImageDerivative, (self.key, 'thumb')))
+        self.assertFalse(os.path.exists(derivative['path']))
+
+    def test_keys_missing_derivatives(self):
+        sizes = self.app.config['IMAGE_DERIVATIVE_SIZES']
+        self.assertEqual(ProductService.image_keys_missing_derivatives(sizes), [self.key])
+        ProductService.record_image_derivatives(self.key, [self.write_derivative(name) for name in sizes])
+        self.assertEqual(ProductService.image_keys_missing_derivatives(sizes), [])
+        self.assertEqual(ProductService.image_keys_missing_derivatives(), [self.key])
+
+    def test_not_scheduled_when_disabled(self):
+        self.assertNotIn('image_derivatives', self.app.extensions)
+        self.assertIsNone(ProductService.schedule_image_derivatives(self.key))
+
+    @unittest.skipIf(pillow_available(), 'Pillow is installed')
+    def test_command_needs_pillow(self):
+        result = self.app.test_cli_runner().invoke(args=['generate-derivatives'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Pillow', result.output)
+
+
+@unittest.skipUnless(pillow_available(), 'Pillow is not installed')
+class TestImageDerivativeRendering(TestImageDerivatives):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(IMAGE_DERIVATIVES_ENABLED=True, IMAGE_DERIVATIVE_WORKERS=1)
+        self.app.extensions.pop('image_derivatives', None)
+        from extensions import derivatives
+        derivatives.init_app(self.app)
+
+    def test_not_scheduled_when_disabled(self):
+        pass
+
+    def test_rendered_after_upload(self):
+        from PIL import Image
+        other = ProductService.create_product('Other', 2.0)
+        image = Image.new('RGB', (400, 300), 'red')
+        data = io.BytesIO()
+        image.save(data, format='PNG')
+        data.seek(0)
+        key = ProductService.upload_product_image(other.id, data, 'png').picture
+        self.app.extensions['image_derivatives'].shutdown(wait=True)
+        response = self.client.get(f'/products/{other.id}/image?size=thumb')
+        self.assertEqual(response.mimetype, 'image/webp')
+        with Image.open(io.BytesIO(response.data)) as thumb:
+            self.assertEqual(thumb.size, (64, 48))
+        response.close()
+        self.assertEqual(ProductService.image_keys_missing_derivatives(self.app.config['IMAGE_DERIVATIVE_SIZES']), [self.key])
+        # An identical upload reuses what was rendered
+        data.seek(0)
+        ProductService.upload_product_image(self.product.id, data, 'png')
+        self.assertIsNone(ProductService.schedule_image_derivatives(key))
+
+    def test_backfill_command(self):
+        result = self.app.test_cli_runner().invoke(args=['generate-derivatives', '--workers', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('1 images to render', result.output)
+        self.assertEqual(ProductService.image_keys_missing_derivatives(self.app.config['IMAGE_DERIVATIVE_SIZES']), [])
+        response = self.client.get(f'{self.url}?size=small')
+        self.assertEqual(response.mimetype, 'image/webp')
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from app import create_app
+from extensions import db
+from group_commit import GroupCommitWriter, run_write
+from products.models import Product
+from users.models import User
+from users.services import UserService
+from versioning import get_table_version
+
+
+class TestGroupCommit(unittest.TestCase):
+    WRITERS = 8
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        class Config:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.root, 'app.db')
+            SWAGGER_ENABLED = False
+            MIGRATIONS_ENABLED = False
+            IMAGE_DERIVATIVES_ENABLED = False
+            ADMISSION_ENABLED = False
+            GROUP_COMMIT_ENABLED = True
+            # Long enough for every writer of a test to join the first batch
+            GROUP_COMMIT_WINDOW = 1.0
+            GROUP_COMMIT_MAX_BATCH = self.WRITERS
+        self.app = create_app(Config)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.writer = self.app.extensions['group_commit']
+        self.commits = 0
+        event.listen(db.engine, 'commit', self.count_commit)
+
+    def tearDown(self):
+        self.writer.shutdown()
+        event.remove(db.engine, 'commit', self.count_commit)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        shutil.rmtree(self.root)
+
+    def count_commit(self, connection):
+        self.commits += 1
+
+    def concurrently(self, request):
+        """Run ``request(n)`` for n in range(WRITERS), each on its own client and thread."""
+        results = [None] * self.WRITERS
+        start = threading.Barrier(self.WRITERS)
+
+        def run(n):
+            client = self.app.test_client()
+            start.wait()
+            results[n] = request(client, n)
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_creates_share_a_transaction(self):
+        responses = self.concurrently(
+            lambda client, n: client.post('/products/', json={'name': f'Product {n}', 'price': n + 1.0}))
+        self.assertEqual([response.status_code for response in responses], [201] * self.WRITERS)
+        ids = sorted(response.get_json()['id'] for response in responses)
+        self.assertEqual(len(set(ids)), self.WRITERS)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(db.session.query(Product).count(), self.WRITERS)
+        self.assertEqual(get_table_version('product')[0], self.WRITERS)
+        metrics = self.app.test_client().get('/metrics').get_data(as_text=True)
+        self.assertIn('adminapp_group_commit_batch_size_count 1', metrics)
+
+    def test_each_caller_gets_its_own_error(self):
+        # Every other request takes an email an earlier one in the batch already has
+        responses = self.concurrently(
+            lambda client, n: client.post('/users/', json={'name': f'User {n}', 'email': f'user{n // 2}@example.com'}))
+        statuses = sorted(response.status_code for response in responses)
+        self.assertEqual(statuses, [201] * (self.WRITERS // 2) + [400] * (self.WRITERS // 2))
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(db.session.query(User).count(), self.WRITERS // 2)
+
+    def test_update_and_delete(self):
+        self.writer.window = 0
+        user = UserService.create_user('User', 'user@example.com')
+        self.assertIsNotNone(user.id)
+        self.assertEqual(user.version, 1)
+        updated = UserService.update_user(user.id, 'Renamed', 'USER@example.com')
+        self.assertEqual(updated.name, 'Renamed')
+        self.assertEqual(db.session.get(User, user.id).version, 2)
+        self.assertTrue(UserService.delete_user(user.id))
+        self.assertFalse(UserService.delete_user(user.id))
+        self.assertEqual(get_table_version('user')[0], 3)
+
+    def test_failed_write_is_rolled_back(self):
+        self.writer.window = 0
+
+        def write(session):
+            session.add(Product(name='Rolled back', price=1.0))
+            session.flush()
+            raise ValueError('Invalid')
+        with self.assertRaises(ValueError):
+            run_write(write)
+        self.assertEqual(db.session.query(Product).count(), 0)
+
+    def test_writer_survives_unexpected_errors(self):
+        self.writer.window = 0
+        with patch.object(GroupCommitWriter, '_commit', side_effect=RuntimeError('Writer failed')):
+            with self.assertRaises(RuntimeError):
+                run_write(lambda session: None)
+        self.assertEqual(UserService.create_user('User', 'user@example.com').version, 1)
+
+    def test_timed_out_write_gets_503_and_is_withdrawn(self):
+        self.writer.window = 0
+        taken = threading.Event()
+        release = threading.Event()
+
+        def blocking_write(session):
+            taken.set()
+            release.wait(5)
+
+        def block():
+            with self.app.app_context():
+                run_write(blocking_write)
+        blocker = threading.Thread(target=block)
+        blocker.start()
+        taken.wait(5)
+        # The writer is stuck on the blocking write; the request's write waits behind it
+        self.writer.timeout = 0.1
+        response = self.app.test_client().post('/products/', json={'name': 'Product', 'price': 1.0})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        release.set()
+        blocker.join()
+        self.writer.timeout = None
+        run_write(lambda session: None)
+        self.assertEqual(db.session.query(Product).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
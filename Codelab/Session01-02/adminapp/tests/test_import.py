@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import create_app
+from extensions import db
+from importing import ParseError, import_records, read_csv, read_ndjson
+from products.models import Product
+from products.repositories import ProductRepository
+from users.models import User
+
+
+class TestImportRecords(unittest.TestCase):
+
+    def test_read_csv_converts_and_keeps_bad_values(self):
+        rows = list(read_csv(['id,name,price\n', '1,Pad,2.5\n', ',Disc,cheap\n'], {'id': int, 'price': float}))
+        self.assertEqual(rows, [
+            (2, {'id': 1, 'name': 'Pad', 'price': 2.5}),
+            (3, {'id': None, 'name': 'Disc', 'price': 'cheap'}),
+        ])
+
+    def test_read_ndjson_reports_bad_lines(self):
+        rows = list(read_ndjson(['{"a": 1}\n', '\n', '{"a": \n']))
+        self.assertEqual(rows[0], (1, {'a': 1}))
+        self.assertEqual(rows[1][0], 3)
+        self.assertIsInstance(rows[1][1], ParseError)
+
+    def test_batches_and_offset(self):
+        written = []
+        invalid = []
+        stats = import_records(
+            enumerate(range(10), 1), lambda items: {0: 'bad'}, written.append, batch_size=4, offset=2,
+            on_invalid=lambda line, message: invalid.append(line)
+        )
+        self.assertEqual(written, [[3, 4, 5], [7, 8, 9]])
+        self.assertEqual(invalid, [3, 7])
+        self.assertEqual((stats.read, stats.written, stats.invalid), (10, 6, 2))
+
+
+class TestImportCommands(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.runner = self.app.test_cli_runner()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def write(self, name, content):
+        path = os.path.join(self.folder, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def test_import_products_csv(self):
+        existing = Product(name='Old name', price=1.0, description=None)
+        db.session.add(existing)
+        db.session.commit()
+        existing_id = existing.id
+        path = self.write('products.csv', (
+            'id,name,price,description\n'
+            f'{existing_id},New name,3.5,Front\n'
+            ',Brake disc,20,\n'
+            ',X,cheap,\n'
+        ))
+
+        result = self.runner.invoke(args=['import-products', path, '--batch-size', '2'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Line 4:', result.output)
+        self.assertIn('Done: 2 records imported, 1 skipped as invalid.', result.output)
+        db.session.expire_all()
+        updated = db.session.get(Product, existing_id)
+        self.assertEqual((updated.name, updated.price, updated.description, updated.version), ('New name', 3.5, 'Front', 2))
+        self.assertEqual(Product.query.filter_by(name='Brake disc').one().price, 20)
+
+    def test_import_users_ndjson(self):
+        db.session.add_all([User(name='First', email='first@example.com'), User(name='Second', email='second@example.com')])
+        db.session.commit()
+        first, second = User.query.order_by(User.id).all()
+        path = self.write('users.ndjson', '\n'.join(json.dumps(record) for record in [
+            {'name': 'First renamed', 'email': 'FIRST@example.com'},
+            {'id': second.id, 'name': 'Second renamed', 'email': 'second@example.org'},
+            {'name': 'Third', 'email': 'third@example.com'},
+            {'id': 99, 'name': 'Taken', 'email': 'first@example.com'},
+        ]) + '\n')
+
+        result = self.runner.invoke(args=['import-users', path, '--batch-size', '2'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Line 4: Email already in use', result.output)
+        db.session.expire_all()
+        users = {user.id: (user.name, user.email, user.version) for user in User.query}
+        self.assertEqual(users[first.id], ('First renamed', 'FIRST@example.com', 2))
+        self.assertEqual(users[second.id], ('Second renamed', 'second@example.org', 2))
+        self.assertEqual(len(users), 3)
+
+    def test_non_finite_price_is_invalid(self):
+        path = self.write('products.csv', 'id,name,price,description\n,Widget,nan,\n,Gadget,1.5,\n,Huge,inf,\n')
+
+        result = self.runner.invoke(args=['import-products', path])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Line 2: Price must be a number', result.output)
+        self.assertIn('Line 4: Price must be a number', result.output)
+        self.assertEqual([product.name for product in Product.query], ['Gadget'])
+
+    def test_resume_after_failed_batch(self):
+        path = self.write('products.ndjson', ''.join(
+            json.dumps({'name': f'Product {n}', 'price': n}) + '\n' for n in range(1, 6)
+        ))
+        upsert = ProductRepository.bulk_upsert
+        calls = []
+
+        def fail_second_batch(rows):
+            calls.append(len(rows))
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            upsert(rows)
+
+        with patch.object(ProductRepository, 'bulk_upsert', side_effect=fail_second_batch):
+            result = self.runner.invoke(args=['import-products', path, '--batch-size', '2'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Import failed at record 2 (line 3): disk full', result.output)
+        self.assertIn('rerun with --offset 2', result.output)
+        self.assertEqual(Product.query.count(), 2)
+
+        result = self.runner.invoke(args=['import-products', path, '--batch-size', '2', '--offset', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual([product.name for product in Product.query.order_by(Product.id)],
+                         [f'Product {n}' for n in range(1, 6)])
+
+    def test_export_round_trip(self):
+        db.session.add_all([Product(name=f'Product {n}', price=n, description='A, "quoted" text') for n in range(1, 4)])
+        db.session.commit()
+        path = os.path.join(self.folder, 'export.csv')
+
+        result = self.runner.invoke(args=['export-products', path, '--batch-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Exported 3 products.', result.output)
+        with open(path) as exported:
+            self.assertEqual(exported.readline().strip(), 'id,name,price,picture,description,updated_at')
+
+        result = self.runner.invoke(args=['import-products', path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        db.session.expire_all()
+        products = Product.query.order_by(Product.id).all()
+        self.assertEqual([(p.name, p.description, p.version) for p in products],
+                         [(f'Product {n}', 'A, "quoted" text', 2) for n in range(1, 4)])
+
+    def test_export_since_to_stdout(self):
+        db.session.add(Product(name='Product', price=1.0, description=None))
+        db.session.commit()
+        result = self.runner.invoke(args=['export-products', '--since', '2999-01-01T00:00:00'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Exported 0 products.', result.output)
+        result = self.runner.invoke(args=['export-products', '--since', 'soon'])
+        self.assertEqual(result.exit_code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
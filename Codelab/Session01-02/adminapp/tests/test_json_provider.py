@@ -0,0 +1,109 @@
+import decimal
+import json
+import unittest
+import uuid
+from datetime import date, datetime
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from app import create_app
+from extensions import db
+from json_provider import OrjsonProvider, orjson
+from products.dtos import ProductDTO
+from products.models import Product
+from users.dtos import UserDTO
+
+
+@unittest.skipIf(orjson is None, 'orjson is not installed')
+class TestOrjsonProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        self.default = DefaultJSONProvider(self.app)
+
+    def test_enabled_by_default(self):
+        self.assertIsInstance(self.app.json, OrjsonProvider)
+
+    def test_disabled_by_config(self):
+        class Config:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+            JSON_FAST_ENCODER = False
+        self.assertNotIsInstance(create_app(Config).json, OrjsonProvider)
+
+    def test_same_values_as_default_provider(self):
+        value = {
+            'b': [1, 2.5, None, True, 'é'],
+            'a': datetime(2026, 10, 17, 12, 30),
+            'day': date(2026, 10, 17),
+            'price': decimal.Decimal('9.99'),
+            'uuid': uuid.UUID(int=1)
+        }
+        self.assertEqual(json.loads(self.app.json.dumps(value)), json.loads(self.default.dumps(value)))
+        self.assertEqual(list(json.loads(self.app.json.dumps(value))), sorted(value))
+
+    def test_non_string_keys(self):
+        self.assertEqual(json.loads(self.app.json.dumps({3: 'x'})), {'3': 'x'})
+
+    def test_falls_back_for_big_integers(self):
+        self.assertEqual(json.loads(self.app.json.dumps({'n': 2 ** 70})), {'n': 2 ** 70})
+
+    def test_loads(self):
+        self.assertEqual(self.app.json.loads(b'{"a": [1, 2]}'), {'a': [1, 2]})
+        with self.assertRaises(ValueError):
+            self.app.json.loads('{"a": ')
+
+    def test_loads_same_values_as_default_provider(self):
+        for body in (b'{"n": 100000000000000000000000000000}', '[-9223372036854775809, 18446744073709551616]',
+                     b'{"price": NaN}', b'[1e30, 12345678901234567890.5]'):
+            self.assertEqual(repr(self.app.json.loads(body)), repr(self.default.loads(body)), body)
+
+    def test_request_body_keeps_big_integers(self):
+        with self.app.test_request_context(method='POST', data='{"price": %d}' % 10 ** 30,
+                                           content_type='application/json'):
+            self.assertEqual(request.get_json(), {'price': 10 ** 30})
+
+    def test_invalid_request_body(self):
+        with self.app.app_context():
+            db.create_all()
+        response = self.app.test_client().post('/products/bulk', data='[{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestStreamedLists(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        self.app.config['STREAM_BATCH_SIZE'] = 2
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add_all([Product(name=f'Product {n}', price=n, description=None) for n in range(1, 6)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_batches_join_into_one_array(self):
+        response = self.app.test_client().get('/products/')
+        self.assertEqual(
+            response.get_json(),
+            [{'id': n, 'name': f'Product {n}', 'price': n, 'description': None} for n in range(1, 6)]
+        )
+
+
+class TestSlottedDTOs(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(ProductDTO(1, 'Pad', 1.0, None, None), '__dict__'))
+        self.assertFalse(hasattr(UserDTO(1, 'User', 'user@example.com'), '__dict__'))
+
+    def test_list_item_from_row(self):
+        self.assertEqual(ProductDTO.list_item((1, 'Pad', 2.5, 'Front')),
+                         {'id': 1, 'name': 'Pad', 'price': 2.5, 'description': 'Front'})
+        self.assertEqual(UserDTO.list_item((1, 'User', 'user@example.com')),
+                         {'id': 1, 'name': 'User', 'email': 'user@example.com'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from app import create_app
+from extensions import db
+from metrics import Counter, Histogram
+from products.models import Product
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, '/products/')
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{route="/products/",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/products/",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/products/",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{route="/products/"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/products/"} 4.05', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter('errors_total', 'Errors.', ('message',))
+        counter.inc('say "hi"\n')
+        self.assertIn('errors_total{message="say \\"hi\\"\\n"} 1', counter.render())
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(Product(name='Brake pad', price=10.0))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        return response.get_data(as_text=True).splitlines()
+
+    def test_request_latency_and_status(self):
+        self.client.get('/products/1')
+        self.client.get('/products/1')
+        self.client.get('/products/999')
+        lines = self.scrape()
+        labels = 'blueprint="products",route="/products/<int:product_id>",method="GET"'
+        self.assertIn(f'adminapp_request_duration_seconds_count{{{labels}}} 3', lines)
+        self.assertIn(f'adminapp_responses_total{{{labels},status="200"}} 2', lines)
+        self.assertIn(f'adminapp_responses_total{{{labels},status="404"}} 1', lines)
+        self.assertIn('adminapp_requests_in_flight 0', lines)
+        self.assertFalse(any('route="/metrics"' in line for line in lines))
+
+    def test_sql_statements_per_request(self):
+        registry = self.app.extensions['request_metrics']
+        before = registry.sql_statements.value()
+        self.client.get('/products/?limit=10')
+        self.assertGreater(registry.sql_statements.value(), before)
+        labels = ('products', '/products/', 'GET')
+        self.assertEqual(registry.request_sql_statements.count(*labels), 1)
+        lines = self.scrape()
+        self.assertTrue(any(line.startswith('adminapp_sql_seconds_total ') for line in lines))
+
+    def test_streamed_list_records_its_queries(self):
+        registry = self.app.extensions['request_metrics']
+        labels = ('products', '/products/', 'GET')
+        with self.client.get('/products/') as response:
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(registry.request_sql_statements.count(*labels), 0)
+            self.assertEqual(len(response.get_json()), 1)
+        self.assertEqual(registry.latency.count(*labels), 1)
+        lines = self.scrape()
+        route = 'blueprint="products",route="/products/",method="GET"'
+        # The listing's SELECT ran while the body streamed, after the view returned
+        self.assertIn(f'adminapp_request_sql_statements_bucket{{{route},le="0"}} 0', lines)
+        self.assertIn(f'adminapp_responses_total{{{route},status="200"}} 1', lines)
+
+    def test_cache_hit_ratio(self):
+        self.client.get('/products/1')
+        self.client.get('/products/1')
+        lines = self.scrape()
+        self.assertIn('adminapp_cache_hit_ratio{cache="entity"} 0.5', lines)
+        self.assertIn('adminapp_cache_hits_total{cache="entity",tier="local"} 1', lines)
+        self.assertIn('adminapp_cache_misses_total{cache="entity"} 1', lines)
+        self.assertIn('# TYPE adminapp_cache_hits_total counter', lines)
+
+    def test_disabled(self):
+        class Disabled:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+            METRICS_ENABLED = False
+        app = create_app(Disabled)
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from flask import jsonify
+from sqlalchemy import text
+
+from app import create_app
+from extensions import db, refresh_replica
+from products.services import ProductService
+
+
+class TestReplicaRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        root = self.root
+
+        class Config:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'primary.db')
+            SQLALCHEMY_BINDS = {'replica': 'sqlite:///' + os.path.join(root, 'replica.db')}
+            DB_READ_REPLICAS = ('replica',)
+            DB_REPLICA_LAG_CHECK_INTERVAL = 0
+            SWAGGER_ENABLED = False
+            MIGRATIONS_ENABLED = False
+            IMAGE_DERIVATIVES_ENABLED = False
+            COMPRESSION_ENABLED = False
+        self.app = create_app(Config)
+
+        @self.app.route('/test-create-then-list', methods=['POST'])
+        def create_then_list():
+            ProductService.create_product('Created', 1.0)
+            rows, _ = ProductService.get_products_page(100)
+            return jsonify([row.name for row in rows])
+
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.first = ProductService.create_product('First', 1.0)
+        refresh_replica('replica')
+        self.second = ProductService.create_product('Second', 2.0)
+        db.session.remove()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        # Registered globally for the bind by db.init_app; the other tests' apps lack the bind
+        db.metadatas.pop('replica', None)
+        shutil.rmtree(self.root)
+
+    def names(self, url='/products/?limit=10', **headers):
+        return [item['name'] for item in self.client.get(url, headers=headers).get_json()['items']]
+
+    def test_lists_read_from_replica(self):
+        self.assertEqual(self.names(), ['First'])
+        self.assertEqual([item['name'] for item in self.client.get('/products/').get_json()], ['First'])
+        self.assertEqual(self.names(**{'X-Read-Primary': '1'}), ['First', 'Second'])
+        refresh_replica('replica')
+        self.assertEqual(self.names(), ['First', 'Second'])
+
+    def test_etag_matches_replica_body(self):
+        replica_etag = self.client.get('/products/?limit=10').headers['ETag']
+        primary_etag = self.client.get('/products/?limit=10', headers={'X-Read-Primary': '1'}).headers['ETag']
+        self.assertNotEqual(replica_etag, primary_etag)
+        refresh_replica('replica')
+        self.assertEqual(self.client.get('/products/?limit=10').headers['ETag'], primary_etag)
+
+    def test_single_product_reads_primary(self):
+        response = self.client.get(f'/products/{self.second.id}')
+        self.assertEqual(response.get_json()['name'], 'Second')
+
+    def test_reads_after_write_go_to_primary(self):
+        response = self.client.post('/test-create-then-list')
+        self.assertEqual(response.get_json(), ['First', 'Second', 'Created'])
+
+    def test_stale_replica_is_skipped(self):
+        self.app.config['DB_REPLICA_MAX_LAG'] = 60
+        with db.engines['replica'].begin() as connection:
+            connection.execute(text('UPDATE replica_sync SET synced_at = :time'), {'time': time.time() - 120})
+        self.assertEqual(self.names(), ['First', 'Second'])
+        self.app.config['DB_REPLICA_MAX_LAG'] = None
+        self.assertEqual(self.names(), ['First'])
+        metrics = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('adminapp_replica_routing_total{target="primary"} 1', metrics)
+        self.assertIn('adminapp_replica_routing_total{target="replica"} 1', metrics)
+
+    def test_never_refreshed_replica_is_skipped(self):
+        with db.engines['replica'].begin() as connection:
+            connection.execute(text('DROP TABLE replica_sync'))
+        self.assertEqual(self.names(), ['First', 'Second'])
+
+    def test_refresh_command(self):
+        result = self.app.test_cli_runner().invoke(args=['refresh-replicas'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Refreshed replica', result.output)
+        self.assertEqual(self.names(), ['First', 'Second'])
+
+    def test_unknown_bind(self):
+        class Misconfigured:
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+            DB_READ_REPLICAS = ('replica',)
+        with self.assertRaises(RuntimeError):
+            create_app(Misconfigured)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from config import ProductionConfig
+from extensions import db
+from products.models import Product
+from products.repositories import ProductRepository
+
+
+class TestConfig(ProductionConfig):
+    TESTING = True
+    CACHE_ENABLED = False
+    DB_WRITE_RETRY_BASE_DELAY = 0
+
+
+class TestSqliteProductionProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        TestConfig.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir, 'app.db')
+        self.app = create_app(TestConfig)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(Product(name='Existing', price=1.0))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.ctx.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_pragmas_applied(self):
+        connection = db.session.connection()
+        self.assertEqual(connection.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+        self.assertEqual(connection.exec_driver_sql('PRAGMA synchronous').scalar(), 1)
+        self.assertEqual(connection.exec_driver_sql('PRAGMA busy_timeout').scalar(), 5000)
+
+    def test_readers_not_blocked_by_writer(self):
+        writer_ready = threading.Event()
+        release_writer = threading.Event()
+
+        def write():
+            conn = sqlite3.connect(os.path.join(self.tmpdir, 'app.db'), isolation_level=None)
+            # EXCLUSIVE locks out readers under rollback journaling, but not under WAL
+            conn.execute('BEGIN EXCLUSIVE')
+            conn.execute("INSERT INTO product (name, price) VALUES ('Uncommitted', 2.0)")
+            writer_ready.set()
+            release_writer.wait(5)
+            conn.execute('COMMIT')
+            conn.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            writer_ready.wait(5)
+            started = time.perf_counter()
+            for _ in range(20):
+                response = self.client.get('/products/')
+                self.assertEqual([p['name'] for p in response.get_json()], ['Existing'])
+            # Far below the 5s busy_timeout: no read waited on the write lock
+            self.assertLess(time.perf_counter() - started, 1.0)
+        finally:
+            release_writer.set()
+            writer.join()
+        self.assertEqual(len(self.client.get('/products/').get_json()), 2)
+
+    def test_write_retries_on_lock(self):
+        locked = OperationalError('COMMIT', {}, sqlite3.OperationalError('database is locked'))
+        real_commit = db.session.commit
+        calls = []
+
+        def flaky_commit():
+            calls.append(1)
+            if len(calls) == 1:
+                raise locked
+            real_commit()
+
+        with patch.object(db.session, 'commit', side_effect=flaky_commit):
+            ProductRepository.create(Product(name='Retried', price=3.0))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Product.query.filter_by(name='Retried').count(), 1)
+
+    def test_update_retry_reapplies_changes(self):
+        locked = OperationalError('UPDATE', {}, sqlite3.OperationalError('database is locked'))
+        product = Product.query.filter_by(name='Existing').first()
+        product.name = 'Renamed'
+        real_commit = db.session.commit
+        calls = []
+
+        def flaky_commit():
+            calls.append(1)
+            if len(calls) == 1:
+                raise locked
+            real_commit()
+
+        with patch.object(db.session, 'commit', side_effect=flaky_commit):
+            ProductRepository.update()
+        db.session.expire_all()
+        self.assertEqual(Product.query.get(product.id).name, 'Renamed')
+
+if __name__ == '__main__':
+    unittest.main()
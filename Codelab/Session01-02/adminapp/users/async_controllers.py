@@ -0,0 +1,101 @@
+import functools
+
+from quart import Blueprint, request, jsonify, current_app
+from users.async_services import AsyncUserService
+from users.services import EmailInUse, UserService
+from users.dtos import UserDTO
+from pagination import encode_cursor, is_page_request, parse_id_cursor
+from fieldsets import parse_fields
+from http_cache import entity_etag, list_etag
+from async_http import add_cache_headers, is_conditional, is_not_modified, not_modified_response, parse_page_args, stream_json_array
+
+# The ASGI app's /users routes; parameters and responses are documented on users.controllers
+users_bp = Blueprint('users', __name__)
+
+@users_bp.route('/', methods=['GET'])
+async def get_users():
+    """Get all users, streamed, or a page of them."""
+    fields, error = parse_fields(request.args, UserDTO.FIELDS, UserDTO.LIST_FIELDS)
+    if error:
+        return jsonify({'message': error}), 400
+
+    # Read the change counter before any row, so the ETag can never claim newer data than it labels
+    version, last_modified = await AsyncUserService.get_users_version()
+    etag = list_etag('user', version, request.args)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    if not is_page_request(request.args):
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+        response = stream_json_array(AsyncUserService.iter_user_batches(batch_size, fields), functools.partial(UserDTO.list_item, fields=fields))
+        return add_cache_headers(response, etag, last_modified)
+
+    limit, after, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    if after is not None:
+        after = parse_id_cursor(after)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+    users, next_id = await AsyncUserService.get_users_page(limit, after, fields)
+    response = jsonify({
+        'items': [UserDTO.list_item(user, fields) for user in users],
+        'next_cursor': encode_cursor(next_id) if next_id is not None else None
+    })
+    return add_cache_headers(response, etag, last_modified)
+
+@users_bp.route('/<int:user_id>', methods=['GET'])
+async def get_user(user_id):
+    """Get a user by ID."""
+    fields, error = parse_fields(request.args, UserDTO.FIELDS, None)
+    if error:
+        return jsonify({'message': error}), 400
+
+    if is_conditional():
+        # A 304 needs only the validators, not the row
+        version, last_modified = await AsyncUserService.get_user_validators(user_id)
+        if version is not None:
+            etag = entity_etag('user', user_id, version, fields)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+    user, version, last_modified = await AsyncUserService.get_user_with_version(user_id, fields)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+
+    etag = entity_etag('user', user_id, version, fields)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return add_cache_headers(jsonify(user.to_dict(fields)), etag, last_modified)
+
+@users_bp.route('/', methods=['POST'])
+async def create_user():
+    """Create a new user."""
+    data = await request.get_json()
+    error = UserService.validate_user_data(data)
+    if error:
+        return jsonify({'message': error}), 400
+
+    user = await AsyncUserService.create_user(data['name'], data['email'])
+    if user is None:
+        return jsonify({'message': 'Email already in use'}), 400
+    return jsonify(user.to_dict()), 201
+
+@users_bp.route('/<int:user_id>', methods=['PUT'])
+async def update_user(user_id):
+    """Update a user."""
+    data = await request.get_json()
+    try:
+        user = await AsyncUserService.update_user(user_id, data['name'], data['email'])
+    except EmailInUse:
+        return jsonify({'message': 'Email already in use'}), 400
+    if user:
+        return jsonify(user.to_dict())
+    return jsonify({'message': 'User not found'}), 404
+
+@users_bp.route('/<int:user_id>', methods=['DELETE'])
+async def delete_user(user_id):
+    """Delete a user."""
+    if await AsyncUserService.delete_user(user_id):
+        return jsonify({'message': 'User deleted'})
+    return jsonify({'message': 'User not found'}), 404
@@ -0,0 +1,69 @@
+from sqlalchemy import insert, select
+from users.models import User, normalize_email
+from users.dtos import UserDTO
+from users.repositories import UserRepository, columns
+from async_extensions import db, retry_on_lock
+from versioning import table_version_query, table_version_upsert
+
+
+class AsyncUserRepository:
+    """UserRepository for the ASGI app: the same statements, awaited on an AsyncSession."""
+
+    @staticmethod
+    async def get_table_version():
+        row = (await db.session.execute(table_version_query(User.__tablename__))).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    @staticmethod
+    async def get_page(limit, after_id=None, fields=UserDTO.LIST_FIELDS):
+        return (await db.session.execute(UserRepository.page_query(fields, after_id).limit(limit))).all()
+
+    @staticmethod
+    def iter_batches(batch_size, fields=UserDTO.LIST_FIELDS):
+        return db.stream_batches(UserRepository.page_query(fields), batch_size)
+
+    @staticmethod
+    async def get_fields(user_id, fields):
+        # version and updated_at feed the ETag
+        query = select(*columns(fields), User.version, User.updated_at).where(User.id == user_id)
+        return (await db.session.execute(query)).first()
+
+    @staticmethod
+    @retry_on_lock
+    async def create(name, email):
+        # email_normalized is set by a validator on the model, which Core inserts bypass
+        statement = insert(User).values(name=name, email=email, email_normalized=normalize_email(email))
+        try:
+            row = (await db.session.execute(statement.returning(*columns(UserDTO.FIELDS)))).first()
+            await db.session.execute(table_version_upsert(User.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def update_by_id(user_id, values):
+        try:
+            row = (await db.session.execute(UserRepository.update_statement(user_id, values))).first()
+            if row is not None:
+                await db.session.execute(table_version_upsert(User.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return row
+
+    @staticmethod
+    @retry_on_lock
+    async def delete_by_id(user_id):
+        try:
+            deleted = (await db.session.execute(UserRepository.delete_statement(user_id))).rowcount
+            if deleted:
+                await db.session.execute(table_version_upsert(User.__tablename__))
+            await db.session.commit()
+        except Exception:
+            await db.session.rollback()
+            raise
+        return deleted > 0
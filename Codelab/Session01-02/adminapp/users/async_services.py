@@ -0,0 +1,85 @@
+from sqlalchemy.exc import IntegrityError
+
+from users.async_repositories import AsyncUserRepository
+from users.dtos import UserDTO
+from users.services import EmailInUse
+from async_extensions import cache
+
+
+class AsyncUserService:
+    """UserService for the ASGI app. Validation stays in UserService and is shared."""
+
+    @staticmethod
+    async def get_users_version():
+        return await AsyncUserRepository.get_table_version()
+
+    @staticmethod
+    async def get_users_page(limit, after_id=None, fields=UserDTO.LIST_FIELDS):
+        # Fetch one extra row to know whether another page follows
+        rows = await AsyncUserRepository.get_page(limit + 1, after_id, fields)
+        next_id = rows[limit - 1].id if len(rows) > limit else None
+        return rows[:limit], next_id
+
+    @staticmethod
+    def iter_user_batches(batch_size=1000, fields=UserDTO.LIST_FIELDS):
+        return AsyncUserRepository.iter_batches(batch_size, fields)
+
+    @staticmethod
+    async def get_user_with_version(user_id, fields=None):
+        # Same cache entries, and the same (dto, version, updated_at) result, as UserService
+        if fields is None:
+            data = await cache.get_or_load('user', user_id, AsyncUserService._load_user)
+        else:
+            data = cache.peek('user', user_id) or await AsyncUserService._load_user_fields(user_id, fields)
+        if data:
+            return UserDTO.from_dict(data), data['version'], data['updated_at']
+        return None, None, None
+
+    @staticmethod
+    async def get_user_validators(user_id):
+        data = cache.peek('user', user_id) or await AsyncUserService._load_user_fields(user_id, ())
+        if data:
+            return data['version'], data['updated_at']
+        return None, None
+
+    @staticmethod
+    async def _load_user(user_id):
+        return await AsyncUserService._load_user_fields(user_id, UserDTO.FIELDS)
+
+    @staticmethod
+    async def _load_user_fields(user_id, fields):
+        row = await AsyncUserRepository.get_fields(user_id, fields)
+        if row:
+            data = dict(zip(fields, row))
+            data['version'] = row.version
+            data['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+            return data
+        return None
+
+    @staticmethod
+    async def create_user(name, email):
+        # Taken emails are rejected by the unique index on email_normalized
+        try:
+            row = await AsyncUserRepository.create(name, email)
+        except IntegrityError:
+            return None
+        cache.invalidate('user', row.id)
+        return UserDTO(*row)
+
+    @staticmethod
+    async def update_user(user_id, name, email):
+        try:
+            row = await AsyncUserRepository.update_by_id(user_id, {'name': name, 'email': email})
+        except IntegrityError as error:
+            raise EmailInUse(email) from error
+        if row is None:
+            return None
+        cache.invalidate('user', user_id)
+        return UserDTO(*row)
+
+    @staticmethod
+    async def delete_user(user_id):
+        if not await AsyncUserRepository.delete_by_id(user_id):
+            return False
+        cache.invalidate('user', user_id)
+        return True
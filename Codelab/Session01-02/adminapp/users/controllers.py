@@ -1,6 +1,12 @@
-from flask import Blueprint, request, jsonify
-from users.services import UserService
+import functools
+
+from flask import Blueprint, request, jsonify, current_app
+from users.services import EmailInUse, UserService
 from users.dtos import UserDTO
+from pagination import encode_cursor, is_page_request, is_sqlite_int, parse_id_cursor, parse_page_args, stream_json_array
+from fieldsets import parse_fields
+from http_cache import add_cache_headers, entity_etag, is_conditional, is_not_modified, list_etag, not_modified_response
+from bulk import collect_errors, duplicate_errors, id_results, read_bulk_body, validation_error_response
 
 users_bp = Blueprint('users', __name__)
 
@@ -9,9 +15,29 @@ def get_users():
     """
     Get all users
     ---
+    description: >
+      Without paging parameters the full list is streamed as a JSON array.
+      With limit and/or after a single page is returned together with the
+      cursor of the next page.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of users in the page
+      - name: after
+        in: query
+        type: string
+        required: false
+        description: Cursor returned as next_cursor by the previous page
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return (id, name, email); id is always included
     responses:
       200:
-        description: A list of users
+        description: A list of users, or a page of users
         schema:
           type: array
           items:
@@ -23,10 +49,39 @@ def get_users():
                 type: string
               email:
                 type: string
+      304:
+        description: Not modified since the version named in If-None-Match
+      400:
+        description: Invalid paging parameters
     """
-    users = UserService.get_all_users()
-    user_dtos = [UserDTO(user.id, user.name, user.email).to_dict() for user in users]
-    return jsonify(user_dtos)
+    fields, error = parse_fields(request.args, UserDTO.FIELDS, UserDTO.LIST_FIELDS)
+    if error:
+        return jsonify({'message': error}), 400
+
+    # Read the change counter before any row, so the ETag can never claim newer data than it labels
+    version, last_modified = UserService.get_users_version()
+    etag = list_etag('user', version, request.args)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    if not is_page_request(request.args):
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', 1000)
+        response = stream_json_array(UserService.iter_all_users(batch_size, fields), functools.partial(UserDTO.list_item, fields=fields))
+        return add_cache_headers(response, etag, last_modified)
+
+    limit, after, error = parse_page_args(request.args)
+    if error:
+        return jsonify({'message': error}), 400
+    if after is not None:
+        after = parse_id_cursor(after)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+    users, next_id = UserService.get_users_page(limit, after, fields)
+    response = jsonify({
+        'items': [UserDTO.list_item(user, fields) for user in users],
+        'next_cursor': encode_cursor(next_id) if next_id is not None else None
+    })
+    return add_cache_headers(response, etag, last_modified)
 
 @users_bp.route('/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -39,9 +94,16 @@ def get_user(user_id):
         type: integer
         required: true
         description: ID of the user
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated fields to return (id, name, email); id is always included
     responses:
       200:
         description: A user
+      304:
+        description: Not modified since the version named in If-None-Match
         schema:
           type: object
           properties:
@@ -54,11 +116,26 @@ def get_user(user_id):
       404:
         description: User not found
     """
-    user = UserService.get_user_by_id(user_id)
-    if user:
-        user_dto = UserDTO(user.id, user.name, user.email)
-        return jsonify(user_dto.to_dict())
-    return jsonify({'message': 'User not found'}), 404
+    fields, error = parse_fields(request.args, UserDTO.FIELDS, None)
+    if error:
+        return jsonify({'message': error}), 400
+
+    if is_conditional():
+        # A 304 needs only the validators, not the row
+        version, last_modified = UserService.get_user_validators(user_id)
+        if version is not None:
+            etag = entity_etag('user', user_id, version, fields)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+    user, version, last_modified = UserService.get_user_with_version(user_id, fields)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+
+    etag = entity_etag('user', user_id, version, fields)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return add_cache_headers(jsonify(user.to_dict(fields)), etag, last_modified)
 
 
 
@@ -95,25 +172,17 @@ def create_user():
     """
     data = request.get_json()
 
-    # Check if the request has the required fields
-    if 'name' not in data or 'email' not in data:
-        return jsonify({'message': 'Name and email are required'}), 400
+    # Required fields, email format and name length (3 to 50 characters)
+    error = UserService.validate_user_data(data)
+    if error:
+        return jsonify({'message': error}), 400
 
-    # Check if the email is already in use
-    if UserService.get_user_by_email(data['email']):
+    # Taken emails are reported by the insert itself
+    user = UserService.create_user(data['name'], data['email'])
+    if user is None:
         return jsonify({'message': 'Email already in use'}), 400
 
-    # Check if email format is valid
-    if not UserService.is_valid_email(data['email']):
-        return jsonify({'message': 'Invalid email format'}), 400
-
-    # Check if username length should be between 3 and 50
-    if len(data['name']) < 3 or len(data['name']) > 50:
-        return jsonify({'message': 'Name should be between 3 and 50 characters'}), 400
-
-    user = UserService.create_user(data['name'], data['email'])
-    user_dto = UserDTO(user.id, user.name, user.email)
-    return jsonify(user_dto.to_dict()), 201
+    return jsonify(UserDTO.from_model(user).to_dict()), 201
 
 @users_bp.route('/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
@@ -148,14 +217,18 @@ def update_user(user_id):
               type: string
             email:
               type: string
+      400:
+        description: Email already in use
       404:
         description: User not found
     """
     data = request.get_json()
-    user = UserService.update_user(user_id, data['name'], data['email'])
+    try:
+        user = UserService.update_user(user_id, data['name'], data['email'])
+    except EmailInUse:
+        return jsonify({'message': 'Email already in use'}), 400
     if user:
-        user_dto = UserDTO(user.id, user.name, user.email)
-        return jsonify(user_dto.to_dict())
+        return jsonify(user.to_dict())
     return jsonify({'message': 'User not found'}), 404
 
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
@@ -177,4 +250,124 @@ def delete_user(user_id):
     """
     if UserService.delete_user(user_id):
         return jsonify({'message': 'User deleted'})
-    return jsonify({'message': 'User not found'}), 404
\ No newline at end of file
+    return jsonify({'message': 'User not found'}), 404
+
+def email_conflict_errors(items):
+    return [
+        {'index': index, 'email': items[index]['email'], 'message': 'Email already in use'}
+        for index in UserService.email_conflicts(items)
+    ]
+
+@users_bp.route('/bulk', methods=['POST'])
+def bulk_create_users():
+    """
+    Create many users in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              name:
+                type: string
+              email:
+                type: string
+    responses:
+      201:
+        description: All users created; one result per item, in request order
+      400:
+        description: Invalid input, nothing was written
+    """
+    items, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = collect_errors(items, UserService.validate_user_data)
+    if not errors:
+        errors = duplicate_errors(UserService.normalized_emails(items), 'Duplicate email in request')
+    if not errors:
+        errors = email_conflict_errors(items)
+    if errors:
+        return validation_error_response(errors)
+
+    try:
+        ids = UserService.bulk_create_users(items)
+    except EmailInUse:
+        return validation_error_response(email_conflict_errors(items))
+    return jsonify({'results': [{'index': index, 'id': user_id, 'status': 201} for index, user_id in enumerate(ids)]}), 201
+
+@users_bp.route('/bulk', methods=['PUT'])
+def bulk_update_users():
+    """
+    Update many users in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              name:
+                type: string
+              email:
+                type: string
+    responses:
+      200:
+        description: One result per item with status 200, or 404 for unknown ids
+      400:
+        description: Invalid input, nothing was written
+    """
+    items, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = collect_errors(items, lambda item: UserService.validate_user_data(item, require_id=True))
+    if not errors:
+        errors = duplicate_errors([item['id'] for item in items], 'Duplicate id')
+        errors += duplicate_errors(UserService.normalized_emails(items), 'Duplicate email in request')
+    if not errors:
+        errors = email_conflict_errors(items)
+    if errors:
+        return validation_error_response(errors)
+
+    try:
+        updated = UserService.bulk_update_users(items)
+    except EmailInUse:
+        return validation_error_response(email_conflict_errors(items))
+    return jsonify({'results': id_results([item['id'] for item in items], updated, 200)})
+
+@users_bp.route('/bulk', methods=['DELETE'])
+def bulk_delete_users():
+    """
+    Delete many users in a single transaction
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: integer
+    responses:
+      200:
+        description: One result per id with status 200, or 404 for unknown ids
+      400:
+        description: Invalid input, nothing was deleted
+    """
+    ids, error_response = read_bulk_body()
+    if error_response:
+        return error_response
+    errors = [{'index': index, 'message': 'id must be an integer'} for index, user_id in enumerate(ids) if not is_sqlite_int(user_id)]
+    if errors:
+        return validation_error_response(errors)
+
+    deleted = UserService.bulk_delete_users(ids)
+    return jsonify({'results': id_results(ids, deleted, 200)})
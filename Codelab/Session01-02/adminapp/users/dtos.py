@@ -1,10 +1,18 @@
 class UserDTO:
+    FIELDS = ('id', 'name', 'email')
+    __slots__ = FIELDS
+
+    # Default fields of list responses, in the column order of list queries
+    LIST_FIELDS = FIELDS
+
     def __init__(self, id, name, email):
         self.id = id
         self.name = name
         self.email = email
 
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        if fields is not None:
+            return {name: getattr(self, name) for name in fields}
         return {
             'id': self.id,
             'name': self.name,
@@ -17,4 +25,13 @@ class UserDTO:
             id=data.get('id'),
             name=data.get('name'),
             email=data.get('email')
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    def from_model(user):
+        return UserDTO(user.id, user.name, user.email)
+
+    @staticmethod
+    def list_item(row, fields=LIST_FIELDS):
+        # Builds the response dict straight from a row of ``fields``, with no DTO in between
+        return dict(zip(fields, row))
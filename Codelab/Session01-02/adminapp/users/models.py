@@ -1,6 +1,18 @@
+from sqlalchemy.orm import validates
 from extensions import db
+from versioning import Versioned
 
-class User(db.Model):
+def normalize_email(email):
+    return email.strip().lower()
+
+class User(Versioned, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
\ No newline at end of file
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    # Lookups and uniqueness are case-insensitive through this indexed column
+    email_normalized = db.Column(db.String(120), unique=True, nullable=False)
+
+    @validates('email')
+    def _normalize_email(self, key, email):
+        self.email_normalized = normalize_email(email)
+        return email
\ No newline at end of file
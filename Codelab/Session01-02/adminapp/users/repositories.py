@@ -1,29 +1,224 @@
-from users.models import User
-from extensions import db
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
+from users.models import User, normalize_email
+from users.dtos import UserDTO
+from extensions import db, commit_with_retry, replica_reads, retry_on_lock
+from bulk import chunked
+from group_commit import group_commit_enabled, run_write
+from versioning import bump_table_version, column_values, get_table_version, insert_versioned, utcnow
+
+
+def columns(fields):
+    # In the order of ``fields``, which the result rows are zipped with
+    return [getattr(User, name) for name in fields]
 
 class UserRepository:
     @staticmethod
     def get_all():
-        return User.query.all()
+        with replica_reads():
+            return User.query.all()
+
+    @staticmethod
+    def get_table_version():
+        # From the replica the listing is read from, so the ETag describes that body
+        with replica_reads():
+            return get_table_version(User.__tablename__)
+
+    @staticmethod
+    def page_query(fields, after_id=None):
+        query = select(*columns(fields))
+        if after_id is not None:
+            query = query.where(User.id > after_id)
+        return query.order_by(User.id)
+
+    @staticmethod
+    def get_page(limit, after_id=None, fields=UserDTO.LIST_FIELDS):
+        with replica_reads():
+            return db.session.execute(UserRepository.page_query(fields, after_id).limit(limit)).all()
+
+    @staticmethod
+    def iter_all(batch_size, fields=UserDTO.LIST_FIELDS):
+        query = UserRepository.page_query(fields)
+        # A generator, so the query only runs once a streamed body is read
+        def rows():
+            with replica_reads():
+                yield from db.session.execute(query.execution_options(yield_per=batch_size))
+        return rows()
 
     @staticmethod
     def get_by_id(user_id):
         return User.query.get(user_id)
 
+    @staticmethod
+    def get_validators(user_id):
+        # The ETag and Last-Modified inputs alone, without the row
+        return db.session.execute(
+            select(User.version, User.updated_at).where(User.id == user_id)
+        ).first()
+
+    @staticmethod
+    def get_fields(user_id, fields):
+        # Other columns are not read; version and updated_at feed the ETag
+        return db.session.query(User).options(
+            load_only(*columns(fields), User.version, User.updated_at)
+        ).filter(User.id == user_id).first()
+
     @staticmethod
     def create(user):
+        if group_commit_enabled():
+            # Inserted by the group commit writer; the instance stays out of the session
+            values = column_values(user)
+            row = run_write(lambda session: insert_versioned(session, User, values))
+            for key, value in row._mapping.items():
+                setattr(user, key, value)
+            return
         db.session.add(user)
-        db.session.commit()
+        # The new row is returned as written, without a SELECT to reload it
+        commit_with_retry(expire=False)
 
     @staticmethod
     def update():
-        db.session.commit()
+        commit_with_retry()
 
     @staticmethod
     def delete(user):
         db.session.delete(user)
-        db.session.commit()
+        commit_with_retry()
+
+    @staticmethod
+    def update_statement(user_id, values):
+        if 'email' in values:
+            values = dict(values, email_normalized=normalize_email(values['email']))
+        return (
+            update(User)
+            .where(User.id == user_id)
+            .values(**values, version=User.version + 1, updated_at=utcnow())
+            .returning(*columns(UserDTO.FIELDS))
+        )
+
+    @staticmethod
+    def delete_statement(user_id):
+        return delete(User).where(User.id == user_id)
+
+    @staticmethod
+    def update_by_id(user_id, values):
+        """
+        Update one user in a single UPDATE ... RETURNING.
+
+        Returns the updated row (UserDTO.FIELDS), or None when no user has
+        that id. Row and table versions are maintained here, as the ORM
+        flush hook never sees this statement.
+        """
+        def write(session):
+            row = session.execute(UserRepository.update_statement(user_id, values)).first()
+            if row is not None:
+                bump_table_version(User.__tablename__, session)
+            return row
+        return run_write(write)
+
+    @staticmethod
+    def delete_by_id(user_id):
+        """Delete one user; returns whether it existed."""
+        def write(session):
+            deleted = session.execute(UserRepository.delete_statement(user_id)).rowcount
+            if deleted:
+                bump_table_version(User.__tablename__, session)
+            return deleted > 0
+        return run_write(write)
+
+    @staticmethod
+    def existing_ids(ids):
+        found = set()
+        for chunk in chunked(ids):
+            found.update(db.session.scalars(select(User.id).where(User.id.in_(chunk))))
+        return found
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_create(rows):
+        try:
+            # A single executemany INSERT; ids come back in parameter order
+            ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows).all()
+            bump_table_version(User.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return ids
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_update(rows):
+        try:
+            existing = UserRepository.existing_ids(row['id'] for row in rows)
+            matched = [row for row in rows if row['id'] in existing]
+            if matched:
+                # One executemany UPDATE that also bumps each row's version
+                columns = [key for key in matched[0] if key != 'id']
+                values = {key: bindparam('_' + key) for key in columns}
+                values.update(version=User.version + 1, updated_at=utcnow())
+                statement = update(User.__table__).where(User.id == bindparam('_id')).values(values)
+                db.session.connection().execute(statement, [{'_' + key: value for key, value in row.items()} for row in matched])
+                bump_table_version(User.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return existing
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_upsert(rows):
+        """
+        Insert ``rows``, updating the matching user instead where one exists.
+
+        Rows with an id match on id, the others on email_normalized. One
+        executemany INSERT ... ON CONFLICT DO UPDATE per kind, in a single
+        transaction; updated rows get a new version.
+        """
+        table = User.__table__
+        try:
+            for key, changed in (('id', ('name', 'email', 'email_normalized')), ('email_normalized', ('name', 'email'))):
+                matched = [row for row in rows if (row['id'] is not None) == (key == 'id')]
+                if not matched:
+                    continue
+                statement = sqlite_insert(table)
+                values = {name: statement.excluded[name] for name in changed}
+                values.update(version=table.c.version + 1, updated_at=utcnow())
+                db.session.connection().execute(
+                    statement.on_conflict_do_update(index_elements=[table.c[key]], set_=values), matched)
+            bump_table_version(User.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    @retry_on_lock
+    def bulk_delete(ids):
+        deleted = set()
+        try:
+            for chunk in chunked(ids):
+                statement = delete(User).where(User.id.in_(chunk)).returning(User.id)
+                deleted.update(db.session.scalars(statement.execution_options(synchronize_session=False)))
+            if deleted:
+                bump_table_version(User.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return deleted
 
     @staticmethod
     def get_by_email(email):
-        return User.query.filter_by(email=email).first()
\ No newline at end of file
+        return User.query.filter_by(email_normalized=normalize_email(email)).first()
+
+    @staticmethod
+    def get_ids_by_email(emails):
+        # Keyed by normalized email
+        owners = {}
+        for chunk in chunked({normalize_email(email) for email in emails}):
+            statement = select(User.email_normalized, User.id).where(User.email_normalized.in_(chunk))
+            owners.update(db.session.execute(statement).tuples().all())
+        return owners
\ No newline at end of file
@@ -1,41 +1,120 @@
-from sqlalchemy import false
+from sqlalchemy.exc import IntegrityError
 
 from users.repositories import UserRepository
-from users.models import User
+from users.models import User, normalize_email
+from users.dtos import UserDTO
+from extensions import cache
+from pagination import is_sqlite_int
 import re
 
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+
+class EmailInUse(Exception):
+    pass
+
+
 class UserService:
     @staticmethod
     def get_all_users():
         return UserRepository.get_all()
 
+    @staticmethod
+    def get_users_version():
+        return UserRepository.get_table_version()
+
+    @staticmethod
+    def get_users_page(limit, after_id=None, fields=UserDTO.LIST_FIELDS):
+        # Fetch one extra row to know whether another page follows
+        rows = UserRepository.get_page(limit + 1, after_id, fields)
+        next_id = rows[limit - 1].id if len(rows) > limit else None
+        return rows[:limit], next_id
+
+    @staticmethod
+    def iter_all_users(batch_size=1000, fields=UserDTO.LIST_FIELDS):
+        return UserRepository.iter_all(batch_size, fields)
+
     @staticmethod
     def get_user_by_id(user_id):
-        return UserRepository.get_by_id(user_id)
+        data = cache.get_or_load('user', user_id, UserService._load_user)
+        if data:
+            return UserDTO.from_dict(data)
+        return None
+
+    @staticmethod
+    def get_user_with_version(user_id, fields=None):
+        # Returns (dto, version, updated_at); the validators come from the same cache entry.
+        # With ``fields`` a cache miss reads only those columns and is not cached.
+        if fields is None:
+            data = cache.get_or_load('user', user_id, UserService._load_user)
+        else:
+            data = cache.peek('user', user_id) or UserService._load_user_fields(user_id, fields)
+        if data:
+            return UserDTO.from_dict(data), data['version'], data['updated_at']
+        return None, None, None
+
+    @staticmethod
+    def get_user_validators(user_id):
+        # (version, updated_at) to answer a conditional GET with; a cache miss reads only those columns
+        data = cache.peek('user', user_id)
+        if data:
+            return data['version'], data['updated_at']
+        row = UserRepository.get_validators(user_id)
+        if row:
+            return row.version, row.updated_at.isoformat() if row.updated_at else None
+        return None, None
+
+    @staticmethod
+    def _load_user(user_id):
+        user = UserRepository.get_by_id(user_id)
+        if user:
+            data = UserDTO.from_model(user).to_dict()
+            data['version'] = user.version
+            data['updated_at'] = user.updated_at.isoformat() if user.updated_at else None
+            return data
+        return None
+
+    @staticmethod
+    def _load_user_fields(user_id, fields):
+        user = UserRepository.get_fields(user_id, fields)
+        if user:
+            data = {name: getattr(user, name) for name in fields}
+            data['version'] = user.version
+            data['updated_at'] = user.updated_at.isoformat() if user.updated_at else None
+            return data
+        return None
 
     @staticmethod
     def create_user(name, email):
+        # A single INSERT; the unique index on email_normalized rejects taken
+        # emails, so there is no lookup first and no race between the two
         user = User(name=name, email=email)
-        UserRepository.create(user)
+        try:
+            UserRepository.create(user)
+        except IntegrityError:
+            return None
+        cache.invalidate('user', user.id)
         return user
 
     @staticmethod
     def update_user(user_id, name, email):
-        user = UserRepository.get_by_id(user_id)
-        if user:
-            user.name = name
-            user.email = email
-            UserRepository.update()
-            return user
-        return None
+        # One UPDATE ... RETURNING; no row means no such user, and the unique
+        # index on email_normalized rejects an email another user has
+        try:
+            row = UserRepository.update_by_id(user_id, {'name': name, 'email': email})
+        except IntegrityError as error:
+            raise EmailInUse(email) from error
+        if row is None:
+            return None
+        cache.invalidate('user', user_id)
+        return UserDTO(*row)
 
     @staticmethod
     def delete_user(user_id):
-        user = UserRepository.get_by_id(user_id)
-        if user:
-            UserRepository.delete(user)
-            return True
-        return False
+        if not UserRepository.delete_by_id(user_id):
+            return False
+        cache.invalidate('user', user_id)
+        return True
 
     @staticmethod
     def get_user_by_email(email):
@@ -46,7 +125,83 @@ class UserService:
             return user
         return False
 
+    @staticmethod
+    def validate_user_data(data, require_id=False):
+        if not isinstance(data, dict):
+            return 'User must be an object'
+        if require_id and not is_sqlite_int(data.get('id')):
+            return 'id must be an integer'
+        if not isinstance(data.get('name'), str) or not isinstance(data.get('email'), str):
+            return 'Name and email are required'
+        if not UserService.is_valid_email(data['email']):
+            return 'Invalid email format'
+        if len(data['name']) < 3 or len(data['name']) > 50:
+            return 'Name should be between 3 and 50 characters'
+        return None
+
+    @staticmethod
+    def email_conflicts(items):
+        # Indexes of items whose email already belongs to another user
+        owners = UserRepository.get_ids_by_email(item['email'] for item in items)
+        conflicts = []
+        for index, item in enumerate(items):
+            owner = owners.get(normalize_email(item['email']))
+            if owner is not None and owner != item.get('id'):
+                conflicts.append(index)
+        return conflicts
+
+    @staticmethod
+    def normalized_emails(items):
+        return [normalize_email(item['email']) for item in items]
+
+    @staticmethod
+    def bulk_create_users(items):
+        rows = [
+            {'name': item['name'], 'email': item['email'], 'email_normalized': normalize_email(item['email'])}
+            for item in items
+        ]
+        try:
+            return UserRepository.bulk_create(rows)
+        except IntegrityError as error:
+            # An email taken by a concurrent write since the caller's check
+            raise EmailInUse() from error
+
+    @staticmethod
+    def bulk_update_users(items):
+        rows = [
+            {'id': item['id'], 'name': item['name'], 'email': item['email'], 'email_normalized': normalize_email(item['email'])}
+            for item in items
+        ]
+        try:
+            updated = UserRepository.bulk_update(rows)
+        except IntegrityError as error:
+            raise EmailInUse() from error
+        for user_id in updated:
+            cache.invalidate('user', user_id)
+        return updated
+
+    @staticmethod
+    def upsert_users(items):
+        # Items with an id upsert by id, the others by email
+        rows = [
+            {'id': item.get('id'), 'name': item['name'], 'email': item['email'], 'email_normalized': normalize_email(item['email'])}
+            for item in items
+        ]
+        # Users matched by email are only known by id after a lookup, which their cache entries need
+        owners = UserRepository.get_ids_by_email(row['email'] for row in rows if row['id'] is None)
+        UserRepository.bulk_upsert(rows)
+        for user_id in {row['id'] for row in rows if row['id'] is not None} | set(owners.values()):
+            cache.invalidate('user', user_id)
+        return len(rows)
+
+    @staticmethod
+    def bulk_delete_users(user_ids):
+        deleted = UserRepository.bulk_delete(user_ids)
+        for user_id in deleted:
+            cache.invalidate('user', user_id)
+        return deleted
+
     @staticmethod
     def is_valid_email(email):
         # Simple regex for email validation
-        return re.match(r"[^@]+@[^@]+\.[^@]+", email) is not None
\ No newline at end of file
+        return EMAIL_PATTERN.match(email) is not None
\ No newline at end of file
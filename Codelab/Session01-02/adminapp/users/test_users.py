@@ -5,6 +5,9 @@ from users.services import UserService
 from users.models import User
 from extensions import db
 from flask import Flask
+from users.controllers import users_bp
+from pagination import encode_cursor
+from tests.helpers import BlueprintTestCase
 
 class TestUserRepository(unittest.TestCase):
 
@@ -53,9 +56,9 @@ class TestUserRepository(unittest.TestCase):
     def test_get_by_email(self, mock_query):
         mock_user = MagicMock()
         mock_query.filter_by.return_value.first.return_value = mock_user
-        result = UserRepository.get_by_email('test@example.com')
+        result = UserRepository.get_by_email(' Test@Example.com')
         self.assertEqual(result, mock_user)
-        mock_query.filter_by.assert_called_once_with(email='test@example.com')
+        mock_query.filter_by.assert_called_once_with(email_normalized='test@example.com')
         mock_query.filter_by.return_value.first.assert_called_once()
 
 class TestUserService(unittest.TestCase):
@@ -88,5 +91,201 @@ class TestUserService(unittest.TestCase):
         self.assertFalse(result)
         mock_get_by_email.assert_called_with('nonexistent@example.com')
 
+class TestUserPagination(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            db.session.add(User(name=f'User{i}', email=f'user{i}@example.com'))
+        db.session.commit()
+
+    def test_stream_all_users(self):
+        response = self.client.get('/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 3)
+
+    def test_keyset_pages(self):
+        first = self.client.get('/users/?limit=2').get_json()
+        self.assertEqual([u['name'] for u in first['items']], ['User0', 'User1'])
+        second = self.client.get(f"/users/?limit=2&after={first['next_cursor']}").get_json()
+        self.assertEqual([u['name'] for u in second['items']], ['User2'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_malformed_cursor(self):
+        for values in ([[1]], [{}], ['x'], [True], [1, 2], [1.5], [10 ** 30], [-2 ** 63 - 1]):
+            cursor = encode_cursor(*values)
+            response = self.client.get(f'/users/?limit=1&after={cursor}')
+            self.assertEqual(response.status_code, 400, values)
+            self.assertEqual(response.get_json()['message'], 'Invalid cursor')
+        self.assertEqual(self.client.get('/users/?limit=1&after=not-base64!').status_code, 400)
+
+class TestUserBulk(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def setUp(self):
+        super().setUp()
+        db.session.add(User(name='Existing', email='taken@example.com'))
+        db.session.commit()
+
+    def test_bulk_create(self):
+        items = [{'name': f'User{i}', 'email': f'user{i}@example.com'} for i in range(50)]
+        response = self.client.post('/users/bulk', json=items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.query.count(), 51)
+
+    def test_bulk_create_rejects_taken_and_duplicate_emails(self):
+        response = self.client.post('/users/bulk', json=[
+            {'name': 'User1', 'email': 'taken@example.com'},
+            {'name': 'User2', 'email': 'dup@example.com'},
+            {'name': 'User3', 'email': 'dup@example.com'}
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.get_json()['errors']], [2])
+        self.assertEqual(User.query.count(), 1)
+
+    def test_bulk_write_racing_a_concurrent_insert(self):
+        check = UserService.email_conflicts
+        calls = []
+
+        def taken_after_check(items):
+            calls.append(items)
+            return [] if len(calls) == 1 else check(items)
+        for method in ('post', 'put'):
+            calls.clear()
+            item = {'name': 'Racer', 'email': 'TAKEN@example.com'}
+            if method == 'put':
+                item['id'] = UserService.create_user('Other', 'other@example.com').id
+            # The email check passes, as if the conflicting user were inserted right after it
+            with patch.object(UserService, 'email_conflicts', side_effect=taken_after_check):
+                response = getattr(self.client, method)('/users/bulk', json=[item])
+            self.assertEqual(response.status_code, 400, method)
+            self.assertEqual(response.get_json()['errors'],
+                             [{'index': 0, 'email': 'TAKEN@example.com', 'message': 'Email already in use'}])
+        self.assertEqual(User.query.filter_by(name='Racer').count(), 0)
+        self.assertEqual(self.client.post('/users/bulk', json=[{'name': 'Fresh', 'email': 'fresh@example.com'}]).status_code, 201)
+
+    def test_bulk_update_and_delete(self):
+        user_id = User.query.first().id
+        response = self.client.put('/users/bulk', json=[{'id': user_id, 'name': 'Renamed', 'email': 'new@example.com'}])
+        self.assertEqual(response.get_json()['results'][0]['status'], 200)
+        response = self.client.delete('/users/bulk', json=[user_id])
+        self.assertEqual(response.get_json()['results'][0]['status'], 200)
+        self.assertEqual(User.query.count(), 0)
+
+class TestUserCreate(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def test_create_user_is_a_single_insert(self):
+        self.record_statements()
+        response = self.client.post('/users/', json={'name': 'Test User', 'email': 'test@example.com'})
+        self.assertEqual(response.status_code, 201)
+        user_statements = [s for s in self.statements if 'user' in s and 'table_version' not in s]
+        self.assertEqual(len(user_statements), 1, user_statements)
+        self.assertTrue(user_statements[0].startswith('INSERT INTO user'))
+
+    def test_case_variant_email_in_use(self):
+        self.client.post('/users/', json={'name': 'Test User', 'email': 'test@example.com'})
+        response = self.client.post('/users/', json={'name': 'Other User', 'email': 'TEST@example.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Email already in use', response.get_data(as_text=True))
+        self.assertEqual(User.query.count(), 1)
+        self.assertEqual(UserService.get_user_by_email('Test@Example.COM').name, 'Test User')
+
+    def test_validation_messages(self):
+        for body, message in (
+            ({'name': 'Test User'}, 'Name and email are required'),
+            ({'name': 'Test User', 'email': 'invalid-email'}, 'Invalid email format'),
+            ({'name': 'Te', 'email': 'test@example.com'}, 'Name should be between 3 and 50 characters'),
+        ):
+            response = self.client.post('/users/', json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.get_data(as_text=True))
+
+class TestUserFieldsets(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserService.create_user('Test User', 'test@example.com')
+
+    def test_list_and_detail_fields(self):
+        expected = {'id': self.user.id, 'name': 'Test User'}
+        self.assertEqual(self.client.get('/users/?fields=name').get_json(), [expected])
+        self.assertEqual(self.client.get('/users/?limit=5&fields=name').get_json()['items'], [expected])
+        self.assertEqual(self.client.get(f'/users/{self.user.id}?fields=name').get_json(), expected)
+
+    def test_empty_fields(self):
+        response = self.client.get('/users/?fields=,')
+        self.assertEqual(response.status_code, 400)
+
+class TestUserWrites(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserService.create_user('Test User', 'test@example.com')
+        self.record_statements()
+
+    def user_statements(self):
+        return [s for s in self.statements if 'user' in s and 'table_version' not in s]
+
+    def test_update_is_a_single_statement(self):
+        user_id = self.user.id
+        response = self.client.put(f'/users/{user_id}', json={'name': 'Renamed', 'email': 'New@Example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'id': user_id, 'name': 'Renamed', 'email': 'New@Example.com'})
+        statements = self.user_statements()
+        self.assertEqual(len(statements), 1, statements)
+        self.assertTrue(statements[0].startswith('UPDATE user'))
+        self.assertEqual(UserService.get_user_by_email('new@example.com').name, 'Renamed')
+
+    def test_delete_is_a_single_statement(self):
+        response = self.client.delete(f'/users/{self.user.id}')
+        self.assertEqual(response.status_code, 200)
+        statements = self.user_statements()
+        self.assertEqual(len(statements), 1, statements)
+        self.assertTrue(statements[0].startswith('DELETE FROM user'))
+        self.assertIsNone(db.session.get(User, self.user.id))
+
+    def test_missing_user(self):
+        missing = self.user.id + 1
+        response = self.client.put(f'/users/{missing}', json={'name': 'Renamed', 'email': 'new@example.com'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.delete(f'/users/{missing}').status_code, 404)
+
+class TestUserConditionalGet(BlueprintTestCase):
+    blueprint = users_bp
+    url_prefix = '/users'
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserService.create_user('Test User', 'test@example.com')
+
+    def test_list_and_detail_not_modified(self):
+        for url in ('/users/', f'/users/{self.user.id}'):
+            etag = self.client.get(url).headers['ETag']
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_detail_not_modified_reads_only_validators(self):
+        url = f'/users/{self.user.id}'
+        etag = self.client.get(url).headers['ETag']
+        self.record_statements()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(len(self.statements), 1)
+        self.assertNotIn('user.email', self.statements[0])
+
+    def test_bulk_update_changes_etags(self):
+        list_etag = self.client.get('/users/').headers['ETag']
+        detail_etag = self.client.get(f'/users/{self.user.id}').headers['ETag']
+        self.client.put('/users/bulk', json=[{'id': self.user.id, 'name': 'Renamed', 'email': 'renamed@example.com'}])
+        self.assertEqual(self.client.get('/users/', headers={'If-None-Match': list_etag}).status_code, 200)
+        self.assertEqual(self.client.get(f'/users/{self.user.id}', headers={'If-None-Match': detail_etag}).status_code, 200)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
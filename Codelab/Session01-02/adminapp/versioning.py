@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from extensions import db
+
+
+def utcnow():
+    # Naive UTC, matching what SQLite's DATETIME columns hand back
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+class Versioned:
+    """
+    Mixin for models whose rows carry a version and a modification time.
+
+    Both are maintained on flush, together with the per-table change
+    counter in table_version, which list ETags are derived from.
+    """
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+def table_version_upsert(table_name):
+    now = utcnow()
+    statement = sqlite_insert(TableVersion).values(name=table_name, version=1, updated_at=now)
+    return statement.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={'version': TableVersion.version + 1, 'updated_at': now}
+    )
+
+
+def table_version_query(table_name):
+    return db.select(TableVersion.version, TableVersion.updated_at).where(TableVersion.name == table_name)
+
+
+def bump_table_version(table_name, session=None):
+    session = session or db.session
+    session.execute(table_version_upsert(table_name))
+
+
+def column_values(obj):
+    """The column attributes set on a new, not yet flushed model instance."""
+    values = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def insert_versioned(session, model, values):
+    """
+    INSERT a ``model`` row with Core and return it, all columns included.
+
+    For writes made outside the unit of work, which the flush hook below
+    never sees: the modification time and table version are set here.
+    """
+    statement = insert(model).values(**values, updated_at=utcnow()).returning(*model.__table__.columns)
+    row = session.execute(statement).first()
+    bump_table_version(model.__tablename__, session)
+    return row
+
+
+def get_table_version(table_name):
+    """Return ``(version, updated_at)`` of a table; ``(0, None)`` if it was never written."""
+    row = db.session.execute(table_version_query(table_name)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+@event.listens_for(Session, 'before_flush')
+def _version_changed_rows(session, flush_context, instances):
+    # Runs again when commit_with_retry replays a unit of work, so row and
+    # table versions are never lost to a rollback
+    tables = set()
+    now = utcnow()
+    for obj in session.new:
+        if isinstance(obj, Versioned):
+            obj.updated_at = now
+            tables.add(obj.__table__.name)
+    for obj in session.dirty:
+        if isinstance(obj, Versioned) and session.is_modified(obj, include_collections=False):
+            # A SQL expression, so concurrent writers cannot hand out the same version
+            obj.version = type(obj).version + 1
+            obj.updated_at = now
+            tables.add(obj.__table__.name)
+    for obj in session.deleted:
+        if isinstance(obj, Versioned):
+            tables.add(obj.__table__.name)
+    for table_name in sorted(tables):
+        bump_table_version(table_name, session)
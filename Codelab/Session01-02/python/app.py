@@ -1,9 +1,131 @@
+import os
+import queue
 import sqlite3
 import re
+import threading
+import time
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
 
 app = Flask(__name__)
+app.config['DATABASE'] = os.getenv('DATABASE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'products.db'))
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', '4'))
+app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Connections idle for longer are checked with SELECT 1 before they are lent again
+app.config['DB_POOL_CHECK_IDLE'] = float(os.getenv('DB_POOL_CHECK_IDLE', '30'))
+
+# Applied once per pooled connection, not once per request
+PRAGMAS = (
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+)
+
+SEARCH_SQL = "SELECT * FROM products WHERE name LIKE ?"
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections shared by the request threads.
+
+    Connections are opened up front and handed out one thread at a time, so
+    they keep their page cache and their prepared statement cache between
+    requests. Idle connections are reused most-recently-used first.
+
+    A checkout normally costs no query: a connection is only checked with
+    SELECT 1 when it was returned after an error or sat idle for longer
+    than ``check_idle`` seconds, and replaced if the check fails.
+    """
+
+    def __init__(self, database, size=4, timeout=5.0, check_idle=30.0, pragmas=PRAGMAS, clock=time.monotonic):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.pragmas = pragmas
+        self._clock = clock
+        # (connection, returned at, returned after an error)
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put((self._connect(), self._clock(), False))
+
+    def _connect(self):
+        # check_same_thread is off because a connection moves between threads,
+        # but the pool only ever lends it to one thread at a time
+        conn = sqlite3.connect(self.database, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @staticmethod
+    def is_healthy(conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        try:
+            conn, returned_at, failed = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f'No database connection available after {self.timeout}s')
+        if failed or self._clock() - returned_at > self.check_idle:
+            if not self.is_healthy(conn):
+                conn.close()
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    # Keep the slot; the closed connection is replaced on its next checkout
+                    self._idle.put((conn, returned_at, True))
+                    raise
+        return conn
+
+    def release(self, conn, failed=False):
+        """Return ``conn``; ``failed`` has it checked before it is lent again."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            failed = True
+        self._idle.put((conn, self._clock(), failed))
+
+    def health_check(self):
+        conn = self.acquire()
+        healthy = self.is_healthy(conn)
+        self.release(conn, failed=not healthy)
+        return {'healthy': healthy, 'size': self.size, 'idle': self._idle.qsize()}
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait()[0].close()
+            except queue.Empty:
+                break
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Opened on first use rather than on import, so the configuration can still be changed
+    pool = app.extensions.get('db_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None:
+                pool = app.extensions['db_pool'] = ConnectionPool(
+                    app.config['DATABASE'], app.config['DB_POOL_SIZE'], app.config['DB_POOL_TIMEOUT'],
+                    app.config['DB_POOL_CHECK_IDLE']
+                )
+    return pool
+
 
 @app.route('/')
 def hello_world():  # put application's code here
@@ -11,13 +133,26 @@ def hello_world():  # put application's code here
 
 
 def get_db_connection():
+    # Borrow a pooled connection for the rest of the request
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+@app.teardown_appcontext
+def return_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn, failed=g.pop('db_failed', False) or exception is not None)
+
+
+@app.route('/health/db')
+def database_health():
     try:
-        conn = sqlite3.connect('products.db')
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        # Handle connection errors and return a JSON error response
-        return jsonify({"error": "Database connection failed", "details": str(e)}), 500
+        status = get_pool().health_check()
+    except (PoolTimeout, sqlite3.Error) as e:
+        return jsonify({"healthy": False, "details": str(e)}), 503
+    return jsonify(status), 200 if status['healthy'] else 503
 
 
 # Input validation function
@@ -36,27 +171,24 @@ def search_products():
     if not query or not is_valid_query(query):
         return jsonify({"error": "Invalid search query"}), 400
 
-    # Parameterized query to prevent SQL injection
-    sql = "SELECT * FROM products WHERE name LIKE ?"
-
     try:
         conn = get_db_connection()
-        if isinstance(conn, tuple):  # Handle connection failure
-            return conn  # Already a JSON response
+    except (PoolTimeout, sqlite3.Error) as e:
+        # Handle connection errors and return a JSON error response
+        return jsonify({"error": "Database connection failed", "details": str(e)}), 503
 
-        # Use parameterized query with wildcard search
-        results = conn.execute(sql, ('%' + query + '%',)).fetchall()
-        conn.close()
+    try:
+        # Parameterized query to prevent SQL injection; the constant SQL text
+        # lets the connection reuse its prepared statement
+        results = conn.execute(SEARCH_SQL, ('%' + query + '%',)).fetchall()
 
         # Convert results to a list of dictionaries
         product_list = [dict(row) for row in results]
         return jsonify(product_list), 200
     except sqlite3.Error as e:
-        # Handle any database errors
+        # Handle any database errors; the connection is checked before its next use
+        g.db_failed = True
         return jsonify({"error": "Database error", "details": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import ConnectionPool, PoolTimeout, app, get_pool
+
+
+def create_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, price REAL)')
+    conn.executemany('INSERT INTO products (name, price) VALUES (?, ?)', [('Brake pad', 10.0), ('Oil filter', 5.0)])
+    conn.commit()
+    conn.close()
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.database = os.path.join(self.root, 'products.db')
+        create_database(self.database)
+        self.now = 0.0
+        self.pool = ConnectionPool(self.database, size=2, timeout=0.01, check_idle=30, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.root)
+
+    def test_bounded(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertIsNot(first, second)
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire()
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(), first)
+
+    def test_checkout_runs_no_query(self):
+        with patch.object(ConnectionPool, 'is_healthy', return_value=True) as is_healthy:
+            for _ in range(3):
+                self.pool.release(self.pool.acquire())
+        is_healthy.assert_not_called()
+
+    def test_connection_returned_after_error_is_replaced(self):
+        conn = self.pool.acquire()
+        conn.close()
+        self.pool.release(conn, failed=True)
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(replacement.execute('SELECT COUNT(*) FROM products').fetchone()[0], 2)
+
+    def test_idle_connection_is_checked(self):
+        conn = self.pool.acquire()
+        conn.close()
+        self.pool.release(conn)
+        self.now = 31
+        self.assertIsNot(self.pool.acquire(), conn)
+
+    def test_open_transaction_is_rolled_back(self):
+        conn = self.pool.acquire()
+        conn.execute("INSERT INTO products (name, price) VALUES ('Uncommitted', 1.0)")
+        self.pool.release(conn)
+        self.assertEqual(self.pool.acquire().execute('SELECT COUNT(*) FROM products').fetchone()[0], 2)
+
+
+class TestEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        create_database(os.path.join(self.root, 'products.db'))
+        self.config = patch.dict(app.config, {
+            'DATABASE': os.path.join(self.root, 'products.db'), 'DB_POOL_SIZE': 1, 'DB_POOL_TIMEOUT': 0.01
+        })
+        self.config.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        pool = app.extensions.pop('db_pool', None)
+        if pool is not None:
+            pool.close()
+        self.config.stop()
+        shutil.rmtree(self.root)
+
+    def test_pool_is_opened_on_first_use(self):
+        self.assertNotIn('db_pool', app.extensions)
+        response = self.client.get('/products/search?query=Brake')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.get_json()], ['Brake pad'])
+        self.assertEqual(app.extensions['db_pool'].size, 1)
+
+    def test_health(self):
+        response = self.client.get('/health/db')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'healthy': True, 'size': 1, 'idle': 1})
+
+    def test_exhausted_pool(self):
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            self.assertEqual(self.client.get('/health/db').status_code, 503)
+            self.assertEqual(self.client.get('/products/search?query=Brake').status_code, 503)
+        finally:
+            pool.release(conn)
+        self.assertEqual(self.client.get('/products/search?query=Brake').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()